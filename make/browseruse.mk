@@ -1,6 +1,6 @@
 # =================== BrowserUse stack (fixed) ===================
 
-.PHONY: up-browseruse down-browseruse ps-browseruse logs-browseruse browseruse-run-once browseruse-attach-webmall
+.PHONY: up-browseruse down-browseruse ps-browseruse logs-browseruse browseruse-run-once browseruse-attach-webmall browseruse-bench browseruse-dry-run browseruse-compare browseruse-scale browseruse-catalog browseruse-replay
 
 up-browseruse: env-check-root env-check-compose net
 	docker compose -p "$(BROWSERUSE_PROJ)" -f "$(BROWSERUSE_COMPOSE)" --env-file "$(ENV_ABS)" up -d --build
@@ -25,3 +25,44 @@ browseruse-attach-webmall: net
 	@cid=$$(docker compose -p "$(BROWSERUSE_PROJ)" -f "$(BROWSERUSE_COMPOSE)" ps -q $(BROWSERUSE_SERVICE)); \
 	if [ -z "$$cid" ]; then echo "BrowserUse container not running. Do 'make up-browseruse' first."; exit 1; fi; \
 	echo "Connecting $$cid to $(NETWORK)"; docker network connect "$(NETWORK)" "$$cid" 2>/dev/null || true; echo "OK."
+
+# Offline micro-benchmarks of the harness hot paths (baseline lives in the results volume)
+# BENCH_ARGS examples: "--save-baseline /results/bench_baseline.json"
+#                      "--baseline /results/bench_baseline.json --threshold 0.25"
+BENCH_ARGS ?= --baseline /results/bench_baseline.json
+browseruse-bench: env-check-root env-check-compose
+	docker compose -p "$(BROWSERUSE_PROJ)" -f "$(BROWSERUSE_COMPOSE)" --env-file "$(ENV_ABS)" run --rm --no-deps \
+	  $(BROWSERUSE_SERVICE) bash -lc "python /app/runner/bench_hot_paths.py $(BENCH_ARGS)"
+
+# Validate taskset, URL mappings and answers and estimate the budget (no agents, no LLM)
+# DRY_RUN_ARGS example: "--select 'categories=Substitute' --episodes 3"
+browseruse-dry-run: env-check-root env-check-compose
+	docker compose -p "$(BROWSERUSE_PROJ)" -f "$(BROWSERUSE_COMPOSE)" --env-file "$(ENV_ABS)" run --rm --no-deps \
+	  $(BROWSERUSE_SERVICE) bash -lc "python /app/runner/run_browseruse_webmall_study.py --dry-run $(DRY_RUN_ARGS)"
+
+# Compare studies (first = baseline) and fail on regressions
+# COMPARE_ARGS example: "/results/<baseline_study> /results/<candidate_study> --output /results/comparison.json"
+browseruse-compare: env-check-root env-check-compose
+	@if [ -z "$(COMPARE_ARGS)" ]; then echo "Set COMPARE_ARGS=\"/results/<baseline> /results/<candidate> [...]\""; exit 1; fi
+	docker compose -p "$(BROWSERUSE_PROJ)" -f "$(BROWSERUSE_COMPOSE)" --env-file "$(ENV_ABS)" run --rm --no-deps \
+	  $(BROWSERUSE_SERVICE) bash -lc "python /app/runner/compare_studies.py $(COMPARE_ARGS)"
+
+# Run one study on several runner containers sharing a work queue (needs WORK_QUEUE)
+WORKERS ?= 2
+browseruse-scale: env-check-root env-check-compose net
+	@if ! grep -q '^WORK_QUEUE=..*' "$(ENV_ABS)" && [ -z "$(WORK_QUEUE)" ]; then echo "Set WORK_QUEUE=<study name> in .env"; exit 1; fi
+	docker compose -p "$(BROWSERUSE_PROJ)" -f "$(BROWSERUSE_COMPOSE)" --env-file "$(ENV_ABS)" up -d --build \
+	  --scale $(BROWSERUSE_SERVICE)=$(WORKERS)
+
+# Index the products of the four shops into the product catalog (PRODUCT_CATALOG,
+# default /results/catalog.sqlite) for agents run with CATALOG=true
+browseruse-catalog: env-check-root env-check-compose net
+	docker compose -p "$(BROWSERUSE_PROJ)" -f "$(BROWSERUSE_COMPOSE)" --env-file "$(ENV_ABS)" run --rm \
+	  $(BROWSERUSE_SERVICE) bash -lc "python /app/runner/webmall_catalog.py build"
+
+# Replay finished runs without the LLM to benchmark shops, proxies and wait profiles
+# REPLAY_ARGS example: "/results/<study> --wait-profile fast --repeat 3"
+browseruse-replay: env-check-root env-check-compose net
+	@if [ -z "$(REPLAY_ARGS)" ]; then echo "Set REPLAY_ARGS=\"/results/<study> [...]\""; exit 1; fi
+	docker compose -p "$(BROWSERUSE_PROJ)" -f "$(BROWSERUSE_COMPOSE)" --env-file "$(ENV_ABS)" run --rm \
+	  $(BROWSERUSE_SERVICE) bash -lc "python /app/runner/replay_trajectories.py $(REPLAY_ARGS)"
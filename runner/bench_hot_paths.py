@@ -0,0 +1,562 @@
+"""
+Micro-benchmarks for the study harness hot paths.
+
+Runs offline on synthetic WebMall-like tasksets and agent histories (no
+browser, no LLM) and measures the per-sweep cost of:
+
+    prepare_task_instruction, extract_answer_from_result,
+    get_expected_answers, calculate_metrics, save_task_results,
+    save_study_summary
+
+save_task_results and save_study_summary are timed building and serializing
+their JSON into memory; writing the files is timed separately (the "_io"
+benchmarks), since it depends on the page cache and the disk more than on the
+code. The file writes are reported but not gated unless --io-threshold is
+given.
+
+Usage:
+    python bench_hot_paths.py                                  # run and print
+    python bench_hot_paths.py --save-baseline bench_baseline.json
+    python bench_hot_paths.py --baseline bench_baseline.json --threshold 0.25
+
+With --baseline the run exits with status 1 if any hot path got slower (best of
+the repeats) or hungrier (peak traced memory) than the baseline by more than
+the threshold.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# The harness reads shop URLs at import time; give it stable fake hosts.
+for _var, _port in (
+    ("SHOP1_URL", 8081),
+    ("SHOP2_URL", 8082),
+    ("SHOP3_URL", 8083),
+    ("SHOP4_URL", 8084),
+    ("FRONTEND_URL", 8080),
+):
+    os.environ.setdefault(_var, f"http://localhost:{_port}")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import run_browseruse_webmall_study as study  # noqa: E402
+
+DEFAULT_SIZES = [30, 1000, 10000, 100000]
+# save_task_results writes five files per task; it is benchmarked per task on
+# at most this many tasks and scaled up so sizes stay comparable.
+IO_SAMPLE = 200
+# Short benchmarks are repeated until they ran this long (at most MAX_REPEATS
+# times), so a burst of load on the machine does not hit every repeat
+MIN_SECONDS = 1.0
+MAX_REPEATS = 50
+CATEGORIES = [
+    "Specific_Product",
+    "Cheapest_Product",
+    "Best_Fit_Specific",
+    "Best_Fit_Vague",
+    "Cheapest_Best_Fit_Vague",
+    "Compatible_Products",
+    "Substitute",
+]
+
+
+# ============================================================================
+# Synthetic Data
+# ============================================================================
+
+
+GENERAL_INSTRUCTION = (
+    "<instructions>\\nSolve the task below using these four webshops:\\n\\n"
+    "E-Store Athletes: {{URL_1}}\\nTechTalk: {{URL_2}}\\nCamelCases: {{URL_3}}\\n"
+    "Hardware Cafe: {{URL_4}}\\n\\nAfter solving the task, submit the final result "
+    "by first navigating to this page:\\n\\nSolution page: {{URL_5}}\\n\\n"
+    "Then fill the final results into the text field on the solution page and "
+    'press the "Submit Final Result" button.\\n</instructions>\\n'
+)
+
+
+def make_taskset(n_tasks: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Synthetic tasks shaped like entries of WebMall's task_sets.json."""
+    rng = random.Random(seed)
+    tasks = []
+    for i in range(n_tasks):
+        n_answers = rng.randint(1, 4)
+        answers = [
+            f"{{{{URL_{rng.randint(1, 4)}}}}}/product/synthetic-product-{i}-{j}"
+            for j in range(n_answers)
+        ]
+        tasks.append(
+            {
+                "id": f"Webmall_Synthetic_Task{i}",
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "instruction": GENERAL_INSTRUCTION,
+                "task": (
+                    "<task>\\nFind all offers for synthetic product "
+                    f"{i} in Shop1, Shop2, Shop3 and Shop4.\\n</task>"
+                ),
+                "correct_answer": {"type": "string", "answers": answers},
+            }
+        )
+    return tasks
+
+
+def make_result_string(task: Dict[str, Any]) -> str:
+    """String form of an AgentHistoryList ending in a 'done' action."""
+    urls = "###".join(
+        a.replace("{{URL_1}}", os.environ["SHOP1_URL"])
+        .replace("{{URL_2}}", os.environ["SHOP2_URL"])
+        .replace("{{URL_3}}", os.environ["SHOP3_URL"])
+        .replace("{{URL_4}}", os.environ["SHOP4_URL"])
+        for a in task["correct_answer"]["answers"]
+    )
+    steps = "".join(
+        f"{{'go_to_url': {{'url': '{os.environ['SHOP1_URL']}/?s=item{k}'}}}}, "
+        for k in range(20)
+    )
+    return f"AgentHistoryList(all_results=[{steps}{{'done': {{'text': \"{urls}\", 'success': True}}}}])"
+
+
+class _Model(SimpleNamespace):
+    """Stand-in for a pydantic model: attribute access plus model_dump()."""
+
+    def model_dump(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+def make_history(
+    n_steps: int, final_text: str, write_file: bool = True
+) -> SimpleNamespace:
+    """Synthetic agent with a browser-use shaped history of n_steps steps.
+
+    Without ``write_file`` saving the history only serializes it.
+    """
+    items = []
+    t = 0.0
+    for step in range(1, n_steps + 1):
+        is_last = step == n_steps
+        duration = 2.0 + (step % 7) * 0.3
+        items.append(
+            SimpleNamespace(
+                metadata=SimpleNamespace(
+                    duration_seconds=duration,
+                    step_number=step,
+                    step_start_time=t,
+                    step_end_time=t + duration,
+                ),
+                model_output=SimpleNamespace(
+                    thinking="Looking at the search results " * 8,
+                    evaluation_previous_goal="Success - page loaded.",
+                    memory="Visited shops 1-2; candidates so far: 3. " * 4,
+                    next_goal="Open the next shop search page.",
+                    action=[
+                        _Model(done={"text": final_text, "success": True})
+                        if is_last
+                        else _Model(click_element_by_index={"index": step % 40})
+                    ],
+                ),
+                result=[
+                    _Model(
+                        is_done=is_last,
+                        success=True if is_last else None,
+                        extracted_content=final_text if is_last else "Clicked",
+                        error=None,
+                    )
+                ],
+                state=SimpleNamespace(url=f"http://localhost:8081/?s=item{step}"),
+            )
+        )
+        t += duration
+
+    history = SimpleNamespace(
+        history=items,
+        usage=SimpleNamespace(
+            total_input_tokens=n_steps * 9000,
+            total_output_tokens=n_steps * 250,
+            total_tokens=n_steps * 9250,
+            total_cost=n_steps * 0.02,
+        ),
+    )
+
+    def save_to_file(path):
+        text = json.dumps([vars(i.metadata) for i in items])
+        if write_file:
+            Path(path).write_text(text)
+
+    history.save_to_file = save_to_file
+    return SimpleNamespace(history=history)
+
+
+class MemoryWriter:
+    """ResultWriter stand-in that serializes every file but writes none.
+
+    JSON is streamed into a counting sink like ResultWriter streams it into
+    the file. Callbacks (e.g. saving the agent history) run right away.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, chunk: str) -> None:
+        self.bytes += len(chunk)
+
+    def write_json(self, path: Path, data: Any, indent: int = 2) -> None:
+        json.dump(data() if callable(data) else data, self, indent=indent)
+
+    def write_text(self, path: Path, text: str) -> None:
+        self.bytes += len(text)
+
+    def call(self, fn: Callable[[], Any]) -> None:
+        fn()
+
+
+def make_results(tasks: List[Dict[str, Any]], seed: int = 0) -> List[Dict[str, Any]]:
+    """Synthetic per-task results as produced by run_agent_on_task."""
+    rng = random.Random(seed)
+    results = []
+    for task in tasks:
+        ok = rng.random() < 0.5
+        expected = sorted(study.get_expected_answers(task))
+        actual = expected if ok else expected[:-1]
+        results.append(
+            {
+                "task_id": task["id"],
+                "task_seed": 0,
+                "category": task["category"],
+                "task_description": task["task"],
+                "expected_answers": expected,
+                "actual_answers": actual,
+                "missing_answers": [a for a in expected if a not in actual],
+                "extra_answers": [],
+                "task_completion": 1.0 if ok else 0.0,
+                "precision": 1.0 if ok else rng.random(),
+                "recall": 1.0 if ok else rng.random(),
+                "f1_score": 1.0 if ok else rng.random(),
+                "n_steps": rng.randint(3, 50),
+                "time_elapsed": rng.uniform(20, 600),
+                "truncated": rng.random() < 0.1,
+                "terminated": True,
+                "error": None,
+                "stack_trace": None,
+                "result": make_result_string(task),
+                "usage_info": {
+                    "tokens": {
+                        "total_input_tokens": 100000,
+                        "total_output_tokens": 3000,
+                        "total_tokens": 103000,
+                    },
+                    "costs": {"total_cost": 0.2},
+                },
+            }
+        )
+    return results
+
+
+# ============================================================================
+# Benchmarks
+# ============================================================================
+
+# Each benchmark gets the taskset size and returns (callable, units, scale):
+# the callable is timed, ``units`` is the number of tasks it processes and
+# ``scale`` extrapolates sampled benchmarks back to the full size.
+Benchmark = Callable[[int, Path], Tuple[Callable[[], Any], int, float]]
+
+
+def bench_prepare_task_instruction(n: int, tmp: Path):
+    tasks = make_taskset(n)
+    return (lambda: [study.prepare_task_instruction(t) for t in tasks]), n, 1.0
+
+
+def bench_extract_answer_from_result(n: int, tmp: Path):
+    results = [make_result_string(t) for t in make_taskset(n)]
+    return (lambda: [study.extract_answer_from_result(r) for r in results]), n, 1.0
+
+
+def bench_get_expected_answers(n: int, tmp: Path):
+    tasks = make_taskset(n)
+    return (lambda: [study.get_expected_answers(t) for t in tasks]), n, 1.0
+
+
+def bench_calculate_metrics(n: int, tmp: Path):
+    tasks = make_taskset(n)
+    pairs = []
+    for t in tasks:
+        expected = study.get_expected_answers(t)
+        actual = set(list(expected)[:-1]) | {"http://localhost:8084/product/extra"}
+        pairs.append((expected, actual))
+    return (lambda: [study.calculate_metrics(e, a) for e, a in pairs]), n, 1.0
+
+
+def _task_results_sample(n: int, write_file: bool = True):
+    sample = min(n, IO_SAMPLE)
+    tasks = make_taskset(sample)
+    results = make_results(tasks)
+    agents = [
+        make_history(50, "http://localhost:8081/product/x", write_file)
+        for _ in tasks
+    ]
+    return sample, results, agents
+
+
+def bench_save_task_results(n: int, tmp: Path):
+    sample, results, agents = _task_results_sample(n, write_file=False)
+    # Task directories exist up front, so only mkdir's exist check is timed
+    out = Path(tempfile.mkdtemp(dir=tmp))
+    for i in range(sample):
+        (out / f"task_{i}").mkdir()
+
+    def run():
+        writer = MemoryWriter()
+        for i, (r, a) in enumerate(zip(results, agents)):
+            study.save_task_results(r, a, out / f"task_{i}", writer=writer)
+
+    return run, sample, n / sample
+
+
+def bench_save_task_results_io(n: int, tmp: Path):
+    sample, results, agents = _task_results_sample(n)
+
+    def run():
+        out = Path(tempfile.mkdtemp(dir=tmp))
+        for i, (r, a) in enumerate(zip(results, agents)):
+            study.save_task_results(r, a, out / f"task_{i}")
+        shutil.rmtree(out)
+
+    return run, sample, n / sample
+
+
+def bench_save_study_summary(n: int, tmp: Path):
+    results = make_results(make_taskset(n))
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            study.save_study_summary(results, tmp, writer=MemoryWriter())
+
+    return run, n, 1.0
+
+
+def bench_save_study_summary_io(n: int, tmp: Path):
+    results = make_results(make_taskset(n))
+
+    def run():
+        out = Path(tempfile.mkdtemp(dir=tmp))
+        with contextlib.redirect_stdout(io.StringIO()):
+            study.save_study_summary(results, out)
+        shutil.rmtree(out)
+
+    return run, n, 1.0
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "prepare_task_instruction": bench_prepare_task_instruction,
+    "extract_answer_from_result": bench_extract_answer_from_result,
+    "get_expected_answers": bench_get_expected_answers,
+    "calculate_metrics": bench_calculate_metrics,
+    "save_task_results": bench_save_task_results,
+    "save_study_summary": bench_save_study_summary,
+    "save_task_results_io": bench_save_task_results_io,
+    "save_study_summary_io": bench_save_study_summary_io,
+}
+
+# File writes: reported, gated only with --io-threshold
+IO_BENCHMARKS = {"save_task_results_io", "save_study_summary_io"}
+
+
+# ============================================================================
+# Runner
+# ============================================================================
+
+
+def measure(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    """Time ``fn`` (warm-up + repeats, GC off) and trace its peak memory.
+
+    Runs at least ``repeats`` times and until MIN_SECONDS have passed.
+    """
+    fn()  # warm-up: caches, compiled regexes, file system
+
+    timings: List[float] = []
+    gc.collect()
+    gc.disable()
+    try:
+        while len(timings) < repeats or (
+            sum(timings) < MIN_SECONDS and len(timings) < MAX_REPEATS
+        ):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+
+    # Memory is traced in a separate run: tracemalloc distorts timings
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "stdev_s": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "peak_kb": peak / 1024,
+    }
+
+
+def run_benchmarks(
+    names: List[str], sizes: List[int], repeats: int
+) -> Dict[str, Dict[str, float]]:
+    """Run the selected benchmarks for every size. Keys are 'name@size'."""
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="webmall_bench_") as tmp:
+        for name in names:
+            for size in sizes:
+                fn, units, scale = BENCHMARKS[name](size, Path(tmp))
+                # Large sizes are slow and already stable: fewer repeats
+                stats = measure(fn, repeats if size <= 10000 else max(3, repeats // 2))
+                stats["median_s"] *= scale
+                stats["min_s"] *= scale
+                stats["stdev_s"] *= scale
+                stats["per_task_us"] = stats["median_s"] / size * 1e6
+                stats["sampled_tasks"] = units
+                results[f"{name}@{size}"] = stats
+                print(
+                    f"{name:<28} n={size:<7} median {stats['median_s'] * 1000:10.2f} ms"
+                    f"  ({stats['per_task_us']:8.2f} us/task)"
+                    f"  peak {stats['peak_kb']:10.1f} KiB"
+                )
+    return results
+
+
+def compare(
+    current: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    threshold: float,
+    memory_threshold: float,
+    io_threshold: Optional[float] = None,
+) -> List[str]:
+    """Return a list of regression messages (empty if within thresholds).
+
+    The IO_BENCHMARKS are timed against ``io_threshold``, or only printed
+    without one.
+    """
+    regressions = []
+    for key, stats in current.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        # The fastest repeat is the least noisy estimate of the code's own cost
+        time_ratio = stats["min_s"] / base["min_s"] if base["min_s"] else 1.0
+        mem_ratio = stats["peak_kb"] / base["peak_kb"] if base["peak_kb"] else 1.0
+        time_threshold = threshold
+        if key.split("@")[0] in IO_BENCHMARKS:
+            gate = (
+                "not gated"
+                if io_threshold is None
+                else f"+{io_threshold:.0%} allowed"
+            )
+            print(f"  {key}: file writes {time_ratio:.2f}x baseline ({gate})")
+            time_threshold = io_threshold
+        if time_threshold is not None and time_ratio > 1 + time_threshold:
+            regressions.append(
+                f"{key}: time {time_ratio:.2f}x baseline "
+                f"({base['min_s'] * 1000:.2f} ms -> {stats['min_s'] * 1000:.2f} ms)"
+            )
+        if mem_ratio > 1 + memory_threshold:
+            regressions.append(
+                f"{key}: peak memory {mem_ratio:.2f}x baseline "
+                f"({base['peak_kb']:.0f} KiB -> {stats['peak_kb']:.0f} KiB)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the study harness hot paths")
+    parser.add_argument(
+        "--sizes",
+        default=",".join(str(s) for s in DEFAULT_SIZES),
+        help="Comma-separated taskset sizes (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--only",
+        default=",".join(BENCHMARKS),
+        help="Comma-separated benchmark names (default: all)",
+    )
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--output", help="Write this run's numbers to a JSON file")
+    parser.add_argument("--save-baseline", help="Write this run as the baseline file")
+    parser.add_argument("--baseline", help="Compare against this baseline file")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed relative slowdown (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--memory-threshold",
+        type=float,
+        default=0.25,
+        help="Allowed relative growth of peak memory (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--io-threshold",
+        type=float,
+        default=None,
+        help="Allowed relative slowdown of the file writes (default: not gated)",
+    )
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    names = [n.strip() for n in args.only.split(",") if n.strip()]
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    current = run_benchmarks(names, sizes, args.repeats)
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "repeats": args.repeats,
+        "results": current,
+    }
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline saved to: {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())["results"]
+        print()
+        regressions = compare(
+            current,
+            baseline,
+            args.threshold,
+            args.memory_threshold,
+            args.io_threshold,
+        )
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.baseline}:")
+            for message in regressions:
+                print(f"  - {message}")
+            sys.exit(1)
+        print(f"\n✅ No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
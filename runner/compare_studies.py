@@ -0,0 +1,306 @@
+"""
+Compare WebMall studies and gate on quality and performance regressions.
+
+The first study is the baseline; every further study is compared with it.
+Runs are matched by (task_id, task_seed) (rerun chains are resolved, see
+webmall_rerun) and the paired deltas of
+
+    task_completion, f1_score                          (higher is better, absolute delta)
+    n_steps, time_elapsed, tokens, input_tokens, cost  (lower is better, relative delta)
+
+are reported overall, per category and per task. Completion is tested with
+an exact McNemar test, the other metrics with a paired sign-flip permutation
+test. A metric regresses when it is worse than its threshold and, unless
+--no-significance is given, the difference is significant at --alpha.
+Regressions are gated overall and per category; per-task deltas are
+reported only, a handful of seeds is too noisy to gate on.
+
+Usage:
+    python compare_studies.py /results/<baseline> /results/<candidate> [...]
+    python compare_studies.py A B --output comparison.json --max-time-increase 0.2
+
+Exits with status 1 if any candidate regresses, or if it shares no runs with
+the baseline (a missing or empty directory, or a sweep directory instead of
+one of its configurations): a gate that compared nothing does not pass. The
+machine-readable verdict is written with --output.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from statistics import mean
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from webmall_rerun import load_merged_results
+from webmall_stats import mcnemar_exact, paired_permutation_test
+
+# name -> (value of a run or None, higher is better)
+METRICS: Dict[str, Tuple[Callable[[Dict[str, Any]], Optional[float]], bool]] = {
+    "task_completion": (lambda r: r.get("task_completion"), True),
+    "f1_score": (lambda r: r.get("f1_score"), True),
+    "n_steps": (lambda r: r.get("n_steps"), False),
+    "time_elapsed": (lambda r: r.get("time_elapsed"), False),
+    "tokens": (
+        lambda r: ((r.get("usage_info") or {}).get("tokens") or {}).get("total_tokens"),
+        False,
+    ),
+    "input_tokens": (
+        lambda r: ((r.get("usage_info") or {}).get("tokens") or {}).get(
+            "total_input_tokens"
+        ),
+        False,
+    ),
+    "cost": (
+        lambda r: ((r.get("usage_info") or {}).get("costs") or {}).get("total_cost"),
+        False,
+    ),
+}
+
+DEFAULT_THRESHOLDS = {
+    "task_completion": 0.02,  # absolute drop
+    "f1_score": 0.02,  # absolute drop
+    "n_steps": 0.10,  # relative increase
+    "time_elapsed": 0.10,
+    "tokens": 0.10,
+    "input_tokens": 0.10,
+    "cost": 0.10,
+}
+
+Run = Dict[str, Any]
+Pair = Tuple[Run, Run]
+
+
+def load_runs(study_dir: Path) -> Dict[Tuple[str, int], Run]:
+    """Results of a study keyed by (task_id, task_seed)."""
+    return {(r["task_id"], r["task_seed"]): r for r in load_merged_results(study_dir)}
+
+
+def missing_results(study_dir: Path) -> str:
+    """Why a study directory has no runs to compare."""
+    if not study_dir.is_dir():
+        return f"{study_dir} does not exist"
+    if any(study_dir.glob("*/*/full_result.json")):
+        return (
+            f"{study_dir} has no runs of its own; it looks like a sweep, "
+            "compare its configuration directories"
+        )
+    return f"{study_dir} has no results"
+
+
+def compare_metric(name: str, pairs: List[Pair]) -> Optional[Dict[str, Any]]:
+    """Paired delta and significance of one metric (None without data)."""
+    get, higher_is_better = METRICS[name]
+    values = [(get(b), get(c)) for b, c in pairs]
+    values = [(b, c) for b, c in values if b is not None and c is not None]
+    if not values:
+        return None
+    before = [b for b, _ in values]
+    after = [c for _, c in values]
+    base_mean, cand_mean = mean(before), mean(after)
+    delta = cand_mean - base_mean
+
+    entry = {
+        "n": len(values),
+        "baseline": round(base_mean, 4),
+        "candidate": round(cand_mean, 4),
+        "delta": round(delta, 4),
+        "relative_delta": round(delta / base_mean, 4) if base_mean else None,
+        "higher_is_better": higher_is_better,
+    }
+    if name == "task_completion":
+        lost, gained, p_value = mcnemar_exact(
+            [b == 1.0 for b in before], [c == 1.0 for c in after]
+        )
+        entry.update(lost_runs=lost, gained_runs=gained)
+    else:
+        p_value = paired_permutation_test(before, after)
+    entry["p_value"] = round(p_value, 4)
+    return entry
+
+
+def compare_group(pairs: List[Pair]) -> Dict[str, Dict[str, Any]]:
+    metrics = {}
+    for name in METRICS:
+        entry = compare_metric(name, pairs)
+        if entry is not None:
+            metrics[name] = entry
+    return metrics
+
+
+def worse_by(name: str, entry: Dict[str, Any]) -> float:
+    """How much worse the candidate is, in the unit of the metric's threshold."""
+    if METRICS[name][1]:
+        return -entry["delta"]
+    return entry["relative_delta"] or 0.0
+
+
+def flag(
+    scope: str,
+    metrics: Dict[str, Dict[str, Any]],
+    thresholds: Dict[str, float],
+    alpha: Optional[float],
+) -> List[str]:
+    """Mark regressions / improvements in ``metrics`` and describe the former."""
+    messages = []
+    for name, entry in metrics.items():
+        significant = alpha is None or entry["p_value"] < alpha
+        worse = worse_by(name, entry)
+        entry["regression"] = significant and worse > thresholds[name]
+        entry["improvement"] = significant and -worse > thresholds[name]
+        if entry["regression"]:
+            messages.append(
+                f"{scope}: {name} {entry['baseline']} -> {entry['candidate']} "
+                f"(delta {entry['delta']:+}, p={entry['p_value']})"
+            )
+    return messages
+
+
+def compare_studies(
+    baseline_dir: Path,
+    candidate_dir: Path,
+    thresholds: Dict[str, float],
+    alpha: Optional[float],
+) -> Dict[str, Any]:
+    """Comparison of a candidate study with the baseline."""
+    baseline = load_runs(baseline_dir)
+    candidate = load_runs(candidate_dir)
+    keys = sorted(baseline.keys() & candidate.keys())
+    pairs = [(baseline[k], candidate[k]) for k in keys]
+
+    by_category: Dict[str, List[Pair]] = {}
+    by_task: Dict[str, List[Pair]] = {}
+    for pair in pairs:
+        by_category.setdefault(pair[0].get("category", "Unknown"), []).append(pair)
+        by_task.setdefault(pair[0]["task_id"], []).append(pair)
+
+    overall = compare_group(pairs)
+    regressions = flag("overall", overall, thresholds, alpha)
+    if not pairs:
+        # Nothing compared is no evidence of no regression
+        if not candidate:
+            reason = missing_results(candidate_dir)
+        elif not baseline:
+            reason = missing_results(baseline_dir)
+        else:
+            reason = f"{candidate_dir} shares no (task_id, task_seed) with the baseline"
+        regressions.append(f"nothing to compare: {reason}")
+    categories = {}
+    for category, category_pairs in sorted(by_category.items()):
+        categories[category] = compare_group(category_pairs)
+        regressions += flag(category, categories[category], thresholds, alpha)
+
+    return {
+        "baseline": str(baseline_dir),
+        "candidate": str(candidate_dir),
+        "matched_runs": len(pairs),
+        "only_in_baseline": len(baseline.keys() - candidate.keys()),
+        "only_in_candidate": len(candidate.keys() - baseline.keys()),
+        "overall": overall,
+        "by_category": categories,
+        "by_task": {
+            task_id: {
+                name: {k: entry[k] for k in ("n", "baseline", "candidate", "delta")}
+                for name, entry in compare_group(task_pairs).items()
+            }
+            for task_id, task_pairs in sorted(by_task.items())
+        },
+        "regressions": regressions,
+        "verdict": "fail" if regressions else "pass",
+    }
+
+
+def print_comparison(comparison: Dict[str, Any]) -> None:
+    print(f"\n{'='*80}")
+    print(f"{comparison['candidate']}\n  vs baseline {comparison['baseline']}")
+    print(
+        f"Matched runs: {comparison['matched_runs']} "
+        f"(only in baseline: {comparison['only_in_baseline']}, "
+        f"only in candidate: {comparison['only_in_candidate']})"
+    )
+    print(f"{'='*80}")
+    if not comparison["matched_runs"]:
+        print("\n❌ No matched runs, nothing was compared")
+    groups = [("overall", comparison["overall"])] + list(
+        comparison["by_category"].items()
+    )
+    for scope, metrics in groups:
+        print(f"\n{scope}")
+        for name, e in metrics.items():
+            mark = "❌" if e["regression"] else ("✅" if e["improvement"] else "  ")
+            relative = (
+                f" ({e['relative_delta']:+.1%})" if e["relative_delta"] is not None else ""
+            )
+            print(
+                f"  {mark} {name:<16} {e['baseline']:>12} -> {e['candidate']:<12} "
+                f"delta {e['delta']:+}{relative}  p={e['p_value']}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare WebMall studies")
+    parser.add_argument("studies", nargs="+", help="Baseline study dir, then candidates")
+    parser.add_argument("--output", help="Write the comparison and verdict as JSON")
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.05,
+        help="Significance level of the tests (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-significance",
+        action="store_true",
+        help="Flag threshold violations even if they are not significant",
+    )
+    for name, default in DEFAULT_THRESHOLDS.items():
+        kind = "drop" if METRICS[name][1] else "increase"
+        unit = "absolute" if METRICS[name][1] else "relative"
+        parser.add_argument(
+            f"--max-{name.replace('_', '-')}-{kind}",
+            dest=name,
+            type=float,
+            default=default,
+            help=f"Allowed {unit} {kind} of {name} (default: %(default)s)",
+        )
+    args = parser.parse_args()
+    if len(args.studies) < 2:
+        parser.error("need a baseline and at least one candidate study")
+
+    thresholds = {name: getattr(args, name) for name in DEFAULT_THRESHOLDS}
+    alpha = None if args.no_significance else args.alpha
+    baseline_dir = Path(args.studies[0])
+    if not load_runs(baseline_dir):
+        print(f"ERROR: nothing to compare against: {missing_results(baseline_dir)}")
+        sys.exit(1)
+    comparisons = [
+        compare_studies(baseline_dir, Path(candidate), thresholds, alpha)
+        for candidate in args.studies[1:]
+    ]
+    for comparison in comparisons:
+        print_comparison(comparison)
+
+    failed = [c for c in comparisons if c["verdict"] == "fail"]
+    report = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "baseline": str(baseline_dir),
+        "alpha": alpha,
+        "thresholds": thresholds,
+        "comparisons": comparisons,
+        "verdict": "fail" if failed else "pass",
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"\nComparison saved to: {args.output}")
+
+    if failed:
+        print(f"\n❌ {sum(len(c['regressions']) for c in failed)} regression(s):")
+        for comparison in failed:
+            for message in comparison["regressions"]:
+                print(f"  - {Path(comparison['candidate']).name}: {message}")
+        sys.exit(1)
+    print("\n✅ No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Replay stored agent trajectories against the shops, without an LLM.
+
+time_elapsed of a run mixes model latency with the environment (shop
+response times, Chromium, page load waits). This runner takes the action
+sequences of finished runs (trajectory.json) and executes them directly with
+browser-use's actions in a browser set up like the agent's (same
+BrowserProfile wait settings, optionally the network filter), so only the
+environment is measured:
+
+    browser_start   starting the browser of a run
+    page            reading the page after each step (page load waits, DOM,
+                    screenshot), by shop and page kind (home, search, product)
+    action          each action, by action type
+
+Element indices differ between page loads; like browser-use's own history
+rerun, actions are pointed at the element with the recorded element hash
+(from agent_history.json). Actions that are not environment work (done,
+extract, file and catalog actions) are skipped.
+
+Usage:
+    python replay_trajectories.py /results/<study> [/results/<study2> ...]
+    python replay_trajectories.py /results/<study> --wait-profile fast --repeat 3
+
+Writes replay_summary.json (latency distributions and environment vs.
+original time per run) and replay_actions.jsonl (every sample) to
+<results>/replay_<timestamp>/ or --output.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from webmall_budget import percentile
+from webmall_netfilter import NETWORK_FILTER_MODES, NetworkFilter, load_rules
+from webmall_sweep import WAIT_PROFILES
+
+# Agent-internal or LLM-backed actions: not part of the environment
+SKIPPED_ACTIONS = {
+    "done",
+    "extract",
+    "search",  # web search engine, outside the shops
+    "search_catalog",
+    "read_file",
+    "write_file",
+    "replace_file",
+    "upload_file",
+}
+
+
+def find_trajectories(paths: List[Path]) -> List[Path]:
+    """Task directories with a trajectory.json below ``paths``."""
+    task_dirs = []
+    for path in paths:
+        if (path / "trajectory.json").exists():
+            task_dirs.append(path)
+        else:
+            task_dirs.extend(p.parent for p in sorted(path.rglob("trajectory.json")))
+    return task_dirs
+
+
+def load_replay(task_dir: Path) -> Dict[str, Any]:
+    """Actions of a run per step, with the recorded element of each action."""
+    steps = json.loads((task_dir / "trajectory.json").read_text(encoding="utf-8"))
+    history_path = task_dir / "agent_history.json"
+    history = []
+    if history_path.exists():
+        history = json.loads(history_path.read_text(encoding="utf-8")).get(
+            "history", []
+        )
+    replay_steps = []
+    for i, step in enumerate(steps["steps"]):
+        state = (history[i].get("state") or {}) if i < len(history) else {}
+        elements = state.get("interacted_element") or []
+        actions = []
+        for j, action in enumerate(step.get("actions", [])):
+            name, params = next(
+                ((k, v) for k, v in action.items() if v is not None), (None, None)
+            )
+            if name is None:
+                continue
+            element = elements[j] if j < len(elements) else None
+            actions.append((name, params, (element or {}).get("element_hash")))
+        replay_steps.append(actions)
+
+    summary_path = task_dir / "summary_info.json"
+    summary = (
+        json.loads(summary_path.read_text(encoding="utf-8"))
+        if summary_path.exists()
+        else {}
+    )
+    return {
+        "task_dir": str(task_dir),
+        "task_id": steps.get("task_id"),
+        "steps": replay_steps,
+        "original_seconds": summary.get("time_elapsed"),
+    }
+
+
+def page_kind(url: str) -> str:
+    """Kind of a WooCommerce page from its URL."""
+    parts = urlsplit(url)
+    if "s" in parse_qs(parts.query):
+        return "search"
+    segments = [s for s in parts.path.split("/") if s]
+    if not segments:
+        return "home"
+    if segments[0] == "page":  # paginated home / shop listing
+        return "listing"
+    return segments[0]
+
+
+def latency_stats(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p95": percentile(values, 0.95),
+        "max": max(values),
+    }
+
+
+def find_index(selector_map, element_hash: Optional[int]) -> Optional[int]:
+    """Current index of the element with ``element_hash`` (None if gone)."""
+    for index, element in selector_map.items():
+        if element.element_hash == element_hash:
+            return index
+    return None
+
+
+async def replay_run(
+    replay: Dict[str, Any],
+    wait_profile: str,
+    network_filter: str,
+    network_rules: List[Dict[str, Any]],
+    samples: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    """Replay one run in a fresh browser; appends its samples to ``samples``."""
+    from browser_use import BrowserSession, Tools
+    from browser_use.browser.profile import BrowserProfile
+
+    run = {"task_id": replay["task_id"], "task_dir": replay["task_dir"]}
+
+    def sample(kind: str, name: str, seconds: float, **extra) -> None:
+        samples.append(dict(run, kind=kind, name=name, seconds=seconds, **extra))
+
+    tools = Tools()
+    # The browser of an agent run: the page load waits of the wait profile
+    browser_profile = BrowserProfile(**WAIT_PROFILES[wait_profile])
+    session = BrowserSession(browser_profile=browser_profile)
+    netfilter = None
+    if network_filter != "off":
+        netfilter = NetworkFilter(network_rules, mode=network_filter)
+        netfilter.attach(session)
+
+    counts = {"actions": 0, "skipped": 0, "missing_elements": 0, "errors": 0}
+    start = time.perf_counter()
+    try:
+        await session.start()
+        sample("browser_start", "browser_start", time.perf_counter() - start)
+        for actions in replay["steps"]:
+            if netfilter is not None:
+                await netfilter.sync()
+            # browser-use takes the screenshot of every agent step, vision or not
+            t = time.perf_counter()
+            state = await session.get_browser_state_summary(include_screenshot=True)
+            url = state.url
+            sample(
+                "page",
+                page_kind(url),
+                time.perf_counter() - t,
+                host=urlsplit(url).netloc,
+                url=url,
+            )
+            for name, params, element_hash in actions:
+                if name in SKIPPED_ACTIONS:
+                    counts["skipped"] += 1
+                    continue
+                params = dict(params)
+                if "index" in params and element_hash is not None:
+                    index = find_index(state.dom_state.selector_map, element_hash)
+                    if index is None:
+                        counts["missing_elements"] += 1
+                        continue
+                    params["index"] = index
+                t = time.perf_counter()
+                try:
+                    result = await tools.registry.execute_action(
+                        action_name=name, params=params, browser_session=session
+                    )
+                    error = getattr(result, "error", None)
+                except Exception as e:
+                    error = str(e)
+                sample(
+                    "action",
+                    name,
+                    time.perf_counter() - t,
+                    host=urlsplit(url).netloc,
+                    error=error,
+                )
+                counts["actions"] += 1
+                counts["errors"] += error is not None
+    finally:
+        try:
+            await session.kill()
+        except Exception as e:
+            print(f"Warning: could not close the browser: {e!r}")
+
+    run.update(counts)
+    run["environment_seconds"] = time.perf_counter() - start
+    run["original_seconds"] = replay["original_seconds"]
+    if netfilter is not None:
+        run["network"] = netfilter.stats()
+    return run
+
+
+def summarize(
+    samples: List[Dict[str, Any]], runs: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Latency distributions by sample kind and name, and per page host."""
+
+    def grouped(kind: str, key: str) -> Dict[str, Any]:
+        groups: Dict[str, List[float]] = {}
+        for s in samples:
+            if s["kind"] == kind:
+                groups.setdefault(s.get(key) or "blank", []).append(s["seconds"])
+        return {name: latency_stats(values) for name, values in sorted(groups.items())}
+
+    env = [r["environment_seconds"] for r in runs]
+    original = [r["original_seconds"] for r in runs if r.get("original_seconds")]
+    return {
+        "runs": len(runs),
+        "browser_start": latency_stats(
+            [s["seconds"] for s in samples if s["kind"] == "browser_start"]
+        ),
+        "page": latency_stats([s["seconds"] for s in samples if s["kind"] == "page"]),
+        "page_by_kind": grouped("page", "name"),
+        "page_by_host": grouped("page", "host"),
+        "action": latency_stats(
+            [s["seconds"] for s in samples if s["kind"] == "action"]
+        ),
+        "action_by_type": grouped("action", "name"),
+        "action_by_host": grouped("action", "host"),
+        "environment_seconds_per_run": latency_stats(env),
+        "original_seconds_per_run": latency_stats(original),
+        "skipped_actions": sum(r["skipped"] for r in runs),
+        "missing_elements": sum(r["missing_elements"] for r in runs),
+        "action_errors": sum(r["errors"] for r in runs),
+    }
+
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    def row(label: str, stats: Dict[str, Any]) -> None:
+        if not stats.get("count"):
+            return
+        print(
+            f"  {label:<28} {stats['count']:>6}  mean {stats['mean']:6.2f}s  "
+            f"p50 {stats['p50']:6.2f}s  p95 {stats['p95']:6.2f}s  "
+            f"max {stats['max']:6.2f}s"
+        )
+
+    print(f"\n{'='*80}")
+    print(f"REPLAY SUMMARY ({summary['runs']} runs)")
+    print(f"{'='*80}")
+    row("browser start", summary["browser_start"])
+    row("page (all)", summary["page"])
+    for name, stats in summary["page_by_kind"].items():
+        row(f"page {name}", stats)
+    for name, stats in summary["page_by_host"].items():
+        row(f"page @ {name}", stats)
+    row("action (all)", summary["action"])
+    for name, stats in summary["action_by_type"].items():
+        row(f"action {name}", stats)
+    row("environment / run", summary["environment_seconds_per_run"])
+    row("original run (with LLM)", summary["original_seconds_per_run"])
+    print(
+        f"Skipped actions: {summary['skipped_actions']}, elements not found: "
+        f"{summary['missing_elements']}, failed actions: {summary['action_errors']}"
+    )
+
+
+async def replay_all(
+    replays: List[Dict[str, Any]],
+    output_dir: Path,
+    wait_profile: str,
+    network_filter: str,
+    network_rules: List[Dict[str, Any]],
+    repeat: int,
+) -> Dict[str, Any]:
+    samples: List[Dict[str, Any]] = []
+    runs = []
+    for round_index in range(repeat):
+        for i, replay in enumerate(replays, 1):
+            print(
+                f"[{round_index + 1}/{repeat}] {i}/{len(replays)} {replay['task_id']}: "
+                f"{sum(len(step) for step in replay['steps'])} actions"
+            )
+            runs.append(
+                await replay_run(
+                    replay, wait_profile, network_filter, network_rules, samples
+                )
+            )
+
+    summary = summarize(samples, runs)
+    summary["config"] = {
+        "wait_profile": wait_profile,
+        "network_filter": network_filter,
+        "repeat": repeat,
+    }
+    summary["by_run"] = runs
+    output_dir.mkdir(parents=True, exist_ok=True)
+    (output_dir / "replay_summary.json").write_text(
+        json.dumps(summary, indent=2), encoding="utf-8"
+    )
+    with open(output_dir / "replay_actions.jsonl", "w", encoding="utf-8") as f:
+        for s in samples:
+            f.write(json.dumps(s) + "\n")
+    print_summary(summary)
+    print(f"\nResults saved to: {output_dir}")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "paths", nargs="+", type=Path, help="Study, sweep or task directories"
+    )
+    parser.add_argument(
+        "--wait-profile",
+        choices=sorted(WAIT_PROFILES),
+        default=os.getenv("WAIT_PROFILE", "browsergym"),
+        help="Page load waits of the browser (env: WAIT_PROFILE)",
+    )
+    parser.add_argument(
+        "--network-filter",
+        choices=NETWORK_FILTER_MODES,
+        default=os.getenv("NETWORK_FILTER", "off"),
+        help="Network filter of the browser (env: NETWORK_FILTER)",
+    )
+    parser.add_argument(
+        "--network-rules",
+        default=os.getenv("NETWORK_RULES", ""),
+        help="JSON file of network filter rules (env: NETWORK_RULES)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=1, help="Replay every run this many times"
+    )
+    parser.add_argument(
+        "--limit", type=int, default=None, help="Replay at most N runs"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Output directory, default <results>/replay_<timestamp>",
+    )
+    args = parser.parse_args(argv)
+
+    task_dirs = find_trajectories(args.paths)[: args.limit]
+    if not task_dirs:
+        paths = ", ".join(map(str, args.paths))
+        print(f"ERROR: no trajectory.json found below {paths}")
+        return 1
+    try:
+        network_rules = load_rules(args.network_rules)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: invalid network rules {args.network_rules!r}: {e}")
+        return 1
+
+    replays: List[Dict[str, Any]] = []
+    for task_dir in task_dirs:
+        try:
+            replays.append(load_replay(task_dir))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Warning: skipping {task_dir}: {e}")
+    output_dir = args.output or Path(os.getenv("RESULTS_DIR", "/results")) / (
+        f"replay_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
+    )
+    print(
+        f"Replaying {len(replays)} runs (wait profile {args.wait_profile}, "
+        f"network filter {args.network_filter}, {args.repeat}x)"
+    )
+    asyncio.run(
+        replay_all(
+            replays,
+            output_dir,
+            args.wait_profile,
+            args.network_filter,
+            network_rules,
+            args.repeat,
+        )
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
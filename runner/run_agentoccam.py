@@ -1,11 +1,17 @@
 # runner/run_browseragent_webmall.py
-import os, sys, json, re, subprocess, tempfile
+import os, sys, json, re, subprocess, tempfile, time
 from pathlib import Path
 
+from webmall_tasksets import (
+    describe_selection, parse_selection, select_task_sets, with_excluded_categories,
+)
+
 # ---- ENV ----
 TASKSET_PATH = os.getenv("TASKSET_PATH", "/tasksets/task_sets.json")
 RESULTS_DIR  = os.getenv("RESULTS_DIR", "/results")
 EPISODES     = os.getenv("EPISODES", "1")
+TASK_SELECT  = os.getenv("TASK_SELECT", "")
+PROFILE      = os.getenv("PROFILE", "")  # e.g. "cpu,memory" -> profiled via webmall_profile.py
 
 EXCLUDED_CATEGORIES = [
     c.strip() for c in os.getenv("EXCLUDED_CATEGORIES", "Add_To_Cart,Checkout,FindAndOrder").split(",") if c.strip()
@@ -48,21 +54,12 @@ def replace_placeholders(obj):
     return obj
 
 def load_and_resolve_taskset(path:str):
-    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    selection = with_excluded_categories(parse_selection(TASK_SELECT), EXCLUDED_CATEGORIES)
     resolved = []
-    skipped = 0
-    for suite in data:
-        out_suite = dict(suite)
-        tasks = []
-        for t in suite.get("tasks", []):
-            cat = t.get("category","")
-            if cat in EXCLUDED_CATEGORIES:
-                skipped += 1
-                continue
-            tasks.append(replace_placeholders(t))
-        out_suite["tasks"] = tasks
-        resolved.append(out_suite)
-    info(f"Resolved tasks: kept {sum(len(s['tasks']) for s in resolved)}, skipped {skipped}: {EXCLUDED_CATEGORIES}")
+    for suite in select_task_sets(path, selection):
+        suite["tasks"] = [replace_placeholders(t) for t in suite["tasks"]]
+        resolved.append(suite)
+    info(f"Resolved tasks: kept {sum(len(s['tasks']) for s in resolved)} ({describe_selection(selection)})")
     return resolved
 
 def main():
@@ -85,6 +82,13 @@ def main():
         "--results", RESULTS_DIR,
         "--episodes", EPISODES
     ]
+    if PROFILE:
+        profile_dir = Path(RESULTS_DIR) / f"profile_{SMOKE.stem}_{int(time.time())}"
+        cmd = [
+            "python", str(Path(__file__).with_name("webmall_profile.py")),
+            "--profile", PROFILE, "--output-dir", str(profile_dir), "--",
+        ] + cmd[1:]
+        info(f"Profiling ({PROFILE}) into {profile_dir}")
     print("Running:", " ".join(cmd))
     rc = subprocess.call(cmd)
     sys.exit(rc)
@@ -4,28 +4,115 @@ Run browser-use agent on the full WebMall benchmark.
 This script runs browser-use with GPT-4.1 on all WebMall tasks excluding
 "Add_To_Cart", "Checkout", and "FindAndOrder" (EndToEnd) categories.
 Results are saved to study_results_browseruse/ with structure similar to AgentLab.
+
+browser-use (and the agent runtime helpers) are imported on first use, so
+``--dry-run`` validates a configuration in well under a second.
 """
 
+from __future__ import annotations
+
+import argparse
 import asyncio
 import os
-import json
 import time
 import traceback
 import re
+import shutil
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 from dotenv import load_dotenv
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Set, Any, Optional
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 
 # Load environment variables
 current_file = Path(__file__).resolve()
 PATH_TO_DOT_ENV_FILE = current_file.parent / ".env"
 load_dotenv(PATH_TO_DOT_ENV_FILE)
 
-# Import browser-use components
-from browser_use import Agent, ChatOpenAI
-from browser_use.browser.profile import BrowserProfile
-
+if TYPE_CHECKING:
+    from browser_use import Agent
+
+from webmall_budget import (
+    STEP_BUDGETS_FILE,
+    describe_history,
+    estimate_budget,
+    history_filter,
+    load_history,
+    parse_step_budget,
+    plan_step_budgets,
+    print_budget,
+    print_step_budgets,
+    simulate_step_budgets,
+    step_budget_outcome,
+    step_limit,
+)
+from webmall_catalog import CATALOG_FILE, ProductCatalog, register_catalog_action
+from webmall_profile import Profiler, parse_profile_modes, rollup
+from webmall_queue import POLL_SECONDS, QUEUE_FILE, WorkQueue
+from webmall_netfilter import (
+    NETWORK_FILTER_MODES,
+    NetworkFilter,
+    load_rules,
+    sum_network_stats,
+)
+from webmall_observation import (
+    LEAN_ATTRIBUTES,
+    OBSERVATION_MODES,
+    ObservationCompactor,
+    sum_observation_stats,
+)
+from webmall_ratelimit import RateLimiter, wrap_llm
+from webmall_rerun import (
+    COMBINED_SUMMARY_FILE,
+    DEFAULT_RERUN_FILTER,
+    build_rerun_plan,
+    load_merged_results,
+    parse_rerun_filter,
+    plan_jobs,
+    rerun_outcome,
+    save_rerun_plan,
+)
+from webmall_stats import as_list, interval_width, mean_interval, wilson_interval
+from webmall_status import STATUS_FILE, StudyProgress, serve_status
+from webmall_steps import StepStream, step_record
+from webmall_sweep import (
+    SWEEP_FILE,
+    SWEEP_SUMMARY_FILE,
+    WAIT_PROFILES,
+    expand_sweep,
+    parse_bool,
+    parse_sweep,
+    parse_use_vision,
+    print_sweep_summary,
+    summarize_sweep,
+)
+from webmall_vision import (
+    VISION_ON_DEMAND,
+    VisionPolicy,
+    parse_vision_triggers,
+    sum_vision_stats,
+)
+from webmall_writer import ResultWriter, write_json
+from webmall_tasksets import (
+    describe_selection,
+    parse_selection,
+    select_tasks,
+    with_excluded_categories,
+)
 
 # ============================================================================
 # Configuration
@@ -34,38 +121,51 @@ from browser_use.browser.profile import BrowserProfile
 # Excluded categories (tasks that require interaction with cart/checkout)
 EXCLUDED_CATEGORIES = ["Add_To_Cart", "Checkout", "FindAndOrder"]
 
+# Environment variables holding the URL of each placeholder
+URL_ENV_VARS = {
+    "{{URL_1}}": "SHOP1_URL",
+    "{{URL_2}}": "SHOP2_URL",
+    "{{URL_3}}": "SHOP3_URL",
+    "{{URL_4}}": "SHOP4_URL",
+    "{{URL_5}}": "FRONTEND_URL",
+}
+
 # URL mappings for placeholder replacement
 URL_MAPPINGS = {
-    "{{URL_1}}": os.getenv("SHOP1_URL"),
-    "{{URL_2}}": os.getenv("SHOP2_URL"),
-    "{{URL_3}}": os.getenv("SHOP3_URL"),
-    "{{URL_4}}": os.getenv("SHOP4_URL"),
-    "{{URL_5}}": os.getenv("FRONTEND_URL"),
+    placeholder: os.getenv(env_var) for placeholder, env_var in URL_ENV_VARS.items()
 }
 
+# Shop labels for per-shop statistics (keyed like URL_MAPPINGS)
+SHOP_LABELS = {
+    "{{URL_1}}": "Shop1",
+    "{{URL_2}}": "Shop2",
+    "{{URL_3}}": "Shop3",
+    "{{URL_4}}": "Shop4",
+    "{{URL_5}}": "Frontend",
+}
+
+# Confidence level for per-task / per-category intervals in the study summary
+CONFIDENCE_LEVEL = 0.95
+
 
 # ============================================================================
 # Task Loading & Filtering
 # ============================================================================
 
 
-def load_all_tasks(task_sets_path: str) -> List[Dict[str, Any]]:
-    """Load all tasks from task_sets.json and filter by category."""
-    with open(task_sets_path, "r") as f:
-        task_sets = json.load(f)
+def load_all_tasks(
+    task_sets_path: str, selection: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """Load the selected tasks from task_sets.json, minus excluded categories.
 
-    all_tasks = []
-    for task_set in task_sets:
-        for task in task_set.get("tasks", []):
-            # Skip excluded categories
-            category = task.get("category", "")
-            if category in EXCLUDED_CATEGORIES:
-                print(f"Skipping task {task['id']} (category: {category})")
-                continue
-
-            all_tasks.append(task)
+    Goes through the shared, indexed taskset loader (see webmall_tasksets).
+    """
+    selection = with_excluded_categories(selection, EXCLUDED_CATEGORIES)
+    all_tasks = select_tasks(task_sets_path, selection)
 
-    print(f"\nLoaded {len(all_tasks)} tasks (excluded {EXCLUDED_CATEGORIES})")
+    print(
+        f"\nLoaded {len(all_tasks)} tasks (selection: {describe_selection(selection)})"
+    )
     return all_tasks
 
 
@@ -392,6 +492,33 @@ def calculate_metrics(expected: Set[str], actual: Set[str]) -> Dict[str, float]:
     }
 
 
+def shop_for_url(url: Optional[str]) -> str:
+    """Label of the shop a URL belongs to ('Other' if none matches)."""
+    for placeholder, base_url in URL_MAPPINGS.items():
+        if base_url and url and url.startswith(base_url):
+            return SHOP_LABELS[placeholder]
+    return "Other"
+
+
+def count_shop_errors(
+    agent, task_result: Dict[str, Any]
+) -> Dict[str, Dict[str, int]]:
+    """Failed actions and run-level errors per shop of the page they happened on."""
+    counts: Dict[str, Dict[str, int]] = {}
+    history = agent.history.history if hasattr(agent, "history") else []
+    for history_item in history:
+        url = getattr(getattr(history_item, "state", None), "url", None)
+        n_errors = sum(1 for r in history_item.result if getattr(r, "error", None))
+        if n_errors:
+            shop = counts.setdefault(shop_for_url(url), {})
+            shop["action_errors"] = shop.get("action_errors", 0) + n_errors
+    if task_result.get("error") and history:
+        url = getattr(getattr(history[-1], "state", None), "url", None)
+        shop = counts.setdefault(shop_for_url(url), {})
+        shop["run_errors"] = shop.get("run_errors", 0) + 1
+    return counts
+
+
 # ============================================================================
 # Agent Execution
 # ============================================================================
@@ -404,9 +531,41 @@ async def run_agent_on_task(
     model: str = "gpt-4.1-2025-04-14",
     temperature: float = 0.01,
     gif_output_path: Optional[str] = None,
-    use_vision: bool = True,
+    use_vision: Union[bool, str] = True,
+    on_step_end: Optional[Callable[[Agent], Awaitable[None]]] = None,
+    task_timeout: Optional[float] = None,
+    stall_timeout: Optional[float] = None,
+    wait_profile: str = "browsergym",
+    rate_limiter: Optional[RateLimiter] = None,
+    network_filter: str = "off",
+    network_rules: Optional[List[Dict[str, Any]]] = None,
+    observation: str = "full",
+    vision_triggers: Optional[Dict[str, Any]] = None,
+    catalog: bool = False,
+    product_catalog: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Run browser-use agent on a single task and return results."""
+    """Run browser-use agent on a single task and return results.
+
+    ``on_step_end`` is awaited after every step. The run is watched by a
+    TaskWatchdog (``task_timeout`` wall-clock, ``stall_timeout`` between
+    steps); a timed-out run keeps its partial history and gets the
+    termination reason "timeout". The browser is always torn down.
+
+    ``wait_profile`` selects the page load waits (see webmall_sweep);
+    with ``rate_limiter`` every LLM request waits for a slot of it.
+    ``network_filter`` "block" / "report" blocks or only counts requests
+    matching ``network_rules`` (see webmall_netfilter). ``observation``
+    "lean" compacts the page observations sent to the model (see
+    webmall_observation). ``use_vision`` "on_demand" sends screenshots only
+    on the ``vision_triggers`` (see webmall_vision). With ``catalog`` the
+    agent gets the search_catalog action on ``product_catalog`` (see
+    webmall_catalog).
+    """
+    # Heavy runtime imports, deferred so validation and tooling start fast
+    from browser_use import Agent, ChatOpenAI, Tools
+    from browser_use.browser.profile import BrowserProfile
+    from webmall_watchdog import TaskTimeout, TaskWatchdog, browser_pid, teardown_agent
+
     task_id = task_config["id"]
     category = task_config.get("category", "Unknown")
 
@@ -418,18 +577,27 @@ async def run_agent_on_task(
     # Prepare task instruction
     full_instruction = prepare_task_instruction(task_config)
 
-    # Initialize LLM
+    # Initialize LLM (seeded so repeated episodes of a task are reproducible)
     llm = ChatOpenAI(
         model=model,
         temperature=temperature,
+        seed=task_seed,
     )
-
-    # Create browser profile with page load wait times matching BrowserGym
-    # BrowserGym waits 0.5s after action + 3s for DOM load = ~3.5s total
-    browser_profile = BrowserProfile(
-        minimum_wait_page_load_time=0.5,  # Match BrowserGym's 0.5s wait after actions
-        wait_for_network_idle_page_load_time=6.0,  # Match BrowserGym's 3s DOM load timeout
-    )
+    if rate_limiter is not None:
+        wrap_llm(llm, rate_limiter)
+
+    # Create browser profile with the page load waits of the wait profile
+    # (default "browsergym": 0.5s after actions, matching BrowserGym)
+    browser_profile = BrowserProfile(**WAIT_PROFILES[wait_profile])
+
+    # Custom actions replace browser-use's default Tools, which leave out
+    # the screenshot action without vision
+    tools = None
+    product_search = None
+    if catalog:
+        tools = Tools(exclude_actions=[] if use_vision is True else ["screenshot"])
+        product_search = ProductCatalog(Path(product_catalog))
+        register_catalog_action(tools, product_search)
 
     # Create agent
     agent = Agent(
@@ -438,23 +606,67 @@ async def run_agent_on_task(
         generate_gif=gif_output_path if gif_output_path else False,
         calculate_cost=True,
         browser_profile=browser_profile,
-        use_vision=use_vision,
+        use_vision=use_vision is True,
+        include_attributes=LEAN_ATTRIBUTES if observation == "lean" else None,
+        tools=tools,
     )
+    compactor = None
+    if observation == "lean":
+        compactor = ObservationCompactor()
+        compactor.attach(agent)
+    vision = None
+    if use_vision == VISION_ON_DEMAND:
+        vision = VisionPolicy(vision_triggers, category)
+        vision.attach(agent)
+    netfilter = None
+    if network_filter != "off":
+        netfilter = NetworkFilter(network_rules, mode=network_filter)
+        netfilter.attach(agent.browser_session)
 
     # Track timing
     start_time = time.time()
 
-    # Run agent
+    # Run agent under the watchdog
     result = None
     error = None
     stack_trace = None
+    timed_out = False
+    watchdog = TaskWatchdog(task_timeout, stall_timeout)
+    pid = None
+
+    async def step_started(agent):
+        nonlocal pid
+        watchdog.touch()
+        pid = pid or browser_pid(agent)
+        if netfilter is not None:
+            await netfilter.sync()
+
+    async def step_ended(agent):
+        watchdog.touch()
+        if on_step_end is not None:
+            await on_step_end(agent)
 
     try:
-        result = await agent.run(max_steps=max_steps)
+        result = await watchdog.run(
+            agent.run(
+                max_steps=max_steps, on_step_start=step_started, on_step_end=step_ended
+            )
+        )
+    except TaskTimeout as e:
+        timed_out = True
+        error = str(e)
+        print(f"⏰ Timeout ({e.reason}): {error}")
+        # The run was cancelled before browser-use recorded its usage
+        try:
+            agent.history.usage = await agent.token_cost_service.get_usage_summary()
+        except Exception:
+            pass
     except Exception as e:
         error = str(e)
         stack_trace = traceback.format_exc()
         print(f"❌ Error during execution: {error}")
+    finally:
+        await teardown_agent(agent, pid)
 
     end_time = time.time()
     elapsed_time = end_time - start_time
@@ -478,11 +690,13 @@ async def run_agent_on_task(
     ):
         usage = agent.history.usage
 
-        # Extract token statistics
-        if hasattr(usage, "total_input_tokens"):
-            token_stats["total_input_tokens"] = usage.total_input_tokens
-        if hasattr(usage, "total_output_tokens"):
-            token_stats["total_output_tokens"] = usage.total_output_tokens
+        # Extract token statistics (browser-use calls them prompt / completion)
+        if hasattr(usage, "total_prompt_tokens"):
+            token_stats["total_input_tokens"] = usage.total_prompt_tokens
+        if hasattr(usage, "total_prompt_cached_tokens"):
+            token_stats["total_cached_input_tokens"] = usage.total_prompt_cached_tokens
+        if hasattr(usage, "total_completion_tokens"):
+            token_stats["total_output_tokens"] = usage.total_completion_tokens
         if hasattr(usage, "total_tokens"):
             token_stats["total_tokens"] = usage.total_tokens
 
@@ -511,6 +725,15 @@ async def run_agent_on_task(
             # Task is truncated if we reached max_steps but didn't mark as done
             truncated = (n_steps >= max_steps) and not is_done
 
+    if timed_out:
+        termination_reason = "timeout"
+    elif error is not None:
+        termination_reason = "error"
+    elif truncated:
+        termination_reason = "truncated"
+    else:
+        termination_reason = "done"
+
     # Prepare result summary
     task_result = {
         "task_id": task_id,
@@ -529,22 +752,144 @@ async def run_agent_on_task(
         "time_elapsed": elapsed_time,
         "truncated": truncated,
         "terminated": error is None,
+        "termination_reason": termination_reason,
         "error": error,
         "stack_trace": stack_trace,
         "result": str(result) if result else None,
         "usage_info": usage_info,
     }
+    if netfilter is not None:
+        task_result["network"] = netfilter.stats()
+    if compactor is not None:
+        task_result["observation"] = compactor.stats()
+    if vision is not None:
+        task_result["vision"] = vision.stats()
+    if product_search is not None:
+        task_result["catalog"] = product_search.stats()
 
     return task_result, agent
 
 
+def failed_run_result(
+    task_config: Dict[str, Any], task_seed: int, termination_reason: str, error: str
+) -> Dict[str, Any]:
+    """Result of a run whose worker process died before reporting back."""
+    expected_answers = get_expected_answers(task_config)
+    return {
+        "task_id": task_config["id"],
+        "task_seed": task_seed,
+        "category": task_config.get("category", "Unknown"),
+        "task_description": task_config.get("task", ""),
+        "expected_answers": list(expected_answers),
+        "actual_answers": [],
+        "missing_answers": list(expected_answers),
+        "extra_answers": [],
+        "task_completion": 0.0,
+        "precision": 0.0,
+        "recall": 0.0,
+        "f1_score": 0.0,
+        "n_steps": 0,
+        "time_elapsed": 0.0,
+        "truncated": False,
+        "terminated": False,
+        "termination_reason": termination_reason,
+        "error": error,
+        "stack_trace": None,
+        "result": None,
+        "usage_info": {},
+    }
+
+
+async def execute_run(
+    task_config: Dict[str, Any],
+    task_seed: int,
+    task_dir: Path,
+    run_options: Dict[str, Any],
+    report_step: Optional[Callable[[int, int, float], None]] = None,
+    writer: Optional[ResultWriter] = None,
+):
+    """Run one (task, seed), save its artifacts to ``task_dir`` and return
+    ``(task_result, shop_errors)``. The agent does not outlive this call;
+    its steps are streamed to ``task_dir`` while it runs.
+
+    ``run_options`` are the keyword arguments of run_agent_on_task shared by
+    all runs; ``report_step(steps, tokens, cost)`` is called after each step.
+    """
+
+    stream = StepStream(task_dir)
+
+    async def on_step_end(agent):
+        await stream.flush(agent)
+        if report_step is None:
+            return
+        # Progress reporting must never fail the run itself
+        try:
+            usage = await agent.token_cost_service.get_usage_summary()
+            tokens, cost = usage.total_tokens, usage.total_cost
+        except Exception:
+            tokens, cost = 0, 0.0
+        report_step(len(agent.history.history), tokens, cost)
+
+    task_result, agent = await run_agent_on_task(
+        task_config,
+        task_seed,
+        gif_output_path=str(task_dir / "agent_history.gif"),
+        on_step_end=on_step_end,
+        **run_options,
+    )
+    # Steps added after the last hook (e.g. the max_steps marker)
+    await stream.flush(agent)
+    shop_errors = count_shop_errors(agent, task_result)
+    save_task_results(task_result, agent, task_dir, stream, writer)
+    return task_result, shop_errors
+
+
 # ============================================================================
 # Result Saving
 # ============================================================================
 
 
-def save_task_results(task_result: Dict[str, Any], agent: Agent, task_dir: Path):
-    """Save task results to the task directory."""
+def step_timing(per_step_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Duration statistics of a run's per-step records."""
+    durations = [
+        step["duration_seconds"]
+        for step in per_step_stats
+        if "duration_seconds" in step
+    ]
+    return {
+        "per_step_durations": durations,
+        "total_duration": sum(durations, 0.0),
+        "max_step_duration": max(durations, default=0.0),
+        "min_step_duration": min(durations, default=0.0),
+    }
+
+
+def step_tokens(per_step_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Token statistics of a run's per-step records (input per step)."""
+    steps = [step["tokens"] for step in per_step_stats if "tokens" in step]
+    inputs = [tokens["input"] for tokens in steps]
+    return {
+        "per_step_input_tokens": inputs,
+        "per_step_output_tokens": [tokens["output"] for tokens in steps],
+        "max_step_input_tokens": max(inputs, default=0),
+        "avg_step_input_tokens": sum(inputs) / len(inputs) if inputs else 0.0,
+    }
+
+
+def save_task_results(
+    task_result: Dict[str, Any],
+    agent: Optional[Agent],
+    task_dir: Path,
+    stream: Optional[StepStream] = None,
+    writer: Optional[ResultWriter] = None,
+):
+    """Save task results to the task directory.
+
+    With ``stream`` the trajectory and agent history are assembled from the
+    step stream (see webmall_steps) instead of the in-memory history. With
+    ``writer`` all serialization and file I/O happens on the writer thread
+    (see webmall_writer); this function then only queues the files.
+    """
     task_dir.mkdir(parents=True, exist_ok=True)
 
     # Save task summary
@@ -561,125 +906,124 @@ def save_task_results(task_result: Dict[str, Any], agent: Agent, task_dir: Path)
         "missing_answers": task_result["missing_answers"],
         "extra_answers": task_result["extra_answers"],
     }
+    write_json(task_dir / "task_summary.json", task_summary, writer)
+
+    # Per-step records: from the step stream if the run was streamed. Built
+    # lazily (once) so that with a writer this happens on its thread.
+    @lru_cache(maxsize=None)
+    def per_step_stats() -> List[Dict[str, Any]]:
+        if stream is not None:
+            return stream.read_steps()
+        if hasattr(agent, "history") and agent.history.history:
+            return [step_record(h) for h in agent.history.history]
+        return []
 
-    with open(task_dir / "task_summary.json", "w") as f:
-        json.dump(task_summary, f, indent=2)
+    # Save summary info (steps, cost, timing)
+    def summary_info():
+        return {
+            "n_steps": task_result["n_steps"],
+            "time_elapsed": task_result["time_elapsed"],
+            "usage_info": task_result["usage_info"],
+            "step_timing": step_timing(per_step_stats()),
+            "step_tokens": step_tokens(per_step_stats()),
+            "error": task_result["error"],
+            "terminated": task_result["terminated"],
+            "truncated": task_result["truncated"],
+            "termination_reason": task_result.get("termination_reason"),
+            "network": task_result.get("network"),
+            "observation": task_result.get("observation"),
+            "vision": task_result.get("vision"),
+            "catalog": task_result.get("catalog"),
+        }
 
-    # Extract per-step statistics from agent history
-    per_step_stats = []
-    step_timing_stats = {
-        "per_step_durations": [],
-        "total_duration": 0.0,
-        "max_step_duration": 0.0,
-        "min_step_duration": float("inf"),
-    }
+    write_json(task_dir / "summary_info.json", summary_info, writer)
 
-    if hasattr(agent, "history") and agent.history.history:
-        for history_item in agent.history.history:
-            step_data = {}
-
-            # Get step timing if available
-            if hasattr(history_item, "metadata") and history_item.metadata:
-                metadata = history_item.metadata
-                if hasattr(metadata, "duration_seconds"):
-                    duration = metadata.duration_seconds
-                    step_timing_stats["per_step_durations"].append(duration)
-                    step_timing_stats["total_duration"] += duration
-                    step_timing_stats["max_step_duration"] = max(
-                        step_timing_stats["max_step_duration"], duration
-                    )
-                    step_timing_stats["min_step_duration"] = min(
-                        step_timing_stats["min_step_duration"], duration
-                    )
-                    step_data["duration_seconds"] = duration
-
-                if hasattr(metadata, "step_number"):
-                    step_data["step_number"] = metadata.step_number
-
-            # Get model output (thinking, actions, etc.)
-            if hasattr(history_item, "model_output") and history_item.model_output:
-                model_output = history_item.model_output
-                if hasattr(model_output, "thinking") and model_output.thinking:
-                    step_data["thinking"] = model_output.thinking
-                if (
-                    hasattr(model_output, "evaluation_previous_goal")
-                    and model_output.evaluation_previous_goal
-                ):
-                    step_data["evaluation_previous_goal"] = (
-                        model_output.evaluation_previous_goal
-                    )
-                if hasattr(model_output, "memory") and model_output.memory:
-                    step_data["memory"] = model_output.memory
-                if hasattr(model_output, "next_goal") and model_output.next_goal:
-                    step_data["next_goal"] = model_output.next_goal
-
-                # Extract actions
-                if hasattr(model_output, "action"):
-                    actions = []
-                    for action in model_output.action:
-                        # Convert action to dict
-                        action_dict = (
-                            action.model_dump() if hasattr(action, "model_dump") else {}
-                        )
-                        actions.append(action_dict)
-                    step_data["actions"] = actions
-
-            # Get action results
-            if hasattr(history_item, "result"):
-                results = []
-                for result in history_item.result:
-                    result_dict = (
-                        result.model_dump() if hasattr(result, "model_dump") else {}
-                    )
-                    results.append(result_dict)
-                step_data["results"] = results
+    # Save detailed per-step trajectory
+    write_json(
+        task_dir / "trajectory.json",
+        lambda: {"task_id": task_result["task_id"], "steps": per_step_stats()},
+        writer,
+    )
 
-            # Get browser state (URL)
-            if hasattr(history_item, "state") and history_item.state:
-                state = history_item.state
-                if hasattr(state, "url"):
-                    step_data["url"] = state.url
+    # Save full task result
+    write_json(task_dir / "full_result.json", task_result, writer)
+
+    # Save full agent history (assembled from the stream, else browser-use's
+    # built-in method)
+    if stream is not None:
+        write_json(task_dir / "agent_history.json", stream.read_history, writer)
+        if writer is not None:
+            writer.call(stream.remove)
+        else:
+            stream.remove()
+    elif hasattr(agent, "history"):
 
-            per_step_stats.append(step_data)
+        def save_history():
+            try:
+                agent.history.save_to_file(task_dir / "agent_history.json")
+            except Exception as e:
+                print(f"Warning: Could not save agent history: {e}")
 
-    # Fix min_step_duration if no steps were recorded
-    if step_timing_stats["min_step_duration"] == float("inf"):
-        step_timing_stats["min_step_duration"] = 0.0
+        if writer is not None:
+            writer.call(save_history)
+        else:
+            save_history()
 
-    # Save summary info (steps, cost, timing)
-    summary_info = {
-        "n_steps": task_result["n_steps"],
-        "time_elapsed": task_result["time_elapsed"],
-        "usage_info": task_result["usage_info"],
-        "step_timing": step_timing_stats,
-        "error": task_result["error"],
-        "terminated": task_result["terminated"],
-        "truncated": task_result["truncated"],
-    }
 
-    with open(task_dir / "summary_info.json", "w") as f:
-        json.dump(summary_info, f, indent=2)
+def completion_interval(results: List[Dict[str, Any]]):
+    """Wilson interval of the task completion rate over a list of runs."""
+    successes = sum(r["task_completion"] for r in results)
+    return wilson_interval(successes, len(results), CONFIDENCE_LEVEL)
 
-    # Save detailed per-step trajectory
-    trajectory = {"task_id": task_result["task_id"], "steps": per_step_stats}
 
-    with open(task_dir / "trajectory.json", "w") as f:
-        json.dump(trajectory, f, indent=2)
+def summarize_episodes(
+    all_results: List[Dict[str, Any]],
+    skipped_seeds: Optional[Dict[str, List[int]]] = None,
+) -> Dict[str, Any]:
+    """Aggregate repeated episodes (seeds) of every task with intervals."""
+    skipped_seeds = skipped_seeds or {}
 
-    # Save full task result
-    with open(task_dir / "full_result.json", "w") as f:
-        json.dump(task_result, f, indent=2)
+    by_task = {}
+    for result in all_results:
+        by_task.setdefault(result["task_id"], []).append(result)
 
-    # Save full agent history using browser-use's built-in method
-    if hasattr(agent, "history"):
-        try:
-            agent.history.save_to_file(task_dir / "agent_history.json")
-        except Exception as e:
-            print(f"Warning: Could not save agent history: {e}")
+    task_summaries = {}
+    for task_id, results in by_task.items():
+        results = sorted(results, key=lambda r: r["task_seed"])
+        f1 = mean_interval(
+            [r["f1_score"] for r in results], CONFIDENCE_LEVEL, (0, 1)
+        )
+        n_steps = mean_interval([r["n_steps"] for r in results], CONFIDENCE_LEVEL)
+        task_summaries[task_id] = {
+            "category": results[0]["category"],
+            "num_runs": len(results),
+            "seeds": [r["task_seed"] for r in results],
+            "skipped_seeds": skipped_seeds.get(task_id, []),
+            "avg_task_completion_rate": sum(r["task_completion"] for r in results)
+            / len(results),
+            "task_completion_ci": as_list(completion_interval(results)),
+            "avg_f1_score": f1[0],
+            "f1_score_ci": as_list(f1[1:]),
+            "avg_steps": n_steps[0],
+            "steps_ci": as_list(n_steps[1:]),
+        }
 
+    return task_summaries
 
-def save_study_summary(all_results: List[Dict[str, Any]], study_dir: Path):
-    """Save aggregated study summary."""
+
+def save_study_summary(
+    all_results: List[Dict[str, Any]],
+    study_dir: Path,
+    skipped_seeds: Optional[Dict[str, List[int]]] = None,
+    summary_name: str = "study_summary.json",
+    extra: Optional[Dict[str, Any]] = None,
+    writer: Optional[ResultWriter] = None,
+):
+    """Save aggregated study summary.
+
+    ``extra`` is merged into the top level of the summary (e.g. rerun info).
+    With ``writer`` the file is written on the writer thread.
+    """
     # Overall metrics
     total_tasks = len(all_results)
 
@@ -718,11 +1062,23 @@ def save_study_summary(all_results: List[Dict[str, Any]], study_dir: Path):
         "avg_precision": sum(r["precision"] for r in all_results) / total_tasks,
         "avg_recall": sum(r["recall"] for r in all_results) / total_tasks,
         "avg_f1_score": sum(r["f1_score"] for r in all_results) / total_tasks,
+        "num_tasks": len({r["task_id"] for r in all_results}),
+        "confidence_level": CONFIDENCE_LEVEL,
+        "task_completion_ci": as_list(completion_interval(all_results)),
+        "f1_score_ci": as_list(
+            mean_interval(
+                [r["f1_score"] for r in all_results], CONFIDENCE_LEVEL, (0, 1)
+            )[1:]
+        ),
         "avg_steps": sum(r["n_steps"] for r in all_results) / total_tasks,
         "avg_time_elapsed": sum(r["time_elapsed"] for r in all_results) / total_tasks,
         "terminated_rate": sum(1 for r in all_results if r["terminated"]) / total_tasks,
         "truncated_rate": sum(1 for r in all_results if r.get("truncated", False))
         / total_tasks,
+        "timeout_rate": sum(
+            1 for r in all_results if r.get("termination_reason") == "timeout"
+        )
+        / total_tasks,
         "total_tokens": total_tokens,
         "total_input_tokens": total_input_tokens,
         "total_output_tokens": total_output_tokens,
@@ -773,11 +1129,22 @@ def save_study_summary(all_results: List[Dict[str, Any]], study_dir: Path):
                 "avg_precision": sum(r["precision"] for r in results) / n_tasks,
                 "avg_recall": sum(r["recall"] for r in results) / n_tasks,
                 "avg_f1_score": sum(r["f1_score"] for r in results) / n_tasks,
+                "num_tasks": len({r["task_id"] for r in results}),
+                "task_completion_ci": as_list(completion_interval(results)),
+                "f1_score_ci": as_list(
+                    mean_interval(
+                        [r["f1_score"] for r in results], CONFIDENCE_LEVEL, (0, 1)
+                    )[1:]
+                ),
                 "avg_steps": sum(r["n_steps"] for r in results) / n_tasks,
                 "avg_time_elapsed": sum(r["time_elapsed"] for r in results) / n_tasks,
                 "terminated_rate": sum(1 for r in results if r["terminated"]) / n_tasks,
                 "truncated_rate": sum(1 for r in results if r.get("truncated", False))
                 / n_tasks,
+                "timeout_rate": sum(
+                    1 for r in results if r.get("termination_reason") == "timeout"
+                )
+                / n_tasks,
                 "total_tokens": cat_total_tokens,
                 "total_cost": cat_total_cost,
                 "avg_tokens_per_task": (
@@ -800,24 +1167,52 @@ def save_study_summary(all_results: List[Dict[str, Any]], study_dir: Path):
                     "recall": r["recall"],
                     "f1_score": r["f1_score"],
                     "n_steps": r["n_steps"],
+                    "time_elapsed": r["time_elapsed"],
                     "truncated": r.get("truncated", False),
                     "terminated": r["terminated"],
+                    "termination_reason": r.get("termination_reason"),
                     "error": r["error"],
                 }
                 for r in results
             ],
         }
 
-    study_summary = {"overall": avg_metrics, "by_task_type": task_type_summaries}
+    study_summary = {
+        "overall": avg_metrics,
+        "by_task_type": task_type_summaries,
+        "by_task": summarize_episodes(all_results, skipped_seeds),
+    }
+    network_stats = [r["network"] for r in all_results if r.get("network")]
+    if network_stats:
+        study_summary["network"] = sum_network_stats(network_stats)
+    observation_stats = [r["observation"] for r in all_results if r.get("observation")]
+    if observation_stats:
+        study_summary["observation"] = sum_observation_stats(observation_stats)
+    vision_stats = [r["vision"] for r in all_results if r.get("vision")]
+    if vision_stats:
+        study_summary["vision"] = sum_vision_stats(vision_stats)
+    catalog_stats = [r["catalog"] for r in all_results if r.get("catalog")]
+    if catalog_stats:
+        study_summary["catalog"] = {
+            "tasks": len(catalog_stats),
+            "tasks_with_searches": sum(1 for c in catalog_stats if c["searches"]),
+            "searches": sum(c["searches"] for c in catalog_stats),
+            "results": sum(c["results"] for c in catalog_stats),
+        }
+    study_summary.update(extra or {})
 
-    with open(study_dir / "study_summary.json", "w") as f:
-        json.dump(study_summary, f, indent=2)
+    write_json(study_dir / summary_name, study_summary, writer)
 
     print(f"\n{'='*80}")
-    print("STUDY SUMMARY")
+    print("STUDY SUMMARY" if summary_name == "study_summary.json" else summary_name)
     print(f"{'='*80}")
     print(f"Total tasks: {total_tasks}")
-    print(f"Task completion rate: {avg_metrics['avg_task_completion_rate']:.2%}")
+    print(f"Unique tasks: {avg_metrics['num_tasks']}")
+    ci_low, ci_high = avg_metrics["task_completion_ci"]
+    print(
+        f"Task completion rate: {avg_metrics['avg_task_completion_rate']:.2%} "
+        f"({CONFIDENCE_LEVEL:.0%} CI {ci_low:.2%}-{ci_high:.2%})"
+    )
     print(f"Average precision: {avg_metrics['avg_precision']:.2%}")
     print(f"Average recall: {avg_metrics['avg_recall']:.2%}")
     print(f"Average F1 score: {avg_metrics['avg_f1_score']:.2%}")
@@ -825,96 +1220,760 @@ def save_study_summary(all_results: List[Dict[str, Any]], study_dir: Path):
     print(f"Average time: {avg_metrics['avg_time_elapsed']:.1f}s")
     print(f"Terminated rate: {avg_metrics['terminated_rate']:.2%}")
     print(f"Truncated rate: {avg_metrics['truncated_rate']:.2%}")
-    print(f"Total tokens: {total_tokens:,}")
+    print(f"Timeout rate: {avg_metrics['timeout_rate']:.2%}")
+    print(
+        f"Total tokens: {total_tokens:,} "
+        f"({total_input_tokens:,} input, {total_output_tokens:,} output)"
+    )
     print(f"Total cost: ${total_cost:.4f}")
     print(f"Avg tokens/task: {avg_metrics['avg_tokens_per_task']:.0f}")
     print(f"Avg cost/task: ${avg_metrics['avg_cost_per_task']:.4f}")
+    if network_stats:
+        network = study_summary["network"]
+        print(
+            f"Network ({'/'.join(network['modes'])}): "
+            f"{network['allowed_requests']} requests allowed "
+            f"({network['allowed_bytes'] / 1e6:.1f} MB), "
+            f"{network['blocked_requests']} blocked "
+            f"({network['blocked_bytes'] / 1e6:.1f} MB in report mode)"
+        )
+    if observation_stats:
+        observation = study_summary["observation"]
+        print(
+            f"Lean observations: {observation['observations']} pages, "
+            f"{observation['reduction']:.0%} smaller "
+            f"({observation['chrome_lines_omitted']:,} navigation lines omitted)"
+        )
+    if vision_stats:
+        vision = study_summary["vision"]
+        print(
+            f"On-demand vision: {vision['vision_steps']} of "
+            f"{vision['vision_steps'] + vision['text_steps']} steps "
+            f"({vision['vision_step_share']:.0%}) in {vision['tasks_with_vision']} "
+            f"of {vision['tasks']} tasks"
+        )
+    if catalog_stats:
+        catalog = study_summary["catalog"]
+        print(
+            f"Product catalog: {catalog['searches']} searches in "
+            f"{catalog['tasks_with_searches']} of {catalog['tasks']} tasks"
+        )
     print(f"\nResults saved to: {study_dir}")
 
 
 # ============================================================================
-# Main Study Runner
+# Dry Run
 # ============================================================================
 
+PLACEHOLDER_RE = re.compile(r"\{\{[^{}]*\}\}")
 
-async def run_study(
-    max_steps: int = 30,
-    model: str = "gpt-4.1-2025-04-14",
-    temperature: float = 0.01,
-    task_limit: Optional[int] = None,
-    output_dir: Optional[str] = None,
-    use_vision: bool = True,
-):
-    """Run the full study on WebMall tasks."""
-    # Paths
+
+def study_paths() -> Tuple[Path, Path]:
+    """Taskset and results directory (env: TASKSET_PATH, RESULTS_DIR)."""
     script_dir = Path(__file__).parent
     task_sets_env = os.getenv("TASKSET_PATH")
     task_sets_path = Path(task_sets_env) if task_sets_env else (
         script_dir / "Browsergym/browsergym/webmall/src/browsergym/webmall/task_sets.json"
     )
-
     out_dir_env = os.getenv("RESULTS_DIR")
     output_dir = Path(out_dir_env) if out_dir_env else (script_dir / "study_results_browseruse")
+    return task_sets_path, output_dir
+
+
+def check_url_mappings() -> Tuple[List[str], List[str]]:
+    """Errors and warnings of the shop URL configuration."""
+    errors, warnings = [], []
+    for placeholder, env_var in URL_ENV_VARS.items():
+        url = URL_MAPPINGS[placeholder]
+        if not url:
+            errors.append(f"{env_var} is not set ({placeholder} cannot be resolved)")
+        elif not re.match(r"https?://", url):
+            warnings.append(f"{env_var}={url!r} is not an http(s) URL")
+        elif url.endswith("/"):
+            warnings.append(
+                f"{env_var}={url!r} ends with '/' (answers are compared without)"
+            )
+    return errors, warnings
 
-    if output_dir is None:
-        output_dir = script_dir / "study_results_browseruse"
+
+def check_task(task_config: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Errors and warnings of one task: placeholders and expected answers."""
+    task_id = task_config.get("id", "?")
+    errors, warnings = [], []
+    try:
+        instruction = prepare_task_instruction(task_config)
+        expected = get_expected_answers(task_config)
+    except Exception as e:
+        return [f"{task_id}: cannot be prepared ({e!r})"], []
+
+    unresolved = sorted(set(PLACEHOLDER_RE.findall(instruction)))
+    if unresolved:
+        errors.append(f"{task_id}: unresolved placeholders in instruction {unresolved}")
+    if not instruction.strip():
+        errors.append(f"{task_id}: empty instruction")
+    if not expected:
+        errors.append(f"{task_id}: no expected answers")
+
+    shop_urls = [url for url in URL_MAPPINGS.values() if url]
+    for answer in sorted(expected):
+        if PLACEHOLDER_RE.search(answer):
+            errors.append(f"{task_id}: unresolved placeholder in answer {answer!r}")
+        elif re.match(r"https?://", answer) and not any(
+            answer.startswith(url) for url in shop_urls
+        ):
+            warnings.append(f"{task_id}: answer outside the configured shops {answer!r}")
+    return errors, warnings
+
+
+def dry_run(
+    max_steps: int,
+    episodes: int = 1,
+    task_limit: Optional[int] = None,
+    selection: Optional[Dict[str, Any]] = None,
+    rerun_plan: Optional[Dict[str, Any]] = None,
+    sweep: Optional[List[Dict[str, Any]]] = None,
+    step_budget: Optional[Dict[str, Any]] = None,
+    config: Optional[Dict[str, Any]] = None,
+) -> bool:
+    """Validate the study configuration without running (or importing) an agent.
+
+    Resolves the task selection, checks URL placeholders and expected answers
+    and estimates the step, token and cost budget from the earlier studies in
+    the results directory (see webmall_budget) that ran ``config`` (or the
+    settings shared by a ``sweep``, and per configuration of it), under the
+    planned ``step_budget``. Returns False on errors.
+    """
+    started = time.perf_counter()
+    task_sets_path, output_dir = study_paths()
+    errors, warnings = check_url_mappings()
+    if not os.getenv("OPENAI_API_KEY"):
+        warnings.append("OPENAI_API_KEY is not set (required for the real run)")
+
+    selection = dict(selection or {})
+    if task_limit:
+        selection["limit"] = task_limit
+    if rerun_plan:
+        selection["ids"] = sorted({task_id for task_id, _ in plan_jobs(rerun_plan)})
+    try:
+        all_tasks = load_all_tasks(str(task_sets_path), selection)
+    except Exception as e:
+        all_tasks = []
+        errors.append(f"cannot load taskset {task_sets_path}: {e!r}")
+    else:
+        if not all_tasks:
+            errors.append("the selection matches no tasks")
+
+    seen: Set[str] = set()
+    for task_config in all_tasks:
+        if task_config.get("id") in seen:
+            errors.append(f"{task_config.get('id')}: duplicate task id")
+        seen.add(task_config.get("id"))
+        # Without all shop URLs every task fails the same way; reported once
+        if all(URL_MAPPINGS.values()):
+            task_errors, task_warnings = check_task(task_config)
+            errors += task_errors
+            warnings += task_warnings
+
+    # One entry per planned run, so the budget covers seeds and reruns alike
+    history = load_history(
+        output_dir, config_filter=history_filter(sweep or [config or {}])
+    )
+    step_budgets = plan_step_budgets(history, **step_budget) if step_budget else None
+    if rerun_plan:
+        tasks_by_id = {t["id"]: t for t in all_tasks}
+        missing = {task_id for task_id, _ in plan_jobs(rerun_plan)} - tasks_by_id.keys()
+        if missing:
+            warnings.append(f"{len(missing)} rerun task(s) not in the taskset")
+        planned = [
+            tasks_by_id[task_id]
+            for task_id, _ in plan_jobs(rerun_plan)
+            if task_id in tasks_by_id
+        ]
+        budget = estimate_budget(planned, history, max_steps, step_budgets=step_budgets)
     else:
-        output_dir = Path(output_dir)
+        budget = estimate_budget(
+            all_tasks, history, max_steps, episodes, step_budgets=step_budgets
+        )
+
+    print(f"\n{'='*80}")
+    print("DRY RUN")
+    print(f"{'='*80}")
+    print(f"Taskset: {task_sets_path}")
+    print(f"Results: {output_dir}")
+    for placeholder, env_var in URL_ENV_VARS.items():
+        print(f"  {placeholder} {env_var}={URL_MAPPINGS[placeholder]}")
+    print(f"History: {history['studies']} studies ({describe_history(history)})")
+    if sweep:
+        print(f"\nEstimated budget of {len(sweep)} configurations:")
+        for sweep_config in sweep:
+            config_history = load_history(
+                output_dir, config_filter=history_filter([sweep_config])
+            )
+            config_budget = estimate_budget(
+                all_tasks,
+                config_history,
+                sweep_config["max_steps"],
+                episodes,
+                step_budgets,
+            )
+            cost = config_budget["cost"]
+            print(
+                f"  {sweep_config['name']:<46} {config_budget['runs']:>5} runs "
+                f"{config_budget['steps']:>9.0f} steps "
+                + (f"${cost:.2f}" if cost is not None else "cost unknown")
+                + f"  ({config_history['studies']} studies)"
+            )
+    else:
+        print_budget(budget)
+    if step_budgets is not None:
+        simulation = simulate_step_budgets(history, step_budgets, max_steps)
+        print_step_budgets(
+            simulation, max_steps, title="Step budgets replayed on the earlier runs"
+        )
+    for warning in warnings:
+        print(f"⚠️  {warning}")
+    for error in errors:
+        print(f"❌ {error}")
+    print(
+        f"\n{'❌' if errors else '✅'} {len(all_tasks)} tasks checked: {len(errors)} "
+        f"error(s), {len(warnings)} warning(s) in {time.perf_counter() - started:.2f}s"
+    )
+    return not errors
+
+
+# ============================================================================
+# Main Study Runner
+# ============================================================================
+
+
+async def run_study(
+    max_steps: int = 30,
+    model: str = "gpt-4.1-2025-04-14",
+    temperature: float = 0.01,
+    task_limit: Optional[int] = None,
+    output_dir: Optional[str] = None,
+    use_vision: Union[bool, str] = True,
+    episodes: int = 1,
+    max_parallel: int = 1,
+    early_stop_ci_width: Optional[float] = None,
+    min_episodes: int = 3,
+    selection: Optional[Dict[str, Any]] = None,
+    rerun_plan: Optional[Dict[str, Any]] = None,
+    status_port: Optional[int] = None,
+    task_timeout: Optional[float] = None,
+    stall_timeout: Optional[float] = None,
+    isolation: str = "none",
+    tasks_per_worker: int = 10,
+    worker_max_rss_mb: Optional[float] = None,
+    profile: Optional[List[str]] = None,
+    wait_profile: str = "browsergym",
+    sweep: Optional[List[Dict[str, Any]]] = None,
+    llm_rpm: Optional[float] = None,
+    network_filter: str = "off",
+    network_rules: Optional[List[Dict[str, Any]]] = None,
+    observation: str = "full",
+    vision_triggers: Optional[Dict[str, Any]] = None,
+    catalog: bool = False,
+    product_catalog: Optional[str] = None,
+    queue: Optional[str] = None,
+    worker_id: Optional[str] = None,
+    step_budget: Optional[Dict[str, Any]] = None,
+):
+    """Run the full study on WebMall tasks.
+
+    Every task is run for ``episodes`` seeds. Seeds are scheduled round by
+    round (seed 0 of every task, then seed 1, ...) across ``max_parallel``
+    concurrent workers. With ``early_stop_ci_width`` set, the remaining seeds
+    of a task are skipped once at least ``min_episodes`` runs are done and the
+    Wilson interval of its completion rate is no wider than that value.
+
+    With ``rerun_plan`` (see webmall_rerun) only the planned (task, seed) runs
+    are executed and a combined summary with the source study is written.
+
+    With ``sweep`` (configurations from webmall_sweep.expand_sweep) every run
+    is done once per configuration; the runs of all configurations are
+    interleaved through the same workers and each configuration gets its own
+    directory and summary below the sweep directory.
+
+    Progress is written to <study_dir>/status.json and, with ``status_port``,
+    served over HTTP (see webmall_status).
+
+    With ``isolation="process"`` tasks run in recyclable worker processes
+    (see webmall_workers) so memory stays bounded over long studies.
+
+    ``profile`` lists the profiling modes (see webmall_profile); every task
+    gets a profile.json and the study a profile_rollup.json.
+
+    ``llm_rpm`` caps the LLM requests per minute of all agents together
+    (see webmall_ratelimit). ``network_filter`` / ``network_rules`` set up
+    request blocking in the browsers (see webmall_netfilter); ``observation``
+    "lean" compacts the page observations (see webmall_observation);
+    ``use_vision`` "on_demand" sends screenshots only on the
+    ``vision_triggers`` (see webmall_vision); ``catalog`` adds the search
+    action on the ``product_catalog`` (see webmall_catalog).
+
+    With ``queue`` (a study name) the study lives in <results>/<queue> and
+    its runs are claimed from a work queue there (see webmall_queue), so any
+    number of runners started with the same settings can share it; the last
+    runner to finish writes the summaries.
+
+    With ``step_budget`` (see webmall_budget.parse_step_budget) the max_steps
+    of a run is the step budget of its task category, learned from the
+    earlier studies in the results directory; the summaries report the steps
+    and tokens this saved.
+    """
+    # Paths
+    task_sets_path, output_dir = study_paths()
+
+    # Configurations: the sweep, or the single configuration of the arguments
+    configs = sweep or [
+        {
+            "name": None,
+            "model": model,
+            "temperature": temperature,
+            "use_vision": use_vision,
+            "max_steps": max_steps,
+            "wait_profile": wait_profile,
+            "network_filter": network_filter,
+            "observation": observation,
+            "catalog": catalog,
+        }
+    ]
 
     # Create study directory
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    study_name = f"{timestamp}_browseruse-gpt-4.1-on-webmall"
+    if queue:
+        study_name = queue
+    elif sweep:
+        study_name = f"{timestamp}_browseruse-sweep-on-webmall"
+    else:
+        short_model = re.sub(r"-\d{4}-\d{2}-\d{2}$", "", model)
+        study_name = f"{timestamp}_browseruse-{short_model}-on-webmall"
+    if rerun_plan:
+        study_name += "_rerun"
     study_dir = output_dir / study_name
     study_dir.mkdir(parents=True, exist_ok=True)
 
     print(f"Study directory: {study_dir}")
 
-    # Load tasks
-    all_tasks = load_all_tasks(str(task_sets_path))
-
-    # Limit tasks if specified
+    # Configuration directories (the study directory itself without a sweep)
+    config_dirs = {
+        c["name"]: study_dir / c["name"] if sweep else study_dir for c in configs
+    }
+    if sweep:
+        for config_dir in config_dirs.values():
+            config_dir.mkdir(exist_ok=True)
+        write_json(study_dir / SWEEP_FILE, configs)
+        print(f"Sweep over {len(configs)} configurations: " + ", ".join(config_dirs))
+
+    # Load tasks (task_limit is kept as a shorthand for selection limit)
+    selection = dict(selection or {})
     if task_limit:
-        all_tasks = all_tasks[:task_limit]
-        print(f"Limited to {task_limit} tasks for testing")
-
-    # Run each task
-    all_results = []
-    for i, task_config in enumerate(all_tasks, 1):
-        task_id = task_config["id"]
-        task_seed = 0  # Default seed
+        selection["limit"] = task_limit
+    if rerun_plan:
+        save_rerun_plan(rerun_plan, study_dir)
+        selection["ids"] = sorted({task_id for task_id, _ in plan_jobs(rerun_plan)})
+    all_tasks = load_all_tasks(str(task_sets_path), selection)
+
+    if rerun_plan:
+        # Rerun exactly the planned (task, seed) runs
+        tasks_by_id = {t["id"]: t for t in all_tasks}
+        jobs = deque(
+            (configs[0], tasks_by_id[task_id], task_seed)
+            for task_id, task_seed in plan_jobs(rerun_plan)
+            if task_id in tasks_by_id
+        )
+        print(
+            f"Rerunning {len(jobs)} runs of {rerun_plan['source_study']} "
+            f"({max_parallel} parallel)"
+        )
+    else:
+        # Schedule (configuration, task, seed) jobs round by round; the
+        # configurations of a task run back to back
+        jobs = deque(
+            (config, task_config, task_seed)
+            for task_seed in range(episodes)
+            for task_config in all_tasks
+            for config in configs
+        )
+        print(
+            f"Scheduled {len(jobs)} runs ({len(all_tasks)} tasks x {episodes} episodes"
+            + (f" x {len(configs)} configurations" if sweep else "")
+            + f", {max_parallel} parallel)"
+        )
+    total_jobs = len(jobs)
+
+    # Step budgets per category from the successful runs of earlier studies
+    step_budgets: Dict[str, int] = {}
+    if step_budget:
+        # Learned from earlier studies of the settings all configurations share
+        budget_history = load_history(output_dir, config_filter=history_filter(configs))
+        step_budgets = plan_step_budgets(budget_history, **step_budget)
+
+    def job_key(config_name: Optional[str], task_id: str, task_seed: int) -> str:
+        key = f"{task_id}#{task_seed}"
+        return f"{config_name}/{key}" if config_name else key
+
+    work_queue = None
+    if queue:
+        # Runs are claimed from the queue shared with the other runners
+        jobs_by_key = {
+            job_key(c["name"], t["id"], seed): (c, t, seed) for c, t, seed in jobs
+        }
+        work_queue = WorkQueue(study_dir / QUEUE_FILE, worker_id)
+        try:
+            meta = work_queue.open(
+                {
+                    "timestamp": timestamp,
+                    "configs": configs,
+                    "step_budgets": step_budgets,
+                },
+                [
+                    (key, config["name"], task_config["id"], task_seed)
+                    for key, (config, task_config, task_seed) in jobs_by_key.items()
+                ],
+            )
+        except ValueError as e:
+            print(f"ERROR: {e}")
+            exit(1)
+        # Task directories and step budgets are those of the first runner
+        timestamp = meta["timestamp"]
+        step_budgets = meta["step_budgets"]
+        print(f"Work queue: {work_queue.path} (runner {work_queue.worker_id})")
+
+    if step_budget:
+        simulation = simulate_step_budgets(budget_history, step_budgets, max_steps)
+        write_json(
+            study_dir / STEP_BUDGETS_FILE,
+            {
+                "spec": step_budget,
+                "budgets": step_budgets,
+                "history": {
+                    key: budget_history[key]
+                    for key in ("studies", "filter", "sources", "skipped_studies")
+                },
+                "simulation": simulation,
+            },
+        )
+        print_step_budgets(
+            simulation,
+            max_steps,
+            title=f"Step budgets replayed on {budget_history['studies']} earlier "
+            f"studies ({describe_history(budget_history)})",
+        )
 
-        print(f"\n[{i}/{len(all_tasks)}] Running {task_id}...")
+    # One status file per runner when several share the study; its queued
+    # count and ETA come from the queue, so they cover the whole study
+    status_file = f"status_{work_queue.worker_id}.json" if work_queue else STATUS_FILE
+    # Result files (and status snapshots) are written off the event loop
+    writer = ResultWriter()
+    progress = StudyProgress(
+        study_dir,
+        total_jobs,
+        status_file=status_file,
+        writer=writer,
+        study_runs=work_queue.progress if work_queue else None,
+    )
+    if work_queue:
+        progress.add_metrics("queue", work_queue.stats)
+    progress.add_metrics("writer", writer.stats)
+    rate_limiter = RateLimiter(llm_rpm) if llm_rpm else None
+    if rate_limiter:
+        progress.add_metrics("rate_limiter", rate_limiter.stats)
+    status_server = serve_status(progress, status_port) if status_port else None
+
+    results_by_config: Dict[Optional[str], List[Dict[str, Any]]] = {
+        c["name"]: [] for c in configs
+    }
+    results_by_task: Dict[Tuple[Optional[str], str], List[Dict[str, Any]]] = {}
+    skipped_seeds: Dict[Optional[str], Dict[str, List[int]]] = {
+        c["name"]: {} for c in configs
+    }
+    started = 0
+
+    def is_settled(config_name: Optional[str], task_id: str) -> bool:
+        """Whether the completion interval of a task is already tight enough."""
+        if early_stop_ci_width is None:
+            return False
+        runs = results_by_task.get((config_name, task_id), [])
+        if len(runs) < min_episodes:
+            return False
+        return interval_width(completion_interval(runs)) <= early_stop_ci_width
+
+    def run_options(
+        config: Dict[str, Any], task_config: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Keyword arguments of run_agent_on_task for a configuration (and task)."""
+        options = {k: v for k, v in config.items() if k != "name"}
+        options.update(task_timeout=task_timeout, stall_timeout=stall_timeout)
+        if options.get("network_filter", "off") != "off":
+            options["network_rules"] = network_rules
+        if options.get("use_vision") == VISION_ON_DEMAND:
+            options["vision_triggers"] = vision_triggers
+        if options.get("catalog"):
+            options["product_catalog"] = product_catalog
+        if task_config is not None and step_budgets:
+            category = task_config.get("category", "Unknown")
+            options["max_steps"] = step_limit(
+                step_budgets, category, config["max_steps"]
+            )
+        return options
+
+    # Process isolation: one recyclable worker process per concurrent slot
+    loop = asyncio.get_running_loop()
+    slots: List["Optional[WorkerProcess]"] = [None] * max(1, max_parallel)
+    executor = None
+    worker_deadline = None
+    profiler = Profiler(profile) if profile and isolation != "process" else None
+    if isolation == "process":
+        from webmall_workers import WorkerProcess
+
+        slots = [
+            WorkerProcess(
+                tasks_per_worker,
+                worker_max_rss_mb,
+                profile_modes=profile,
+                rate_limiter=rate_limiter,
+            )
+            for _ in slots
+        ]
+        executor = ThreadPoolExecutor(max_workers=len(slots))
+        if task_timeout:
+            worker_deadline = task_timeout + 120
+        print(
+            f"Process isolation: {len(slots)} worker(s), recycled after "
+            f"{tasks_per_worker} task(s)"
+            + (f" or {worker_max_rss_mb:.0f} MB RSS" if worker_max_rss_mb else "")
+        )
 
-        # Prepare task directory and gif path
+    async def next_job() -> Optional[Tuple[Dict[str, Any], Dict[str, Any], int, int]]:
+        """Next (config, task, seed, attempt) of the local list or the queue."""
+        if work_queue is None:
+            return (*jobs.popleft(), 1) if jobs else None
+        while True:
+            claimed = await loop.run_in_executor(None, work_queue.claim)
+            if claimed is not None:
+                key, attempt = claimed
+                return (*jobs_by_key[key], attempt)
+            if not await loop.run_in_executor(None, work_queue.remaining):
+                return None
+            # Other runners hold the rest: wait in case one of them dies
+            await asyncio.sleep(POLL_SECONDS)
+
+    def task_dir_of(config_name: Optional[str], task_id: str, task_seed: int) -> Path:
         task_folder_name = f"{timestamp}_browseruse_on_{task_id}_{task_seed}"
-        task_dir = study_dir / task_folder_name
-        task_dir.mkdir(parents=True, exist_ok=True)
-        gif_output_path = str(task_dir / "agent_history.gif")
-
-        # Run task
-        task_result, agent = await run_agent_on_task(
-            task_config,
-            task_seed,
-            max_steps,
-            model,
-            temperature,
-            gif_output_path,
-            use_vision,
-        )
+        return config_dirs[config_name] / task_folder_name
+
+    async def worker(slot: Optional[WorkerProcess]):
+        nonlocal started
+        while True:
+            job = await next_job()
+            if job is None:
+                break
+            config, task_config, task_seed, attempt = job
+            task_id = task_config["id"]
+            config_name = config["name"]
+            run_key = job_key(config_name, task_id, task_seed)
+
+            if work_queue is not None and early_stop_ci_width is not None:
+                # Settle on the runs of all runners
+                rows = await loop.run_in_executor(
+                    None, work_queue.results, config_name, task_id
+                )
+                results_by_task[(config_name, task_id)] = [
+                    row["result"] for row in rows if row["result"]
+                ]
+            if is_settled(config_name, task_id):
+                skipped_seeds[config_name].setdefault(task_id, []).append(task_seed)
+                progress.run_skipped(run_key)
+                if work_queue is not None:
+                    await loop.run_in_executor(None, work_queue.skip, run_key)
+                print(f"Skipping {run_key} (interval settled)")
+                continue
 
-        # Save results
-        save_task_results(task_result, agent, task_dir)
+            started += 1
+            print(f"\n[{started}/{total_jobs}] Running {run_key}...")
+
+            # Prepare task directory
+            task_dir = task_dir_of(config_name, task_id, task_seed)
+            if attempt > 1:
+                # Left behind by a runner whose lease expired
+                print(f"Retrying {run_key} (attempt {attempt})")
+                shutil.rmtree(task_dir, ignore_errors=True)
+            task_dir.mkdir(parents=True, exist_ok=True)
+
+            def report_step(steps, tokens=0, cost=0.0, run_key=run_key):
+                progress.step_finished(run_key, steps, tokens, cost)
+
+            # Run task (results are saved to task_dir by execute_run)
+            progress.run_started(run_key, task_id, task_config.get("category", ""))
+            if slot is None:
+                profiling = (
+                    profiler.profile_task(task_dir, writer) if profiler else nullcontext()
+                )
+                async with profiling:
+                    task_result, shop_errors = await execute_run(
+                        task_config,
+                        task_seed,
+                        task_dir,
+                        dict(
+                            run_options(config, task_config), rate_limiter=rate_limiter
+                        ),
+                        report_step,
+                        writer,
+                    )
+            else:
+                task_result, shop_errors, failure = await loop.run_in_executor(
+                    executor,
+                    slot.run,
+                    task_config,
+                    task_seed,
+                    task_dir,
+                    run_options(config, task_config),
+                    report_step,
+                    worker_deadline,
+                )
+                if failure:
+                    print(f"❌ Worker failed on {run_key}: {failure[1]}")
+                    # Keep whatever the worker streamed before it died
+                    stream = StepStream(task_dir)
+                    task_result = failed_run_result(task_config, task_seed, *failure)
+                    task_result["n_steps"] = len(stream.read_steps())
+                    save_task_results(task_result, None, task_dir, stream, writer)
+            progress.run_finished(run_key, task_result, shop_errors)
+            if work_queue is not None:
+                await loop.run_in_executor(
+                    None, work_queue.complete, run_key, task_result
+                )
 
-        all_results.append(task_result)
+            results_by_config[config_name].append(task_result)
+            results_by_task.setdefault((config_name, task_id), []).append(task_result)
 
-        # Print brief status
-        status = "✅ SUCCESS" if task_result["task_completion"] == 1.0 else "❌ FAILED"
-        print(
-            f"{status} - Precision: {task_result['precision']:.2%}, Recall: {task_result['recall']:.2%}"
+            # Print brief status
+            status = "✅ SUCCESS" if task_result["task_completion"] == 1.0 else "❌ FAILED"
+            print(
+                f"{status} {run_key} - Precision: {task_result['precision']:.2%}, Recall: {task_result['recall']:.2%}"
+            )
+
+    async def heartbeat():
+        """Keep the leases of this runner's runs."""
+        while True:
+            await asyncio.sleep(work_queue.lease_seconds / 4)
+            try:
+                await loop.run_in_executor(None, work_queue.heartbeat)
+            except Exception as e:
+                print(f"Warning: work queue heartbeat failed: {e!r}")
+
+    heartbeat_task = asyncio.create_task(heartbeat()) if work_queue else None
+    try:
+        await asyncio.gather(*(worker(slot) for slot in slots))
+    except BaseException:
+        # Flush the results of finished runs before giving up
+        writer.close()
+        if work_queue is not None:
+            # Hand the interrupted runs to the other runners
+            work_queue.release()
+        raise
+    finally:
+        if heartbeat_task is not None:
+            heartbeat_task.cancel()
+        if executor is not None:
+            for slot in slots:
+                slot.stop()
+            executor.shutdown()
+            print(f"Recycled worker processes: {sum(s.recycled for s in slots)}")
+
+    # With a queue, the summaries cover the runs of all runners and are
+    # written by the last one to finish
+    finalize = True
+    if work_queue is not None:
+        finalize = await loop.run_in_executor(None, work_queue.finish)
+        if finalize:
+            results_by_config = {c["name"]: [] for c in configs}
+            skipped_seeds = {c["name"]: {} for c in configs}
+            for row in work_queue.results():
+                _, task_config, task_seed = jobs_by_key[row["key"]]
+                if row["state"] == "done":
+                    results_by_config[row["config"]].append(row["result"])
+                elif row["state"] == "skipped":
+                    skipped_seeds[row["config"]].setdefault(
+                        row["task_id"], []
+                    ).append(task_seed)
+                else:
+                    # Lease expired max_attempts times (killed its runners)
+                    task_dir = task_dir_of(row["config"], row["task_id"], task_seed)
+                    task_dir.mkdir(parents=True, exist_ok=True)
+                    task_result = failed_run_result(
+                        task_config,
+                        task_seed,
+                        "lost",
+                        f"Lease expired {row['attempts']} times",
+                    )
+                    save_task_results(
+                        task_result, None, task_dir, StepStream(task_dir), writer
+                    )
+                    results_by_config[row["config"]].append(task_result)
+        else:
+            print("Done; the last runner to finish writes the study summary")
+
+    # Save study summary (one per configuration of a sweep)
+    if finalize:
+        for config in configs:
+            results = results_by_config[config["name"]]
+            # The configuration is recorded for the budget history as well
+            extra = {"config": run_options(config)}
+            if step_budget:
+                outcome = step_budget_outcome(
+                    results, step_budgets, config["max_steps"], budget_history
+                )
+                extra["step_budget"] = {"spec": step_budget, "by_category": outcome}
+            save_study_summary(
+                results,
+                config_dirs[config["name"]],
+                skipped_seeds[config["name"]],
+                extra=extra or None,
+                writer=writer,
+            )
+            if step_budget:
+                print_step_budgets(
+                    outcome, config["max_steps"], title="Step budgets of this study"
+                )
+    if sweep and finalize:
+        sweep_summary = summarize_sweep(configs, results_by_config)
+        write_json(study_dir / SWEEP_SUMMARY_FILE, sweep_summary, writer)
+        print_sweep_summary(sweep_summary)
+
+    if rerun_plan:
+        # The merged results are read back from the task directories
+        writer.flush()
+        save_study_summary(
+            load_merged_results(study_dir),
+            study_dir,
+            summary_name=COMBINED_SUMMARY_FILE,
+            extra={"rerun": rerun_outcome(rerun_plan, results_by_config[None])},
+            writer=writer,
         )
 
-    # Save study summary
-    save_study_summary(all_results, study_dir)
+    writer.close()
+    if profiler:
+        profiler.stop()
+    if profile and finalize:
+        for config_dir in config_dirs.values():
+            rollup(config_dir)
+    progress.finish()
+    if status_server:
+        status_server.shutdown()
+    stats = writer.stats()
+    print(
+        f"Result writer: {stats['files_written']} files, {stats['batches']} batches, "
+        f"max queue {stats['max_queue_depth']}, blocked {stats['blocked_seconds']}s"
+    )
+    if rate_limiter:
+        stats = rate_limiter.stats()
+        print(
+            f"LLM rate limiter: {stats['requests']} requests, {stats['delayed_requests']} "
+            f"delayed by {stats['wait_seconds']}s in total"
+        )
 
 
 # ============================================================================
@@ -922,29 +1981,336 @@ async def run_study(
 # ============================================================================
 
 
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse CLI options. Every option defaults to an environment variable so
+    the docker-compose setup can configure the study without a command line."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--model",
+        default=os.getenv("MODEL", "gpt-4.1-2025-04-14"),
+        help="OpenAI model of the agent (env: MODEL)",
+    )
+    parser.add_argument(
+        "--temperature",
+        type=float,
+        default=float(os.getenv("TEMPERATURE", "0.01")),
+        help="Sampling temperature (env: TEMPERATURE)",
+    )
+    parser.add_argument(
+        "--max-steps",
+        type=int,
+        default=int(os.getenv("MAX_STEPS", "50")),
+        help="Step limit per task (env: MAX_STEPS)",
+    )
+    parser.add_argument(
+        "--step-budget",
+        default=os.getenv("STEP_BUDGET", ""),
+        help="Step limit per task category from earlier studies, e.g. p95+5: the "
+        "95th percentile of the steps of successful runs plus 5, at most "
+        "--max-steps (env: STEP_BUDGET)",
+    )
+    parser.add_argument(
+        "--use-vision",
+        type=parse_use_vision,
+        default=parse_use_vision(os.getenv("USE_VISION") or "false"),
+        help="Send screenshots to the model: true, false or on_demand (only "
+        "when the DOM path stalls, see --vision-triggers) (env: USE_VISION)",
+    )
+    parser.add_argument(
+        "--vision-triggers",
+        default=os.getenv("VISION_TRIGGERS", ""),
+        help="When on_demand vision sends a screenshot, e.g. "
+        "'failures=2;unchanged=1;categories=Substitute' (env: VISION_TRIGGERS, "
+        "see webmall_vision.py)",
+    )
+    parser.add_argument(
+        "--wait-profile",
+        choices=sorted(WAIT_PROFILES),
+        default=os.getenv("WAIT_PROFILE", "browsergym"),
+        help="Page load waits of the browser (env: WAIT_PROFILE)",
+    )
+    parser.add_argument(
+        "--network-filter",
+        choices=NETWORK_FILTER_MODES,
+        default=os.getenv("NETWORK_FILTER", "off"),
+        help="Block images, fonts, media and trackers in the browser, or only "
+        "report what would be blocked (env: NETWORK_FILTER)",
+    )
+    parser.add_argument(
+        "--network-rules",
+        default=os.getenv("NETWORK_RULES", ""),
+        help="JSON file of network filter rules, default rules if not given "
+        "(env: NETWORK_RULES)",
+    )
+    parser.add_argument(
+        "--observation",
+        choices=OBSERVATION_MODES,
+        default=os.getenv("OBSERVATION", "full"),
+        help="Page observations sent to the model: browser-use's, or lean ones "
+        "with fewer attributes, cut texts and no repeated shop navigation "
+        "(env: OBSERVATION)",
+    )
+    parser.add_argument(
+        "--catalog",
+        type=parse_bool,
+        default=parse_bool(os.getenv("CATALOG") or "false"),
+        help="Give the agent a search action over the local product catalog of "
+        "all shops, true/false (env: CATALOG)",
+    )
+    parser.add_argument(
+        "--product-catalog",
+        default=os.getenv("PRODUCT_CATALOG", ""),
+        help="Product catalog built by webmall_catalog.py, default "
+        "<results>/catalog.sqlite (env: PRODUCT_CATALOG)",
+    )
+    parser.add_argument(
+        "--sweep",
+        default=os.getenv("SWEEP", ""),
+        help="Grid over model, temperature, use_vision, max_steps, wait_profile, "
+        "network_filter, observation and catalog, e.g. 'model=a,b;use_vision=false,true', "
+        "or a JSON file; unset keys keep the options above (env: SWEEP, see "
+        "webmall_sweep.py)",
+    )
+    parser.add_argument(
+        "--llm-rpm",
+        type=float,
+        default=float(os.getenv("LLM_RPM", "0")),
+        help="LLM requests per minute of all agents together, 0 disables "
+        "(env: LLM_RPM)",
+    )
+    parser.add_argument(
+        "--episodes",
+        type=int,
+        default=int(os.getenv("EPISODES", "1")),
+        help="Number of seeds per task (env: EPISODES)",
+    )
+    parser.add_argument(
+        "--max-parallel",
+        type=int,
+        default=int(os.getenv("MAX_PARALLEL", "1")),
+        help="Number of concurrently running agents (env: MAX_PARALLEL)",
+    )
+    parser.add_argument(
+        "--early-stop-ci-width",
+        type=float,
+        default=(
+            float(os.environ["EARLY_STOP_CI_WIDTH"])
+            if os.getenv("EARLY_STOP_CI_WIDTH")
+            else None
+        ),
+        help="Skip remaining seeds of a task once its completion interval is "
+        "no wider than this (env: EARLY_STOP_CI_WIDTH)",
+    )
+    parser.add_argument(
+        "--min-episodes",
+        type=int,
+        default=int(os.getenv("MIN_EPISODES", "3")),
+        help="Seeds to run before early stopping is considered (env: MIN_EPISODES)",
+    )
+    parser.add_argument(
+        "--select",
+        default=os.getenv("TASK_SELECT", ""),
+        help="Task selection spec, e.g. 'categories=Substitute;ids=*Task1*;limit=5' "
+        "(env: TASK_SELECT, see webmall_tasksets.py)",
+    )
+    parser.add_argument(
+        "--rerun-from",
+        default=os.getenv("RERUN_FROM") or None,
+        help="Study directory whose matching runs are rerun (env: RERUN_FROM)",
+    )
+    parser.add_argument(
+        "--rerun-filter",
+        default=os.getenv("RERUN_FILTER", DEFAULT_RERUN_FILTER),
+        help="Which runs to rerun, e.g. 'error,truncated,incomplete,f1<0.5' "
+        "(env: RERUN_FILTER)",
+    )
+    parser.add_argument(
+        "--status-port",
+        type=int,
+        default=int(os.getenv("STATUS_PORT", "0")),
+        help="Serve live progress on this port, 0 disables (env: STATUS_PORT)",
+    )
+    parser.add_argument(
+        "--queue",
+        default=os.getenv("WORK_QUEUE", ""),
+        help="Study name shared by several runners: the study goes to "
+        "<results>/<name> and its runs are pulled from a work queue there, "
+        "see webmall_queue.py (env: WORK_QUEUE)",
+    )
+    parser.add_argument(
+        "--worker-id",
+        default=os.getenv("WORKER_ID", ""),
+        help="Name of this runner in the work queue, default <hostname>-<pid> "
+        "(env: WORKER_ID)",
+    )
+    parser.add_argument(
+        "--task-timeout",
+        type=float,
+        default=float(os.getenv("TASK_TIMEOUT", "1800")),
+        help="Wall-clock limit per task in seconds, 0 disables (env: TASK_TIMEOUT)",
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=float(os.getenv("STEP_STALL_TIMEOUT", "300")),
+        help="Limit without step progress in seconds, 0 disables "
+        "(env: STEP_STALL_TIMEOUT)",
+    )
+    parser.add_argument(
+        "--isolation",
+        choices=("none", "process"),
+        default=os.getenv("TASK_ISOLATION", "none"),
+        help="Run tasks in recyclable worker processes (env: TASK_ISOLATION)",
+    )
+    parser.add_argument(
+        "--tasks-per-worker",
+        type=int,
+        default=int(os.getenv("TASKS_PER_WORKER", "10")),
+        help="Recycle a worker process after this many tasks (env: TASKS_PER_WORKER)",
+    )
+    parser.add_argument(
+        "--worker-max-rss-mb",
+        type=float,
+        default=float(os.getenv("WORKER_MAX_RSS_MB", "3072")),
+        help="Recycle a worker process when its RSS plus that of its browsers "
+        "exceeds this many MB, 0 disables (env: WORKER_MAX_RSS_MB)",
+    )
+    parser.add_argument(
+        "--profile",
+        default=os.getenv("PROFILE", ""),
+        help="Profiling modes: cpu,loop,memory or all; empty disables (env: PROFILE)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        default=os.getenv("DRY_RUN", "").lower() in ("1", "true", "yes"),
+        help="Validate the taskset, URLs and answers and estimate the budget "
+        "without running agents; exits 1 on errors (env: DRY_RUN)",
+    )
+    return parser.parse_args(argv)
+
+
 def main():
     """Main entry point."""
-    # Check API key
-    if not os.getenv("OPENAI_API_KEY"):
+    args = parse_args()
+
+    # Check API key (a dry run only warns about it)
+    if not args.dry_run and not os.getenv("OPENAI_API_KEY"):
         print("ERROR: OPENAI_API_KEY not found in environment variables.")
         print("Please set it in your .env file or export it.")
         exit(1)
 
     # Configuration
-    max_steps = 50
-    model = "gpt-4.1-2025-04-14"
-    # temperature = 0.01
     task_limit = None  # Set to a number for testing, None for full run
-    use_vision = False  # Set to False to disable vision/screenshot processing
+    base_config = {
+        "model": args.model,
+        "temperature": args.temperature,
+        "use_vision": args.use_vision,
+        "max_steps": args.max_steps,
+        "wait_profile": args.wait_profile,
+        "network_filter": args.network_filter,
+        "observation": args.observation,
+        "catalog": args.catalog,
+    }
+    sweep = None
+    if args.sweep:
+        try:
+            sweep = expand_sweep(base_config, parse_sweep(args.sweep))
+        except (OSError, ValueError) as e:
+            print(f"ERROR: invalid sweep {args.sweep!r}: {e}")
+            exit(1)
+        if args.rerun_from:
+            print("ERROR: a sweep cannot be combined with a rerun.")
+            exit(1)
+
+    if args.queue and args.rerun_from:
+        print("ERROR: a work queue cannot be combined with a rerun.")
+        exit(1)
+
+    try:
+        network_rules = load_rules(args.network_rules)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: invalid network rules {args.network_rules!r}: {e}")
+        exit(1)
+    try:
+        selection = parse_selection(args.select)
+        step_budget = parse_step_budget(args.step_budget)
+        vision_triggers = parse_vision_triggers(args.vision_triggers)
+        rerun_filter = parse_rerun_filter(args.rerun_filter)
+        profile = parse_profile_modes(args.profile)
+    except ValueError as e:
+        print(f"ERROR: {e}")
+        exit(1)
+
+    rerun_plan = None
+    if args.rerun_from:
+        try:
+            rerun_plan = build_rerun_plan(Path(args.rerun_from), rerun_filter)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: cannot rerun {args.rerun_from}: {e}")
+            exit(1)
+        # Reruns replace runs of the source study: run them the same way
+        recorded = rerun_plan["config"]
+        if recorded is None:
+            print(
+                f"Warning: {args.rerun_from} records no configuration; "
+                "rerunning with the current one"
+            )
+        else:
+            for key, value in base_config.items():
+                if key in recorded and recorded[key] != value:
+                    print(f"Rerun uses {key}={recorded[key]!r} of the source study")
+                    base_config[key] = recorded[key]
+        if not rerun_plan["runs"]:
+            print(f"Nothing to rerun in {args.rerun_from} ({args.rerun_filter})")
+            return
+
+    product_catalog = args.product_catalog or str(study_paths()[1] / CATALOG_FILE)
+    if any(config["catalog"] for config in sweep or [base_config]):
+        if not Path(product_catalog).exists():
+            print(f"ERROR: product catalog {product_catalog} not found.")
+            print("Build it with: python webmall_catalog.py build")
+            exit(1)
+
+    if args.dry_run:
+        valid = dry_run(
+            max_steps=base_config["max_steps"],
+            episodes=args.episodes,
+            task_limit=task_limit,
+            selection=selection,
+            rerun_plan=rerun_plan,
+            sweep=sweep,
+            step_budget=step_budget,
+            config=base_config,
+        )
+        exit(0 if valid else 1)
 
     # Run study
     asyncio.run(
         run_study(
-            max_steps=max_steps,
-            model=model,
-            # temperature=temperature,
+            **base_config,
             task_limit=task_limit,
-            use_vision=use_vision,
+            episodes=args.episodes,
+            max_parallel=args.max_parallel,
+            early_stop_ci_width=args.early_stop_ci_width,
+            min_episodes=args.min_episodes,
+            selection=selection,
+            rerun_plan=rerun_plan,
+            status_port=args.status_port or None,
+            task_timeout=args.task_timeout or None,
+            stall_timeout=args.stall_timeout or None,
+            isolation=args.isolation,
+            tasks_per_worker=args.tasks_per_worker,
+            worker_max_rss_mb=args.worker_max_rss_mb or None,
+            profile=profile,
+            sweep=sweep,
+            llm_rpm=args.llm_rpm or None,
+            network_rules=network_rules,
+            vision_triggers=vision_triggers,
+            product_catalog=product_catalog,
+            queue=args.queue or None,
+            worker_id=args.worker_id or None,
+            step_budget=step_budget,
         )
     )
 
@@ -0,0 +1,467 @@
+"""
+Step, token and cost budgets estimated from earlier studies.
+
+Only the study_summary.json files of earlier studies in a results directory
+(and of the configurations of sweeps in it) are read, never the task
+directories, so an estimate for a full taskset takes milliseconds. Runs of
+other models or agent settings take different numbers of steps, so the
+history can be limited to the studies of one configuration (the
+HISTORY_KEYS recorded in their summaries); studies without a recorded
+configuration are then left out. From the studies the history keeps
+
+    per task      the step counts of its earlier runs
+    per category  tokens and cost per step (total usage / total steps)
+    overall       the same ratios over all categories
+
+A task is estimated with the mean steps of its earlier runs, falling back to
+the mean of its category and finally to max_steps (an upper bound without
+usage). Tokens and cost are its steps times the per-step usage of its
+category, or of all categories if the category was never run.
+
+Step budgets replace the global max_steps with a limit per category, learned
+from the steps its successful runs took: with the spec ``p95+5`` a category
+gets the 95th percentile of those steps plus 5 (capped at max_steps).
+Categories with fewer than MIN_SUCCESSES successful runs keep max_steps.
+simulate_step_budgets() replays the earlier runs under the budgets to show
+the steps and tokens they would have saved and the successes they would have
+cut off; step_budget_outcome() estimates the savings of a study run with them.
+
+Usage:
+    python webmall_budget.py /results [--limit 5]
+    python webmall_budget.py /results --step-budget p95+5 --max-steps 50 \
+        --config "model=gpt-4.1;use_vision=false"
+"""
+
+import argparse
+import json
+import math
+import re
+from pathlib import Path
+from statistics import mean
+from typing import Any, Dict, List, Optional, Tuple
+
+SUMMARY_FILE = "study_summary.json"
+STEP_BUDGETS_FILE = "step_budgets.json"
+
+# Successful runs a category needs before it gets a step budget
+MIN_SUCCESSES = 5
+
+# Settings of a configuration that change how many steps its runs take
+HISTORY_KEYS = ("model", "use_vision", "observation", "catalog")
+
+STEP_BUDGET_RE = re.compile(r"^p(\d{1,2}(?:\.\d+)?)(?:\+(\d+))?$")
+
+
+def _add_usage(usage: Dict[str, float], entry: Dict[str, Any]) -> None:
+    """Add the steps and usage of a summary entry (overall or category)."""
+    runs = entry.get("num_runs", entry.get("num_total_runs", 0))
+    steps = entry.get("avg_steps", 0) * runs
+    if not steps or not entry.get("total_tokens"):
+        return
+    usage["steps"] = usage.get("steps", 0.0) + steps
+    usage["tokens"] = usage.get("tokens", 0.0) + entry["total_tokens"]
+    usage["cost"] = usage.get("cost", 0.0) + entry.get("total_cost", 0.0)
+
+
+def history_filter(configs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """HISTORY_KEYS settings shared by all ``configs`` (of a study or sweep)."""
+    shared = {}
+    for key in HISTORY_KEYS:
+        values = {json.dumps(config.get(key)) for config in configs}
+        if len(values) == 1:
+            shared[key] = configs[0].get(key)
+    return shared
+
+
+def _same_setting(a: Any, b: Any) -> bool:
+    # Filters given on the command line are strings ("false", "on_demand")
+    return str(a).lower() == str(b).lower()
+
+
+def parse_history_filter(spec: Optional[str]) -> Dict[str, str]:
+    """History filter of a spec like 'model=gpt-4.1;use_vision=false'."""
+    config_filter = {}
+    for part in (spec or "").split(";"):
+        key, _, value = part.partition("=")
+        key, value = key.strip(), value.strip()
+        if not key:
+            continue
+        if key not in HISTORY_KEYS:
+            raise ValueError(
+                f"Unknown history key {key!r} (known: {', '.join(HISTORY_KEYS)})"
+            )
+        config_filter[key] = value
+    return config_filter
+
+
+def load_history(
+    results_dir: Path,
+    limit: Optional[int] = None,
+    config_filter: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Steps and per-step usage of the studies in ``results_dir``.
+
+    Studies are the study directories and the configuration directories of
+    sweeps. With ``config_filter`` (HISTORY_KEYS -> value) only studies that
+    recorded these settings are read; with ``limit`` only the most recent
+    ones (by path, which starts with the timestamp).
+    """
+    results_dir = Path(results_dir)
+    summaries = sorted(
+        list(results_dir.glob(f"*/{SUMMARY_FILE}"))
+        + list(results_dir.glob(f"*/*/{SUMMARY_FILE}")),
+        reverse=True,
+    )
+
+    task_steps: Dict[str, List[float]] = {}
+    category_steps: Dict[str, List[float]] = {}
+    # (steps, completed) of every run, for step budgets
+    category_runs: Dict[str, List[Tuple[int, bool]]] = {}
+    category_usage: Dict[str, Dict[str, float]] = {}
+    overall_usage: Dict[str, float] = {}
+    studies: List[Dict[str, Any]] = []
+    skipped = 0
+    for path in summaries:
+        if limit and len(studies) >= limit:
+            break
+        try:
+            summary = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        config = summary.get("config") or {}
+        if config_filter and not all(
+            key in config and _same_setting(config[key], value)
+            for key, value in config_filter.items()
+        ):
+            skipped += 1
+            continue
+        studies.append(
+            {
+                "study": str(path.parent.relative_to(results_dir)),
+                **{key: config[key] for key in HISTORY_KEYS if key in config},
+                **({"max_steps": config["max_steps"]} if "max_steps" in config else {}),
+            }
+        )
+        for category, entry in summary.get("by_task_type", {}).items():
+            for run in entry.get("tasks", []):
+                if run.get("n_steps"):
+                    task_steps.setdefault(run["task_id"], []).append(run["n_steps"])
+                    category_steps.setdefault(category, []).append(run["n_steps"])
+                    category_runs.setdefault(category, []).append(
+                        (run["n_steps"], run.get("task_completion") == 1.0)
+                    )
+            _add_usage(
+                category_usage.setdefault(category, {}), entry.get("summary", {})
+            )
+        _add_usage(overall_usage, summary.get("overall", {}))
+
+    return {
+        "studies": len(studies),
+        "filter": dict(config_filter or {}),
+        "sources": studies,
+        "skipped_studies": skipped,
+        "task_steps": task_steps,
+        "category_steps": category_steps,
+        "category_runs": category_runs,
+        "category_usage": {c: u for c, u in category_usage.items() if u},
+        "overall_usage": overall_usage,
+    }
+
+
+def per_step_usage(history: Dict[str, Any], category: str) -> Optional[Dict[str, float]]:
+    """Tokens and cost per step of a category (or overall), None without data."""
+    usage = history["category_usage"].get(category) or history["overall_usage"]
+    if not usage:
+        return None
+    return {
+        "tokens": usage["tokens"] / usage["steps"],
+        "cost": usage["cost"] / usage["steps"],
+    }
+
+
+def estimate_steps(
+    history: Dict[str, Any], task_id: str, category: str, max_steps: int
+) -> Dict[str, Any]:
+    """Expected steps of one run of a task and what the estimate is based on."""
+    if history["task_steps"].get(task_id):
+        steps, basis = mean(history["task_steps"][task_id]), "task"
+    elif history["category_steps"].get(category):
+        steps, basis = mean(history["category_steps"][category]), "category"
+    else:
+        steps, basis = max_steps, "max_steps"
+    return {"steps": min(steps, max_steps), "basis": basis}
+
+
+def estimate_budget(
+    tasks: List[Dict[str, Any]],
+    history: Dict[str, Any],
+    max_steps: int,
+    episodes: int = 1,
+    step_budgets: Optional[Dict[str, int]] = None,
+) -> Dict[str, Any]:
+    """Expected steps, tokens and cost of running ``tasks`` for ``episodes`` seeds.
+
+    With ``step_budgets`` the steps of a task are capped at the budget of
+    its category instead of max_steps.
+    """
+    by_category: Dict[str, Dict[str, Any]] = {}
+    basis_counts: Dict[str, int] = {}
+    for task in tasks:
+        category = task.get("category", "Unknown")
+        limit = step_limit(step_budgets or {}, category, max_steps)
+        estimate = estimate_steps(history, task["id"], category, limit)
+        usage = per_step_usage(history, category)
+        basis_counts[estimate["basis"]] = basis_counts.get(estimate["basis"], 0) + 1
+
+        entry = by_category.setdefault(
+            category, {"runs": 0, "steps": 0.0, "tokens": 0.0, "cost": 0.0}
+        )
+        entry["runs"] += episodes
+        entry["steps"] += estimate["steps"] * episodes
+        if usage is None:
+            entry["tokens"] = entry["cost"] = None
+        elif entry["tokens"] is not None:
+            entry["tokens"] += usage["tokens"] * estimate["steps"] * episodes
+            entry["cost"] += usage["cost"] * estimate["steps"] * episodes
+
+    def total(key):
+        values = [e[key] for e in by_category.values()]
+        return None if None in values else sum(values)
+
+    for entry in by_category.values():
+        entry["steps"] = round(entry["steps"], 1)
+        if entry["tokens"] is not None:
+            entry["tokens"] = round(entry["tokens"])
+            entry["cost"] = round(entry["cost"], 4)
+
+    return {
+        "studies": history["studies"],
+        "runs": sum(e["runs"] for e in by_category.values()),
+        "steps": round(total("steps"), 1),
+        "tokens": total("tokens"),
+        "cost": None if total("cost") is None else round(total("cost"), 4),
+        "basis": basis_counts,
+        "by_category": by_category,
+    }
+
+
+def parse_step_budget(spec: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Quantile and margin of a ``pQ[+M]`` spec (e.g. p95+5), None if empty."""
+    spec = (spec or "").strip().lower()
+    if not spec or spec == "off":
+        return None
+    match = STEP_BUDGET_RE.match(spec)
+    if not match:
+        raise ValueError(f"Not a step budget (e.g. p95+5): {spec!r}")
+    return {"quantile": float(match.group(1)) / 100, "margin": int(match.group(2) or 0)}
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Linearly interpolated ``q`` quantile (0..1) of ``values``."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    low, high = math.floor(position), math.ceil(position)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def plan_step_budgets(
+    history: Dict[str, Any],
+    quantile: float,
+    margin: int = 0,
+    min_successes: int = MIN_SUCCESSES,
+) -> Dict[str, int]:
+    """Step budget per category: ``quantile`` of its successful runs + ``margin``.
+
+    The budgets are not capped here; step_limit() caps them at the max_steps
+    of a run.
+    """
+    budgets = {}
+    for category, runs in sorted(history["category_runs"].items()):
+        steps = [n for n, completed in runs if completed]
+        if len(steps) >= min_successes:
+            budgets[category] = math.ceil(percentile(steps, quantile)) + margin
+    return budgets
+
+
+def step_limit(step_budgets: Dict[str, int], category: str, max_steps: int) -> int:
+    """max_steps of a run of ``category``: its budget, at most ``max_steps``."""
+    return min(max_steps, step_budgets.get(category, max_steps))
+
+
+def _steps_beyond(
+    history: Dict[str, Any], category: str, limit: int, max_steps: int
+) -> float:
+    """Expected steps under max_steps of a run that did not finish by ``limit``."""
+    runs = history["category_runs"].get(category, [])
+    longer = [min(n, max_steps) for n, _ in runs if n > limit]
+    return mean(longer) if longer else max_steps
+
+
+def simulate_step_budgets(
+    history: Dict[str, Any], step_budgets: Dict[str, int], max_steps: int
+) -> Dict[str, Dict[str, Any]]:
+    """The earlier runs of every category replayed under the step budgets."""
+    report = {}
+    for category, runs in sorted(history["category_runs"].items()):
+        limit = step_limit(step_budgets, category, max_steps)
+        saved = sum(min(n, max_steps) - min(n, limit) for n, _ in runs)
+        usage = per_step_usage(history, category)
+        report[category] = {
+            "budget": limit,
+            "runs": len(runs),
+            "runs_at_budget": sum(1 for n, _ in runs if n >= limit),
+            "successes": sum(1 for _, completed in runs if completed),
+            "successes_over_budget": sum(
+                1 for n, completed in runs if completed and n > limit
+            ),
+            "steps_saved": saved,
+            "tokens_saved": round(saved * usage["tokens"]) if usage else None,
+        }
+    return report
+
+
+def step_budget_outcome(
+    results: List[Dict[str, Any]],
+    step_budgets: Dict[str, int],
+    max_steps: int,
+    history: Dict[str, Any],
+) -> Dict[str, Dict[str, Any]]:
+    """Steps and tokens the step budgets saved in a study (estimated).
+
+    A run truncated at a budget below max_steps would have gone on; it is
+    credited the mean steps of the earlier runs of its category that went
+    past the budget (max_steps without such runs), at its own tokens/step.
+    """
+    report: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        category = result.get("category", "Unknown")
+        limit = step_limit(step_budgets, category, max_steps)
+        entry = report.setdefault(
+            category,
+            {
+                "budget": limit,
+                "runs": 0,
+                "runs_at_budget": 0,
+                "steps_saved": 0.0,
+                "tokens_saved": 0,
+            },
+        )
+        entry["runs"] += 1
+        n_steps = result.get("n_steps", 0)
+        if limit < max_steps and result.get("truncated") and n_steps >= limit:
+            entry["runs_at_budget"] += 1
+            saved = _steps_beyond(history, category, limit, max_steps) - n_steps
+            tokens = ((result.get("usage_info") or {}).get("tokens") or {}).get(
+                "total_tokens", 0
+            )
+            entry["steps_saved"] += saved
+            entry["tokens_saved"] += round(saved * tokens / n_steps) if n_steps else 0
+    for entry in report.values():
+        entry["steps_saved"] = round(entry["steps_saved"], 1)
+    return dict(sorted(report.items()))
+
+
+def print_step_budgets(
+    report: Dict[str, Dict[str, Any]], max_steps: int, title: str = "Step budgets"
+) -> None:
+    """Budgets and savings per category (of simulate_step_budgets or
+    step_budget_outcome) and their totals."""
+    print(f"\n{title} (max_steps {max_steps}):")
+    for category, entry in report.items():
+        tokens = "?" if entry["tokens_saved"] is None else f"{entry['tokens_saved']:,}"
+        cut = (
+            f", {entry['successes_over_budget']}/{entry['successes']} successes "
+            "over budget"
+            if "successes_over_budget" in entry
+            else ""
+        )
+        print(
+            f"  {category:<28} budget {entry['budget']:>3}  {entry['runs']:>5} runs, "
+            f"{entry['runs_at_budget']:>4} at budget, {entry['steps_saved']:>7} steps "
+            f"and {tokens} tokens saved{cut}"
+        )
+    steps = sum(e["steps_saved"] for e in report.values())
+    tokens = [e["tokens_saved"] for e in report.values()]
+    tokens_total = "?" if None in tokens else f"{sum(tokens):,}"
+    print(f"  Total saved: {steps:.0f} steps, {tokens_total} tokens")
+
+
+def describe_history(history: Dict[str, Any]) -> str:
+    """The configuration a history was learned from, for logs."""
+    if not history["filter"]:
+        return "all configurations"
+    text = ", ".join(f"{key}={value}" for key, value in history["filter"].items())
+    if history["skipped_studies"]:
+        text += f"; skipped {history['skipped_studies']} of other configurations"
+    return text
+
+
+def print_budget(budget: Dict[str, Any]) -> None:
+    print(f"\nEstimated budget (from {budget['studies']} earlier studies):")
+    for category, entry in sorted(budget["by_category"].items()):
+        tokens = f"{entry['tokens']:,}" if entry["tokens"] is not None else "?"
+        cost = f"${entry['cost']:.2f}" if entry["cost"] is not None else "?"
+        print(
+            f"  {category:<28} {entry['runs']:>5} runs {entry['steps']:>9.1f} steps "
+            f"{tokens:>14} tokens {cost:>10}"
+        )
+    tokens = f"{budget['tokens']:,}" if budget["tokens"] is not None else "unknown"
+    cost = f"${budget['cost']:.2f}" if budget["cost"] is not None else "unknown"
+    print(
+        f"  Total: {budget['runs']} runs, {budget['steps']:.0f} steps, "
+        f"{tokens} tokens, {cost}"
+    )
+    basis = ", ".join(f"{n} by {b}" for b, n in sorted(budget["basis"].items()))
+    print(f"  Step estimates: {basis}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Budget of earlier WebMall studies")
+    parser.add_argument("results_dir", help="Directory containing the study directories")
+    parser.add_argument("--limit", type=int, help="Only read the N most recent studies")
+    parser.add_argument(
+        "--step-budget", help="Plan step budgets (e.g. p95+5) and replay the runs"
+    )
+    parser.add_argument(
+        "--max-steps", type=int, default=50, help="Step limit the budgets are capped at"
+    )
+    parser.add_argument(
+        "--config",
+        help="Only read studies of this configuration "
+        f"(e.g. 'model=gpt-4.1;use_vision=false'; keys: {', '.join(HISTORY_KEYS)})",
+    )
+    args = parser.parse_args()
+    try:
+        config_filter = parse_history_filter(args.config)
+    except ValueError as e:
+        parser.error(str(e))
+
+    history = load_history(Path(args.results_dir), args.limit, config_filter)
+    print(f"Studies: {history['studies']} ({describe_history(history)})")
+    for category, steps in sorted(history["category_steps"].items()):
+        usage = per_step_usage(history, category)
+        per_step = (
+            f", {usage['tokens']:,.0f} tokens / ${usage['cost']:.4f} per step"
+            if usage
+            else ""
+        )
+        print(
+            f"  {category:<28} {len(steps):>5} runs, "
+            f"{mean(steps):.1f} steps per run{per_step}"
+        )
+
+    if args.step_budget:
+        try:
+            spec = parse_step_budget(args.step_budget)
+        except ValueError as e:
+            parser.error(str(e))
+        step_budgets = plan_step_budgets(history, **spec)
+        print_step_budgets(
+            simulate_step_budgets(history, step_budgets, args.max_steps),
+            args.max_steps,
+            title="Step budgets replayed on the earlier runs",
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Local product catalog of the four WebMall shops, searchable by the agent.
+
+Most steps of the product search tasks go to paging through the search
+results of one shop after the other. The catalog indexes the products of all
+shops once (name, price, categories, short description and canonical product
+URL) in a SQLite FTS5 table; with it, the agent gets a ``search_catalog``
+action that queries all shops in one step and returns the product URLs it can
+answer with or open.
+
+Building crawls the public WooCommerce Store API of every shop
+(/?rest_route=/wc/store/v1/products, no credentials, independent of the
+permalink settings):
+
+    python webmall_catalog.py build [--output /results/catalog.sqlite]
+    python webmall_catalog.py search "AMD Ryzen 9 5900X" [--max-price 400]
+
+The study runner registers the action for configurations with catalog on
+(PRODUCT_CATALOG=<path>, CATALOG=true or the "catalog" sweep key), so a sweep
+over catalog=false,true compares it with pure browsing on n_steps, time and
+tokens.
+"""
+
+import argparse
+import html
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+CATALOG_FILE = "catalog.sqlite"
+
+# Shop names (as in the task instructions) and the env vars of their URLs
+SHOP_ENV_VARS = {
+    "E-Store Athletes": "SHOP1_URL",
+    "TechTalk": "SHOP2_URL",
+    "CamelCases": "SHOP3_URL",
+    "Hardware Cafe": "SHOP4_URL",
+}
+
+PAGE_SIZE = 100
+MAX_RESULTS = 20
+
+SCHEMA = """
+CREATE VIRTUAL TABLE products USING fts5(
+    name,
+    categories,
+    description,
+    shop UNINDEXED,
+    price UNINDEXED,
+    regular_price UNINDEXED,
+    currency UNINDEXED,
+    in_stock UNINDEXED,
+    url UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def shop_urls() -> Dict[str, str]:
+    """Shops whose URL is configured in the environment."""
+    return {
+        shop: os.environ[env_var].rstrip("/")
+        for shop, env_var in SHOP_ENV_VARS.items()
+        if os.getenv(env_var)
+    }
+
+
+def plain_text(value: str) -> str:
+    return " ".join(html.unescape(_TAG_RE.sub(" ", value or "")).split())
+
+
+def fetch_products(shop_url: str, timeout: float = 30.0) -> Iterator[Dict[str, Any]]:
+    """All published products of a WooCommerce shop from its Store API."""
+    page = 1
+    while True:
+        url = (
+            f"{shop_url}/?rest_route=/wc/store/v1/products"
+            f"&per_page={PAGE_SIZE}&page={page}"
+        )
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            items = json.load(response)
+            total_pages = int(response.headers.get("X-WP-TotalPages") or page)
+        yield from items
+        if not items or page >= total_pages:
+            return
+        page += 1
+
+
+def product_row(shop: str, item: Dict[str, Any]) -> Dict[str, Any]:
+    """Catalog row of a Store API product."""
+    prices = item.get("prices") or {}
+    scale = 10 ** int(prices.get("currency_minor_unit") or 0)
+
+    def price(key: str) -> Optional[float]:
+        value = prices.get(key)
+        return int(value) / scale if value not in (None, "") else None
+
+    return {
+        "name": plain_text(item.get("name", "")),
+        "categories": ", ".join(c["name"] for c in item.get("categories") or []),
+        "description": plain_text(item.get("short_description", "")),
+        "shop": shop,
+        "price": price("price"),
+        "regular_price": price("regular_price"),
+        "currency": prices.get("currency_code", ""),
+        "in_stock": int(bool(item.get("is_in_stock", True))),
+        "url": item.get("permalink", "").rstrip("/"),
+    }
+
+
+def build_catalog(path: Path, shops: Dict[str, str]) -> Dict[str, int]:
+    """Index the products of ``shops`` (name -> URL) into a new catalog.
+
+    The catalog is written next to ``path`` and moved into place at the end,
+    so runners never see a half-built one. Returns the products per shop.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    partial.unlink(missing_ok=True)
+    counts = {}
+    conn = sqlite3.connect(partial)
+    try:
+        conn.executescript(SCHEMA)
+        for shop, url in shops.items():
+            rows = [product_row(shop, item) for item in fetch_products(url)]
+            conn.executemany(
+                "INSERT INTO products VALUES (:name, :categories, :description, "
+                ":shop, :price, :regular_price, :currency, :in_stock, :url)",
+                rows,
+            )
+            counts[shop] = len(rows)
+            print(f"  {shop:<20} {len(rows):>6} products  ({url})")
+        conn.execute("INSERT INTO products(products) VALUES ('optimize')")
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [("built_at", str(time.time())), ("shops", json.dumps(shops))],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    partial.replace(path)
+    return counts
+
+
+def match_query(query: str, any_word: bool = False) -> str:
+    """FTS5 query of the words of ``query`` (all of them, or any)."""
+    words = [f'"{word}"' for word in _WORD_RE.findall(query)]
+    return (" OR " if any_word else " ").join(words)
+
+
+class ProductCatalog:
+    """Read-only searches in a built catalog."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        if not self.path.exists():
+            raise FileNotFoundError(
+                f"No product catalog at {self.path} "
+                "(build it with: python webmall_catalog.py build)"
+            )
+        self.searches = 0
+        self.results = 0
+
+    def search(
+        self,
+        query: str,
+        max_price: Optional[float] = None,
+        limit: int = MAX_RESULTS,
+    ) -> List[Dict[str, Any]]:
+        """Best matches of all words of ``query``, else of any of them."""
+        sql = "SELECT shop, name, price, regular_price, currency, in_stock, "
+        sql += "categories, url FROM products WHERE products MATCH ?"
+        if max_price is not None:
+            sql += " AND price <= ?"
+        sql += " ORDER BY bm25(products, 10.0, 2.0, 1.0) LIMIT ?"
+
+        rows: List[Any] = []
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            for any_word in (False, True):
+                match = match_query(query, any_word)
+                if not match:
+                    break
+                params: List[Any] = [match]
+                if max_price is not None:
+                    params.append(max_price)
+                rows = conn.execute(sql, params + [limit]).fetchall()
+                if rows:
+                    break
+        finally:
+            conn.close()
+
+        keys = ("shop", "name", "price", "regular_price", "currency", "in_stock")
+        results = [dict(zip(keys + ("categories", "url"), row)) for row in rows]
+        self.searches += 1
+        self.results += len(results)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return {"searches": self.searches, "results": self.results}
+
+
+def format_results(query: str, results: List[Dict[str, Any]]) -> str:
+    """Search results as the agent reads them."""
+    if not results:
+        return f"No products in the catalog match {query!r}."
+    lines = [f"{len(results)} catalog products matching {query!r}:"]
+    for r in results:
+        price = f"{r['price']:.2f} {r['currency']}" if r["price"] is not None else "?"
+        if r["regular_price"] and r["price"] and r["regular_price"] > r["price"]:
+            price += f" (on sale, regular {r['regular_price']:.2f})"
+        stock = "" if r["in_stock"] else " [out of stock]"
+        lines.append(
+            f"- {r['shop']} | {r['name']} | {price}{stock} | "
+            f"{r['categories']} | {r['url']}"
+        )
+    return "\n".join(lines)
+
+
+def register_catalog_action(tools, catalog: ProductCatalog) -> None:
+    """Add the ``search_catalog`` action to a browser-use Tools registry."""
+    from browser_use.agent.views import ActionResult
+
+    @tools.action(
+        "Search the products of all four shops at once in a local catalog "
+        "(name, price, categories, product URL). Use it to find candidate "
+        "offers instead of paging through each shop's search; open the "
+        "product URLs to check details. Optional max_price filters by price."
+    )
+    async def search_catalog(query: str, max_price: Optional[float] = None):
+        results = catalog.search(query, max_price=max_price)
+        text = format_results(query, results)
+        return ActionResult(
+            extracted_content=text,
+            long_term_memory=f"Searched the catalog for {query!r}: "
+            f"{len(results)} products",
+            include_extracted_content_only_once=True,
+        )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=("build", "search"))
+    parser.add_argument("query", nargs="?", default="")
+    parser.add_argument(
+        "--output",
+        "--catalog",
+        dest="catalog",
+        default=os.getenv("PRODUCT_CATALOG")
+        or str(Path(os.getenv("RESULTS_DIR", "/results")) / CATALOG_FILE),
+        help="Catalog file (env: PRODUCT_CATALOG, default <results>/catalog.sqlite)",
+    )
+    parser.add_argument("--max-price", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        shops = shop_urls()
+        if not shops:
+            print("ERROR: no shop URLs (SHOP1_URL ... SHOP4_URL) configured.")
+            return 1
+        print(f"Indexing {len(shops)} shops into {args.catalog}")
+        try:
+            counts = build_catalog(Path(args.catalog), shops)
+        except OSError as e:
+            print(f"ERROR: could not crawl the shops: {e}")
+            return 1
+        print(f"Catalog: {sum(counts.values())} products")
+        return 0
+
+    if not args.query:
+        parser.error("search needs a query")
+    try:
+        catalog = ProductCatalog(Path(args.catalog))
+    except FileNotFoundError as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(format_results(args.query, catalog.search(args.query, args.max_price)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+Resource-blocking browser mode for the browser-use runner.
+
+The WooCommerce shops load product images, web fonts, theme assets and
+tracking scripts on every navigation. The DOM-based agent (use_vision off)
+needs none of them, but browser-use waits for them before it reads the page.
+NetworkFilter intercepts these requests over CDP and fails them in the
+browser (net::ERR_BLOCKED_BY_CLIENT), leaving documents, stylesheets and
+first-party scripts - everything the DOM the agent sees is built from -
+untouched.
+
+Rules are checked in order, the first matching rule decides, and requests no
+rule matches are allowed. A rule is a dict with
+
+    action  "block" or "allow"
+    hosts   host[:port] globs, e.g. ["localhost:8083"]  (default: any host)
+    types   CDP resource types, e.g. ["Image", "Font"]  (default: any type)
+    urls    URL globs, e.g. ["*googletagmanager.com/*"] (default: any URL)
+
+so per-shop exceptions go before the general rules:
+
+    [{"action": "allow", "hosts": ["localhost:8083"], "types": ["Image"]},
+     {"action": "block", "types": ["Image", "Media", "Font"]}]
+
+Modes: "block" blocks, "report" only counts what would be blocked (with its
+size, which blocking cannot observe). Either way per-task stats of allowed
+and blocked requests and bytes, by resource type and host, end up in the
+task result. Tabs are configured when browser-use reports them and, for tabs
+opened by a page, at the start of the next step.
+"""
+
+import asyncio
+import json
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+NETWORK_FILTER_MODES = ("off", "report", "block")
+
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    # Analytics and tracking, whatever they load
+    {
+        "action": "block",
+        "urls": [
+            "*google-analytics.com/*",
+            "*googletagmanager.com/*",
+            "*doubleclick.net/*",
+            "*facebook.net/*",
+            "*hotjar.com/*",
+            "*/wp-content/plugins/*tracking*",
+        ],
+    },
+    # Not part of the DOM the agent reads
+    {"action": "block", "types": ["Image", "Media", "Font"]},
+]
+
+
+def load_rules(path: Optional[str]) -> List[Dict[str, Any]]:
+    """Rules from a JSON file (a list of rules), DEFAULT_RULES without one."""
+    if not path:
+        return DEFAULT_RULES
+    rules = json.loads(Path(path).read_text(encoding="utf-8"))
+    for rule in rules:
+        if rule.get("action") not in ("block", "allow"):
+            raise ValueError(f"Rule without block/allow action: {rule}")
+        unknown = set(rule) - {"action", "hosts", "types", "urls"}
+        if unknown:
+            raise ValueError(f"Unknown rule keys {sorted(unknown)}: {rule}")
+    return rules
+
+
+def rule_matches(rule: Dict[str, Any], url: str, host: str, resource_type: str) -> bool:
+    if rule.get("types") and resource_type not in rule["types"]:
+        return False
+    if rule.get("hosts") and not any(fnmatchcase(host, g) for g in rule["hosts"]):
+        return False
+    if rule.get("urls") and not any(fnmatchcase(url, g) for g in rule["urls"]):
+        return False
+    return True
+
+
+def is_blocked(rules: List[Dict[str, Any]], url: str, resource_type: str) -> bool:
+    """Decision of the first matching rule (allow if none matches)."""
+    host = urlsplit(url).netloc
+    for rule in rules:
+        if rule_matches(rule, url, host, resource_type):
+            return rule["action"] == "block"
+    return False
+
+
+def fetch_patterns(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Fetch.enable patterns that pause every request a block rule could match.
+
+    Only these requests make the round trip to Python, where the full rule
+    list (including allow exceptions) decides.
+    """
+    patterns = []
+    for rule in rules:
+        if rule["action"] != "block":
+            continue
+        url_globs = rule.get("urls") or [
+            f"*://{host}/*" for host in rule.get("hosts") or ["*"]
+        ]
+        for url_glob in url_globs:
+            for resource_type in rule.get("types") or [None]:
+                pattern = {"urlPattern": url_glob, "requestStage": "Request"}
+                if resource_type:
+                    pattern["resourceType"] = resource_type
+                if pattern not in patterns:
+                    patterns.append(pattern)
+    return patterns
+
+
+def _empty_counts() -> Dict[str, Any]:
+    return {
+        "allowed_requests": 0,
+        "allowed_bytes": 0,
+        "blocked_requests": 0,
+        "blocked_bytes": 0,
+    }
+
+
+class NetworkFilter:
+    """Blocks (or reports) requests of one browser session by rule."""
+
+    def __init__(
+        self, rules: Optional[List[Dict[str, Any]]] = None, mode: str = "block"
+    ):
+        self.rules = rules or DEFAULT_RULES
+        self.mode = mode
+        self._patterns = fetch_patterns(self.rules)
+        self._browser_session = None
+        self._clients: Set[int] = set()
+        self._sessions: Set[str] = set()
+        # requestId -> (resource type, host, would be blocked)
+        self._requests: Dict[str, Tuple[str, str, bool]] = {}
+        self._totals = _empty_counts()
+        self._by_type: Dict[str, Dict[str, Any]] = {}
+        self._by_host: Dict[str, Dict[str, Any]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def attach(self, browser_session) -> None:
+        """Configure every tab browser-use reports, from the first one on."""
+        from browser_use.browser.events import TabCreatedEvent
+
+        self._browser_session = browser_session
+        browser_session.event_bus.on(TabCreatedEvent, self.on_TabCreatedEvent)
+
+    async def on_TabCreatedEvent(self, event) -> None:
+        await self.configure_target(event.target_id)
+
+    async def sync(self) -> None:
+        """Configure tabs that were opened without a TabCreatedEvent (popups)."""
+        session = self._browser_session
+        if session is None or session.agent_focus is None:
+            return
+        for target in await session._cdp_get_all_pages():
+            await self.configure_target(target["targetId"])
+
+    async def configure_target(self, target_id: str) -> None:
+        try:
+            cdp_session = await self._browser_session.get_or_create_cdp_session(
+                target_id, focus=False
+            )
+            if cdp_session.session_id in self._sessions:
+                return
+            self._sessions.add(cdp_session.session_id)
+            client = cdp_session.cdp_client
+            self._register(client)
+            await client.send.Network.enable(session_id=cdp_session.session_id)
+            if self.mode == "block" and self._patterns:
+                await client.send.Fetch.enable(
+                    params={"patterns": self._patterns},
+                    session_id=cdp_session.session_id,
+                )
+        except Exception as e:
+            # Filtering is an optimization; a tab without it still works
+            print(f"Warning: network filter not applied to tab {target_id}: {e!r}")
+
+    def _register(self, client) -> None:
+        """Event handlers of a CDP connection (one per connection and event)."""
+        if id(client) in self._clients:
+            return
+        self._clients.add(id(client))
+        client.register.Network.requestWillBeSent(self._on_request)
+        client.register.Network.loadingFinished(self._on_finished)
+        client.register.Network.loadingFailed(self._on_failed)
+        if self.mode == "block":
+            client.register.Fetch.requestPaused(
+                lambda event, session_id: self._on_paused(client, event, session_id)
+            )
+
+    # --------------------------------------------------------------- events
+
+    def _on_request(self, event, session_id=None) -> None:
+        url = event["request"]["url"]
+        if not url.startswith("http"):
+            return
+        resource_type = event.get("type", "Other")
+        self._requests[event["requestId"]] = (
+            resource_type,
+            urlsplit(url).netloc,
+            self.mode == "report" and is_blocked(self.rules, url, resource_type),
+        )
+
+    def _on_finished(self, event, session_id=None) -> None:
+        request = self._requests.pop(event["requestId"], None)
+        if request is None:
+            return
+        resource_type, host, would_block = request
+        kind = "blocked" if would_block else "allowed"
+        self._count(resource_type, host, kind, int(event.get("encodedDataLength", 0)))
+
+    def _on_failed(self, event, session_id=None) -> None:
+        self._requests.pop(event["requestId"], None)
+
+    def _on_paused(self, client, event, session_id) -> None:
+        # Handlers run inside the CDP message loop: answer from a task
+        url = event["request"]["url"]
+        resource_type = event.get("resourceType", "Other")
+        params = {"requestId": event["requestId"]}
+        if is_blocked(self.rules, url, resource_type):
+            self._count(resource_type, urlsplit(url).netloc, "blocked", 0)
+            params["errorReason"] = "BlockedByClient"
+            reply = client.send.Fetch.failRequest(params=params, session_id=session_id)
+        else:
+            reply = client.send.Fetch.continueRequest(
+                params=params, session_id=session_id
+            )
+        task = asyncio.ensure_future(reply)
+        self._tasks.add(task)
+        task.add_done_callback(self._reply_done)
+
+    def _reply_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled():
+            task.exception()  # a closed tab: nothing left to answer
+
+    def _count(self, resource_type: str, host: str, kind: str, size: int) -> None:
+        for counts in (
+            self._totals,
+            self._by_type.setdefault(resource_type, _empty_counts()),
+            self._by_host.setdefault(host, _empty_counts()),
+        ):
+            counts[f"{kind}_requests"] += 1
+            counts[f"{kind}_bytes"] += size
+
+    # ---------------------------------------------------------------- stats
+
+    def stats(self) -> Dict[str, Any]:
+        """Allowed / blocked requests and bytes, overall, by type and by host.
+
+        In "block" mode blocked requests never transfer anything, so their
+        bytes are unknown (reported as 0); run in "report" mode to see them.
+        """
+        return {
+            "mode": self.mode,
+            **self._totals,
+            "by_type": self._by_type,
+            "by_host": self._by_host,
+        }
+
+
+def sum_network_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals of per-task network stats (for the study summary)."""
+    totals = _empty_counts()
+    for entry in stats:
+        for key in totals:
+            totals[key] += entry.get(key, 0)
+    totals["tasks"] = len(stats)
+    totals["modes"] = sorted({entry.get("mode") for entry in stats})
+    return totals
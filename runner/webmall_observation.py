@@ -0,0 +1,195 @@
+"""
+Token-lean observations for the browser-use runner.
+
+Every step sends the model the serialized DOM of the current page, and these
+observations make up most of the input tokens of a run. In "lean" mode
+ObservationCompactor shrinks them in three ways:
+
+    attributes  only LEAN_ATTRIBUTES are serialized (browser-use's
+                include_attributes), instead of its ~40 defaults
+    text        lines of page text are cut to MAX_TEXT_CHARS
+    chrome      runs of at least MIN_CHROME_LINES lines that the agent
+                already saw on CHROME_PAGES other pages of the same shop
+                (header menus, category trees, footers of the WooCommerce
+                themes) are replaced by a one-line note
+
+Form fields (the shop search in particular) are never dropped, and the
+first pages of a shop are always shown in full, so the agent learns its
+navigation before it is left out; omitted links stay reachable by URL.
+
+"full" keeps browser-use's observations unchanged. Sweep both modes
+(SWEEP="observation=full,lean") and compare the configurations with
+compare_studies.py to pick the size / accuracy tradeoff.
+"""
+
+import dataclasses
+import re
+from typing import Any, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+OBSERVATION_MODES = ("full", "lean")
+
+LEAN_ATTRIBUTES = [
+    "title",
+    "type",
+    "name",
+    "role",
+    "value",
+    "placeholder",
+    "aria-label",
+    "alt",
+    "checked",
+    "selected",
+    "aria-expanded",
+]
+
+MAX_TEXT_CHARS = 150
+MIN_CHROME_LINES = 4
+CHROME_PAGES = 2
+
+# Element index of a serialized line ("[12]<a ...", "*[12]<a ...",
+# "|SCROLL+12]<div ..."); it changes from step to step
+_INDEX_RE = re.compile(r"^\*?(\[|\|SCROLL\+)\d+\]")
+_FORM_FIELD_RE = re.compile(r"<(input|select|textarea|button)\b")
+
+
+def line_key(line: str) -> Optional[str]:
+    """Identity of a serialized line across steps (None: never chrome)."""
+    stripped = line.strip()
+    if not stripped or _FORM_FIELD_RE.search(stripped):
+        return None
+    return _INDEX_RE.sub(r"\1]", stripped)
+
+
+def truncate_text(line: str, max_chars: int) -> str:
+    """Cut a line of page text (element lines are left alone)."""
+    stripped = line.lstrip()
+    if len(stripped) <= max_chars or stripped.startswith(("<", "[", "*[", "|")):
+        return line
+    return line[: len(line) - len(stripped) + max_chars] + "…"
+
+
+class _LeanDOMState:
+    """SerializedDOMState whose llm_representation is compacted."""
+
+    def __init__(self, dom_state, compactor: "ObservationCompactor", url: str):
+        self._dom_state = dom_state
+        self._compactor = compactor
+        self._url = url
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._dom_state, name)
+
+    def llm_representation(self, include_attributes: Optional[List[str]] = None) -> str:
+        text = self._dom_state.llm_representation(include_attributes=include_attributes)
+        return self._compactor.compact(text, self._url)
+
+
+class ObservationCompactor:
+    """Compacts the page observations of one agent run."""
+
+    def __init__(
+        self,
+        max_text_chars: int = MAX_TEXT_CHARS,
+        min_chrome_lines: int = MIN_CHROME_LINES,
+        chrome_pages: int = CHROME_PAGES,
+    ):
+        self.max_text_chars = max_text_chars
+        self.min_chrome_lines = min_chrome_lines
+        self.chrome_pages = chrome_pages
+        # host -> line key -> pages (without query and fragment) it was shown on
+        self._seen: Dict[str, Dict[str, Set[str]]] = {}
+        self._stats = {
+            "observations": 0,
+            "chars_in": 0,
+            "chars_out": 0,
+            "chrome_lines_omitted": 0,
+            "texts_truncated": 0,
+        }
+
+    def attach(self, agent) -> None:
+        """Compact every observation ``agent`` puts into its state message."""
+        manager = agent._message_manager
+        create_state_messages = manager.create_state_messages
+
+        def lean_state_messages(browser_state_summary, *args, **kwargs):
+            lean_summary = dataclasses.replace(
+                browser_state_summary,
+                dom_state=_LeanDOMState(
+                    browser_state_summary.dom_state, self, browser_state_summary.url
+                ),
+            )
+            return create_state_messages(lean_summary, *args, **kwargs)
+
+        manager.create_state_messages = lean_state_messages
+
+    def compact(self, text: str, url: str) -> str:
+        parts = urlsplit(url)
+        page = parts.path or "/"
+        seen = self._seen.setdefault(parts.netloc, {})
+
+        lines = text.split("\n")
+        keys = [line_key(line) for line in lines]
+        chrome = [
+            key is not None and len(seen.get(key, set()) - {page}) >= self.chrome_pages
+            for key in keys
+        ]
+
+        out: List[str] = []
+        i = 0
+        while i < len(lines):
+            end = i
+            while end < len(lines) and chrome[end]:
+                end += 1
+            if end - i >= self.min_chrome_lines:
+                indent = lines[i][: len(lines[i]) - len(lines[i].lstrip())]
+                out.append(
+                    f"{indent}({end - i} lines of shop navigation omitted, "
+                    "as shown on earlier pages)"
+                )
+                self._stats["chrome_lines_omitted"] += end - i
+                i = end
+                continue
+            line = truncate_text(lines[i], self.max_text_chars)
+            if line is not lines[i]:
+                self._stats["texts_truncated"] += 1
+            out.append(line)
+            i += 1
+
+        for key in keys:
+            if key is not None:
+                pages = seen.setdefault(key, set())
+                if len(pages) <= self.chrome_pages:
+                    pages.add(page)
+
+        result = "\n".join(out)
+        self._stats["observations"] += 1
+        self._stats["chars_in"] += len(text)
+        self._stats["chars_out"] += len(result)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Observation sizes before and after compaction (in characters)."""
+        chars_in = self._stats["chars_in"]
+        return {
+            "mode": "lean",
+            **self._stats,
+            "reduction": 1 - self._stats["chars_out"] / chars_in if chars_in else 0.0,
+        }
+
+
+def sum_observation_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals of per-task observation stats (for the study summary)."""
+    keys = (
+        "observations",
+        "chars_in",
+        "chars_out",
+        "chrome_lines_omitted",
+        "texts_truncated",
+    )
+    totals: Dict[str, Any] = {key: sum(s.get(key, 0) for s in stats) for key in keys}
+    totals["tasks"] = len(stats)
+    totals["reduction"] = (
+        1 - totals["chars_out"] / totals["chars_in"] if totals["chars_in"] else 0.0
+    )
+    return totals
@@ -0,0 +1,491 @@
+"""
+Opt-in profiling of the runner processes.
+
+Modes (PROFILE env / --profile, comma separated or "all"):
+
+    cpu     sample the main thread's stack every few ms and attribute each
+            sample to harness code (runner/*.py), browser_use, the LLM client
+            (openai/httpx), the CDP connection, other libraries, other code
+            (e.g. the agent script of a subprocess runner), or idle (waiting
+            for I/O in the event loop)
+    loop    event-loop lag (overshoot of a periodic sleep) and asyncio task
+            counts
+    memory  tracemalloc snapshots; allocation growth per source line
+
+The study runner profiles each task as a window of the process-wide profile
+and writes <task_dir>/profile.json (plus profile_cpu.folded, loadable by
+flamegraph tools). With several tasks in parallel the windows overlap, so
+per-task numbers then describe the process while the task ran. rollup()
+aggregates the task profiles into <study_dir>/profile_rollup.json and prints
+the top hotspots and how much of the busy time is the harness itself.
+
+The subprocess runners use this module as a launcher instead:
+
+    python webmall_profile.py --profile cpu,memory --output-dir DIR -- script.py ARGS
+
+which profiles the whole script (cpu and memory modes) as one window.
+"""
+
+import argparse
+import asyncio
+import json
+import runpy
+import sys
+import sysconfig
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+from statistics import mean, quantiles
+from typing import Any, Dict, List, Optional
+
+from webmall_writer import ResultWriter, write_json, write_text
+
+PROFILE_MODES = ("cpu", "loop", "memory")
+PROFILE_FILE = "profile.json"
+FOLDED_FILE = "profile_cpu.folded"
+ROLLUP_FILE = "profile_rollup.json"
+
+HARNESS_DIR = str(Path(__file__).resolve().parent)
+STDLIB_DIR = sysconfig.get_paths()["stdlib"]
+# The profiler's own frames (launcher, sampling) are not harness work
+PROFILER_FILE = str(Path(__file__).resolve())
+
+# Substrings of a frame's file name -> category, first match wins
+CATEGORIES = [
+    ("/browser_use/", "browser_use"),
+    ("/openai/", "llm_client"),
+    ("/httpx/", "llm_client"),
+    ("/httpcore/", "llm_client"),
+    ("/anyio/", "llm_client"),
+    ("/cdp_use/", "cdp"),
+    ("/websockets/", "cdp"),
+    ("/playwright/", "cdp"),
+    ("/site-packages/", "other_libs"),
+    ("/dist-packages/", "other_libs"),
+]
+
+# Leaf frames of a thread that is waiting rather than running Python code
+IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("connection.py", "poll"),
+}
+
+TOP_N = 25
+LOOP_STALL_SECONDS = 0.1
+
+
+def parse_profile_modes(spec: Optional[str]) -> List[str]:
+    """Parse 'cpu,loop' / 'all' into a list of modes (empty: profiling off)."""
+    modes = []
+    for part in (spec or "").split(","):
+        part = part.strip().lower()
+        if not part or part in ("0", "off", "none"):
+            continue
+        if part == "all":
+            return list(PROFILE_MODES)
+        if part not in PROFILE_MODES:
+            raise ValueError(
+                f"Unknown profile mode {part!r} (known: {', '.join(PROFILE_MODES)})"
+            )
+        modes.append(part)
+    return modes
+
+
+def frame_category(filename: str) -> str:
+    if (
+        filename.startswith("<")
+        or filename == PROFILER_FILE
+        or filename.startswith(STDLIB_DIR)
+        and "-packages/" not in filename
+    ):
+        return "stdlib"
+    if filename.startswith(HARNESS_DIR):
+        return "harness"
+    for marker, category in CATEGORIES:
+        if marker in filename:
+            return category
+    return "other_code"
+
+
+def frame_label(code) -> str:
+    """Short 'module/file.py:function' label of a code object."""
+    filename = code.co_filename
+    for marker in ("/site-packages/", "/dist-packages/"):
+        if marker in filename:
+            filename = filename.split(marker, 1)[1]
+            break
+    else:
+        filename = Path(filename).name
+    return f"{filename}:{code.co_name}"
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float = 0.005, max_depth: int = 64):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self.by_category: Counter = Counter()
+        self.self_counts: Counter = Counter()
+        self.total_counts: Counter = Counter()
+        self.stacks: Counter = Counter()
+        self._code_info: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="profile-sampler", daemon=True
+        )
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def _info(self, code):
+        """(label, category, idle) of a code object, cached."""
+        info = self._code_info.get(code)
+        if info is None:
+            idle = (Path(code.co_filename).name, code.co_name) in IDLE_LEAVES
+            info = (frame_label(code), frame_category(code.co_filename), idle)
+            self._code_info[code] = info
+        return info
+
+    def _record(self, frame) -> None:
+        infos = []
+        while frame is not None and len(infos) < self.max_depth:
+            infos.append(self._info(frame.f_code))
+            frame = frame.f_back
+        with self._lock:
+            self.samples += 1
+            if infos[0][2]:
+                self.by_category["idle"] += 1
+                return
+
+            # Attribute the sample to the innermost frame outside the stdlib
+            category = next(
+                (info[1] for info in infos if info[1] != "stdlib"), "stdlib"
+            )
+            self.by_category[category] += 1
+
+            labels = [info[0] for info in infos]
+            self.self_counts[labels[0]] += 1
+            for label in set(labels):
+                self.total_counts[label] += 1
+            self.stacks[";".join(reversed(labels))] += 1
+
+    def counters(self) -> Dict[str, Counter]:
+        with self._lock:
+            return {
+                "by_category": self.by_category.copy(),
+                "self": self.self_counts.copy(),
+                "total": self.total_counts.copy(),
+                "stacks": self.stacks.copy(),
+            }
+
+
+class LoopMonitor:
+    """Measures event-loop lag as the overshoot of a periodic sleep."""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.lags: List[float] = []
+        self.task_counts: List[int] = []
+        self._loop = None
+        self._task = None
+
+    def ensure_running(self) -> None:
+        """Start watching the running loop (again, if it changed)."""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop or self._task is None or self._task.done():
+            self._loop = loop
+            self._task = loop.create_task(self._watch())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _watch(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - started - self.interval))
+            self.task_counts.append(len(asyncio.all_tasks()))
+
+
+def summarize_lags(lags: List[float], task_counts: List[int]) -> Dict[str, Any]:
+    if not lags:
+        return {"ticks": 0}
+    cuts = quantiles(lags, n=100) if len(lags) > 1 else [lags[0]] * 99
+    return {
+        "ticks": len(lags),
+        "mean_ms": round(mean(lags) * 1000, 2),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+        "max_ms": round(max(lags) * 1000, 2),
+        f"stalls_over_{int(LOOP_STALL_SECONDS * 1000)}ms": sum(
+            1 for lag in lags if lag > LOOP_STALL_SECONDS
+        ),
+        "max_asyncio_tasks": max(task_counts, default=0),
+        "mean_asyncio_tasks": round(mean(task_counts), 1) if task_counts else 0,
+    }
+
+
+def summarize_cpu(counters: Dict[str, Counter]) -> Dict[str, Any]:
+    samples = sum(counters["by_category"].values())
+    busy = samples - counters["by_category"].get("idle", 0)
+    return {
+        "samples": samples,
+        "by_category": dict(counters["by_category"].most_common()),
+        "harness_share_of_busy": (
+            round(counters["by_category"].get("harness", 0) / busy, 4) if busy else 0.0
+        ),
+        "top_self": counters["self"].most_common(TOP_N),
+        "top_total": counters["total"].most_common(TOP_N),
+    }
+
+
+def memory_diff(before, after) -> List[Dict[str, Any]]:
+    # Leave out the profiler's own snapshots
+    filters = [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, PROFILER_FILE),
+    ]
+    stats = after.filter_traces(filters).compare_to(
+        before.filter_traces(filters), "lineno"
+    )
+    return [
+        {
+            "location": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+            "size_diff_kb": round(s.size_diff / 1024, 1),
+            "count_diff": s.count_diff,
+        }
+        for s in stats[:TOP_N]
+        if s.size_diff > 0
+    ]
+
+
+class Profiler:
+    """Process-wide profiler with per-task windows."""
+
+    def __init__(self, modes: List[str], sample_interval: float = 0.005):
+        self.modes = list(modes)
+        self.sampler = (
+            StackSampler(threading.get_ident(), sample_interval)
+            if "cpu" in modes
+            else None
+        )
+        self.loop_monitor = LoopMonitor() if "loop" in modes else None
+        self._started = False
+
+    def start(self) -> None:
+        if self._started:
+            return
+        self._started = True
+        if self.sampler:
+            self.sampler.start()
+        if "memory" in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        if self.sampler:
+            self.sampler.stop()
+        if self.loop_monitor:
+            self.loop_monitor.stop()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def begin(self) -> Dict[str, Any]:
+        self.start()
+        window: Dict[str, Any] = {"started": time.perf_counter()}
+        if self.sampler:
+            window["cpu"] = self.sampler.counters()
+        if self.loop_monitor:
+            window["loop"] = len(self.loop_monitor.lags)
+        if "memory" in self.modes:
+            window["memory"] = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+        return window
+
+    def end(self, window: Dict[str, Any]) -> Dict[str, Any]:
+        """Profile of the window as a JSON-able dict plus folded stacks."""
+        profile: Dict[str, Any] = {
+            "modes": self.modes,
+            "window_seconds": round(time.perf_counter() - window["started"], 3),
+        }
+        if self.sampler:
+            current = self.sampler.counters()
+            diff = {key: current[key] - window["cpu"][key] for key in current}
+            profile["cpu"] = summarize_cpu(diff)
+            profile["_folded"] = "".join(
+                f"{stack} {count}\n" for stack, count in diff["stacks"].most_common()
+            )
+        if self.loop_monitor:
+            start = window["loop"]
+            profile["loop"] = summarize_lags(
+                self.loop_monitor.lags[start:], self.loop_monitor.task_counts[start:]
+            )
+        if "memory" in self.modes:
+            current_kb, peak_kb = (v / 1024 for v in tracemalloc.get_traced_memory())
+            profile["memory"] = {
+                "traced_kb": round(current_kb, 1),
+                "peak_kb": round(peak_kb, 1),
+                "top_growth": memory_diff(window["memory"], tracemalloc.take_snapshot()),
+            }
+        return profile
+
+    @asynccontextmanager
+    async def profile_task(self, task_dir: Path, writer: Optional[ResultWriter] = None):
+        """Profile the enclosed task and write its profile to ``task_dir``."""
+        if self.loop_monitor:
+            self.loop_monitor.ensure_running()
+        window = self.begin()
+        try:
+            yield
+        finally:
+            save_profile(self.end(window), Path(task_dir), writer)
+
+
+def save_profile(
+    profile: Dict[str, Any], out_dir: Path, writer: Optional[ResultWriter] = None
+) -> None:
+    folded = profile.pop("_folded", None)
+    write_json(out_dir / PROFILE_FILE, profile, writer)
+    if folded is not None:
+        write_text(out_dir / FOLDED_FILE, folded, writer)
+
+
+# ============================================================================
+# Study Rollup
+# ============================================================================
+
+
+def rollup(study_dir: Path, top: int = 10) -> Optional[Dict[str, Any]]:
+    """Aggregate the task profiles of a study and print the top hotspots."""
+    study_dir = Path(study_dir)
+    profiles = [
+        json.loads(path.read_text(encoding="utf-8"))
+        for path in sorted(study_dir.glob(f"*/{PROFILE_FILE}"))
+    ]
+    if not profiles:
+        return None
+
+    by_category: Counter = Counter()
+    self_counts: Counter = Counter()
+    total_counts: Counter = Counter()
+    growth: Counter = Counter()
+    loop_profiles = []
+    for profile in profiles:
+        cpu = profile.get("cpu")
+        if cpu:
+            by_category.update(cpu["by_category"])
+            self_counts.update(dict(cpu["top_self"]))
+            total_counts.update(dict(cpu["top_total"]))
+        if profile.get("loop", {}).get("ticks"):
+            loop_profiles.append(profile["loop"])
+        for entry in profile.get("memory", {}).get("top_growth", []):
+            growth[entry["location"]] += entry["size_diff_kb"]
+
+    busy = sum(by_category.values()) - by_category.get("idle", 0)
+    summary: Dict[str, Any] = {
+        "tasks_profiled": len(profiles),
+        "cpu": {
+            "samples": sum(by_category.values()),
+            "by_category": dict(by_category.most_common()),
+            "harness_share_of_busy": (
+                round(by_category.get("harness", 0) / busy, 4) if busy else 0.0
+            ),
+            "top_self": self_counts.most_common(TOP_N),
+            "top_total": total_counts.most_common(TOP_N),
+        },
+        "loop": {
+            "worst_max_ms": max((p["max_ms"] for p in loop_profiles), default=0.0),
+            "worst_p99_ms": max((p["p99_ms"] for p in loop_profiles), default=0.0),
+            "mean_p95_ms": (
+                round(mean(p["p95_ms"] for p in loop_profiles), 2)
+                if loop_profiles
+                else 0.0
+            ),
+        },
+        "memory_top_growth_kb": [
+            [location, round(kb, 1)] for location, kb in growth.most_common(TOP_N)
+        ],
+    }
+    write_json(study_dir / ROLLUP_FILE, summary)
+
+    print(f"\n{'='*80}")
+    print(f"PROFILE ROLLUP ({len(profiles)} task profiles)")
+    print(f"{'='*80}")
+    if busy:
+        shares = ", ".join(
+            f"{category} {count / sum(by_category.values()):.1%}"
+            for category, count in by_category.most_common()
+        )
+        print(f"Samples: {shares}")
+        print(
+            f"Harness share of busy samples: {summary['cpu']['harness_share_of_busy']:.1%}"
+        )
+        print("Top self-time hotspots:")
+        for label, count in self_counts.most_common(top):
+            print(f"  {count / busy:6.1%}  {label}")
+    if loop_profiles:
+        print(
+            f"Event-loop lag: worst {summary['loop']['worst_max_ms']} ms, "
+            f"mean p95 {summary['loop']['mean_p95_ms']} ms"
+        )
+    for location, kb in summary["memory_top_growth_kb"][:top]:
+        print(f"  +{kb:.0f} KiB  {location}")
+    print(f"Profile rollup saved to: {study_dir / ROLLUP_FILE}")
+    return summary
+
+
+# ============================================================================
+# Launcher for the subprocess runners
+# ============================================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a Python script under the profiler")
+    parser.add_argument("--profile", default="cpu,memory", help="cpu,memory or all")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("script")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    # The event loop of an arbitrary script cannot be watched from here
+    modes = [m for m in parse_profile_modes(args.profile) if m != "loop"]
+    out_dir = Path(args.output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    profiler = Profiler(modes)
+    window = profiler.begin()
+    sys.argv = [args.script] + args.args
+    exit_code = 0
+    try:
+        runpy.run_path(args.script, run_name="__main__")
+    except SystemExit as e:
+        exit_code = e.code
+    finally:
+        save_profile(profiler.end(window), out_dir)
+        profiler.stop()
+        print(f"Profile saved to: {out_dir / PROFILE_FILE}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""
+Shared work queue of a study, so several runner containers can work on it.
+
+The queue is a SQLite database in the study directory (queue.sqlite). The
+first runner to open it fills it with the runs of the study; runners that
+join later check that they were started with the same configuration and
+then just pull runs from it. Each claimed run is leased to its runner:
+
+    pending --claim--> leased --complete--> done
+                         |  \--skip-------> skipped (early stopping)
+                         |
+                         '-- lease expired: pending again, or "lost" after
+                             max_attempts (a run that keeps killing runners)
+
+Runners renew the leases of their runs with a heartbeat, so a lease only
+expires when its runner died or hangs; its run is then requeued and claimed
+by another runner. The results of finished runs are stored in the queue as
+well, so whichever runner finishes last writes the study summary of all of
+them.
+
+SQLite locking needs storage with working POSIX file locks: a volume or bind
+mount shared by containers on one host, or NFS with locking for several
+machines. The rollback journal (not WAL) is used for that reason.
+"""
+
+import hashlib
+import json
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+QUEUE_FILE = "queue.sqlite"
+
+# Leases are renewed every LEASE_SECONDS / 4; an idle runner polls for
+# requeued runs every POLL_SECONDS until the study is done
+LEASE_SECONDS = 120.0
+POLL_SECONDS = 10.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    config TEXT,
+    task_id TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_by_state ON jobs (state, position);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    joined_at REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    finished_at REAL
+);
+"""
+
+
+def default_worker_id() -> str:
+    """Container hostname (unique per replica) plus PID."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def fingerprint(configs: List[Dict[str, Any]], keys: List[str]) -> str:
+    """Identity of a study: its configurations and runs."""
+    data = json.dumps([configs, keys], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()[:16]
+
+
+class WorkQueue:
+    """Leased runs of one study, shared by all runners through SQLite."""
+
+    def __init__(
+        self,
+        path: Path,
+        worker_id: Optional[str] = None,
+        lease_seconds: float = LEASE_SECONDS,
+        max_attempts: int = 3,
+    ):
+        self.path = Path(path)
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction (runners wait up to a minute for each other)."""
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _reading(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def open(
+        self, meta: Dict[str, Any], jobs: List[Tuple[str, Optional[str], str, int]]
+    ) -> Dict[str, Any]:
+        """Create the queue with ``jobs`` (key, config, task_id, seed) or join it.
+
+        Returns the stored meta of the study (that of the runner that created
+        the queue). Raises ValueError if the queue holds a different study.
+        """
+        conn = sqlite3.connect(self.path, timeout=60)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+        keys = [job[0] for job in jobs]
+        meta = dict(meta, fingerprint=fingerprint(meta["configs"], keys))
+        now = time.time()
+        with self._transaction() as conn:
+            stored = {
+                key: json.loads(value)
+                for key, value in conn.execute("SELECT key, value FROM meta")
+            }
+            if not stored:
+                conn.executemany(
+                    "INSERT INTO meta (key, value) VALUES (?, ?)",
+                    [(key, json.dumps(value)) for key, value in meta.items()],
+                )
+                conn.executemany(
+                    "INSERT INTO jobs (key, position, config, task_id, seed) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(key, i, *rest) for i, (key, *rest) in enumerate(jobs)],
+                )
+                stored = meta
+            elif stored.get("fingerprint") != meta["fingerprint"]:
+                raise ValueError(
+                    f"{self.path} holds a different study (other configuration "
+                    "or tasks); start every runner with the same settings"
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (worker, joined_at, heartbeat) "
+                "VALUES (?, ?, ?)",
+                (self.worker_id, now, now),
+            )
+        return stored
+
+    def claim(self) -> Optional[Tuple[str, int]]:
+        """Lease the next run; returns (key, attempt) or None if none is pending.
+
+        Expired leases are requeued first (or given up as "lost").
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            lost = conn.execute(
+                "UPDATE jobs SET state = 'lost' WHERE state = 'leased' "
+                "AND lease_until < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET state = 'pending' "
+                "WHERE state = 'leased' AND lease_until < ?",
+                (now,),
+            ).rowcount
+            row = conn.execute(
+                "SELECT key, attempts FROM jobs WHERE state = 'pending' "
+                "ORDER BY position LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET state = 'leased', worker = ?, lease_until = ?, "
+                    "attempts = attempts + 1 WHERE key = ?",
+                    (self.worker_id, now + self.lease_seconds, row[0]),
+                )
+        if requeued or lost:
+            print(
+                f"Work queue: {requeued} run(s) with expired leases requeued, "
+                f"{lost} given up after {self.max_attempts} attempts"
+            )
+        return (row[0], row[1] + 1) if row is not None else None
+
+    def heartbeat(self) -> None:
+        """Renew the leases of this runner's runs."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE state = 'leased' AND worker = ?",
+                (now + self.lease_seconds, self.worker_id),
+            )
+            conn.execute(
+                "UPDATE workers SET heartbeat = ? WHERE worker = ?",
+                (now, self.worker_id),
+            )
+
+    def complete(self, key: str, result: Dict[str, Any]) -> None:
+        # Kept even if the lease ran out meanwhile: the run did finish
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'done', worker = ?, result = ? WHERE key = ?",
+                (self.worker_id, json.dumps(result, default=str), key),
+            )
+
+    def skip(self, key: str) -> None:
+        with self._transaction() as conn:
+            conn.execute("UPDATE jobs SET state = 'skipped' WHERE key = ?", (key,))
+
+    def release(self) -> None:
+        """Requeue this runner's leased runs right away (on shutdown).
+
+        An interrupted run does not count as an attempt.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = attempts - 1 "
+                "WHERE state = 'leased' AND worker = ?",
+                (self.worker_id,),
+            )
+
+    def remaining(self) -> int:
+        """Runs that are pending or leased (by any runner)."""
+        with self._reading() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'leased')"
+            ).fetchone()[0]
+
+    def finish(self) -> bool:
+        """Leave the study; True if this runner is the one to finalize it.
+
+        That is the first runner to leave once no run is pending or leased.
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE workers SET finished_at = ? WHERE worker = ?",
+                (time.time(), self.worker_id),
+            )
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'leased')"
+            ).fetchone()[0]
+            finalized = conn.execute(
+                "SELECT value FROM meta WHERE key = 'finalized_by'"
+            ).fetchone()
+            if remaining or finalized:
+                return False
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('finalized_by', ?)",
+                (json.dumps(self.worker_id),),
+            )
+            return True
+
+    def results(
+        self, config: Optional[str] = None, task_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Finished, skipped and lost runs (optionally of one config / task).
+
+        Each row has key, config, task_id, seed, state, attempts and, for
+        finished runs, the stored result.
+        """
+        query = "SELECT key, config, task_id, seed, state, attempts, result FROM jobs"
+        query += " WHERE state IN ('done', 'skipped', 'lost')"
+        params: List[Any] = []
+        if config is not None:
+            query += " AND config = ?"
+            params.append(config)
+        if task_id is not None:
+            query += " AND task_id = ?"
+            params.append(task_id)
+        with self._reading() as conn:
+            rows = conn.execute(query + " ORDER BY position", params).fetchall()
+        return [
+            {
+                "key": key,
+                "config": config_name,
+                "task_id": task,
+                "seed": seed,
+                "state": state,
+                "attempts": attempts,
+                "result": json.loads(result) if result else None,
+            }
+            for key, config_name, task, seed, state, attempts, result in rows
+        ]
+
+    def progress(self) -> Dict[str, int]:
+        """Pending and leased runs of the whole study and its active runners."""
+        with self._reading() as conn:
+            states = dict(
+                conn.execute(
+                    "SELECT state, COUNT(*) FROM jobs "
+                    "WHERE state IN ('pending', 'leased') GROUP BY state"
+                )
+            )
+            # Runners that died stop renewing their heartbeat
+            runners = conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE finished_at IS NULL "
+                "AND heartbeat >= ?",
+                (time.time() - self.lease_seconds,),
+            ).fetchone()[0]
+        return {
+            "pending": states.get("pending", 0),
+            "leased": states.get("leased", 0),
+            "runners": runners,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """Runs by state and the runners of the study (for status.json)."""
+        with self._reading() as conn:
+            states = dict(
+                conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state")
+            )
+            workers = conn.execute(
+                "SELECT worker, heartbeat, finished_at FROM workers"
+            ).fetchall()
+        now = time.time()
+        return {
+            "worker_id": self.worker_id,
+            "runs": states,
+            "workers": {
+                worker: "finished"
+                if finished_at
+                else f"heartbeat {now - heartbeat:.0f}s ago"
+                for worker, heartbeat, finished_at in workers
+            },
+        }
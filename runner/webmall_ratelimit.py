@@ -0,0 +1,75 @@
+"""
+LLM request rate limiter shared by all agents of a study.
+
+RateLimiter spaces LLM requests evenly at ``requests_per_minute``, across all
+concurrently running agents and configurations of a study. Its state lives in
+shared memory guarded by a process lock, so the same limiter also works across
+the worker processes of TASK_ISOLATION=process (it is handed to each worker
+when it is started). The lock is only held to reserve a time slot; waiting for
+the slot is an asyncio sleep and never blocks the event loop.
+
+wrap_llm() hooks a limiter into a browser-use chat model by wrapping its
+ainvoke, the same way browser-use's own token cost tracking does.
+"""
+
+import asyncio
+import multiprocessing
+import time
+from typing import Any, Dict
+
+# Indexes into the shared state array
+_NEXT_SLOT, _REQUESTS, _DELAYED, _WAIT_SECONDS = range(4)
+
+
+class RateLimiter:
+    """Evenly spaced request slots, shared between processes."""
+
+    def __init__(self, requests_per_minute: float):
+        ctx = multiprocessing.get_context("spawn")
+        self.requests_per_minute = requests_per_minute
+        self.interval = 60.0 / requests_per_minute
+        self._lock = ctx.Lock()
+        self._state = ctx.RawArray("d", 4)
+
+    def reserve(self) -> float:
+        """Reserve the next request slot; returns the seconds to wait for it."""
+        with self._lock:
+            now = time.time()
+            slot = max(now, self._state[_NEXT_SLOT])
+            self._state[_NEXT_SLOT] = slot + self.interval
+            self._state[_REQUESTS] += 1
+            if slot > now:
+                self._state[_DELAYED] += 1
+                self._state[_WAIT_SECONDS] += slot - now
+        return slot - now
+
+    async def acquire(self) -> None:
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests, delayed, waited = (
+                self._state[_REQUESTS],
+                self._state[_DELAYED],
+                self._state[_WAIT_SECONDS],
+            )
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "requests": int(requests),
+            "delayed_requests": int(delayed),
+            "wait_seconds": round(waited, 1),
+        }
+
+
+def wrap_llm(llm, limiter: RateLimiter):
+    """Make every ``llm.ainvoke`` call wait for a slot of ``limiter``."""
+    ainvoke = llm.ainvoke
+
+    async def limited_ainvoke(*args, **kwargs):
+        await limiter.acquire()
+        return await ainvoke(*args, **kwargs)
+
+    llm.ainvoke = limited_ainvoke
+    return llm
@@ -0,0 +1,193 @@
+"""
+Rerun plans built from previous study results.
+
+A rerun plan lists the (task_id, task_seed) runs of a study that match a
+filter, e.g. runs that errored, were truncated, did not complete or scored
+below an F1 threshold. The study runner executes only those runs into a new
+study directory next to the original and writes a combined summary in which
+the rerun results replace the original ones.
+
+Filter spec (comma separated, runs matching ANY criterion are rerun):
+
+    error        run raised an error
+    truncated    run hit max_steps without finishing
+    incomplete   task_completion == 0
+    f1<0.5       f1_score below the threshold
+
+Reruns of reruns chain: a rerun study records its source in rerun_plan.json
+and merged results are resolved back to the original study.
+
+The plan carries the configuration recorded in the source study's summary
+(model, max_steps, vision, ...); the study runner reruns with it, so the
+combined summary never mixes runs of two configurations.
+
+Usage:
+    python webmall_rerun.py /results/<study_dir> --filter "error,truncated,f1<0.5"
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_RERUN_FILTER = "error,truncated,incomplete"
+RERUN_PLAN_FILE = "rerun_plan.json"
+COMBINED_SUMMARY_FILE = "study_summary_combined.json"
+SUMMARY_FILE = "study_summary.json"
+
+
+def parse_rerun_filter(spec: Optional[str]) -> Dict[str, Any]:
+    """Parse 'error,truncated,incomplete,f1<0.5' into a filter dict."""
+    rerun_filter: Dict[str, Any] = {
+        "error": False,
+        "truncated": False,
+        "incomplete": False,
+        "f1_below": None,
+    }
+    for part in (spec or DEFAULT_RERUN_FILTER).split(","):
+        part = part.strip().replace(" ", "")
+        if not part:
+            continue
+        if part.startswith("f1<"):
+            try:
+                rerun_filter["f1_below"] = float(part[3:])
+            except ValueError:
+                raise ValueError(f"f1< needs a number, got {part[3:]!r}")
+        elif part in ("error", "truncated", "incomplete"):
+            rerun_filter[part] = True
+        else:
+            raise ValueError(f"Unknown rerun filter: {part!r}")
+    return rerun_filter
+
+
+def rerun_reasons(run: Dict[str, Any], rerun_filter: Dict[str, Any]) -> List[str]:
+    """Criteria of ``rerun_filter`` that a run matches (empty: keep the run)."""
+    reasons = []
+    if rerun_filter["error"] and run.get("error"):
+        reasons.append("error")
+    if rerun_filter["truncated"] and run.get("truncated"):
+        reasons.append("truncated")
+    if rerun_filter["incomplete"] and run.get("task_completion", 0.0) == 0.0:
+        reasons.append("incomplete")
+    f1_below = rerun_filter["f1_below"]
+    if f1_below is not None and run.get("f1_score", 0.0) < f1_below:
+        reasons.append(f"f1<{f1_below}")
+    return reasons
+
+
+def load_full_results(study_dir: Path) -> List[Dict[str, Any]]:
+    """All full_result.json records of a study directory."""
+    return [
+        json.loads(path.read_text(encoding="utf-8"))
+        for path in sorted(Path(study_dir).glob("*/full_result.json"))
+    ]
+
+
+def load_merged_results(study_dir: Path) -> List[Dict[str, Any]]:
+    """Results of a study with the results of its rerun chain applied.
+
+    For an ordinary study these are just its own results. For a rerun study
+    the results of its source study (resolved recursively) are taken and
+    every rerun (task_id, task_seed) replaces the original run.
+    """
+    study_dir = Path(study_dir)
+    own = load_full_results(study_dir)
+    plan_path = study_dir / RERUN_PLAN_FILE
+    if not plan_path.exists():
+        return own
+
+    plan = json.loads(plan_path.read_text(encoding="utf-8"))
+    merged = {
+        (r["task_id"], r["task_seed"]): r
+        for r in load_merged_results(Path(plan["source_study"]))
+    }
+    for r in own:
+        merged[(r["task_id"], r["task_seed"])] = r
+    return list(merged.values())
+
+
+def source_config(study_dir: Path) -> Optional[Dict[str, Any]]:
+    """Configuration recorded in a study's summary (None if there is none)."""
+    path = Path(study_dir) / SUMMARY_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8")).get("config")
+
+
+def build_rerun_plan(study_dir: Path, rerun_filter: Dict[str, Any]) -> Dict[str, Any]:
+    """Plan of the runs of a (possibly rerun) study that match a filter.
+
+    Raises ValueError if the study does not exist or has no run results.
+    """
+    study_dir = Path(study_dir).resolve()
+    if not study_dir.is_dir():
+        raise ValueError(f"{study_dir} does not exist")
+    results = load_merged_results(study_dir)
+    if not results:
+        raise ValueError(f"{study_dir} has no run results (*/full_result.json)")
+    runs = []
+    for r in sorted(results, key=lambda r: (r["task_id"], r["task_seed"])):
+        reasons = rerun_reasons(r, rerun_filter)
+        if reasons:
+            runs.append(
+                {"task_id": r["task_id"], "task_seed": r["task_seed"], "reasons": reasons}
+            )
+    return {
+        "source_study": str(study_dir),
+        "filter": rerun_filter,
+        "config": source_config(study_dir),
+        "runs": runs,
+    }
+
+
+def plan_jobs(plan: Dict[str, Any]) -> List[Tuple[str, int]]:
+    """(task_id, task_seed) pairs of a plan."""
+    return [(r["task_id"], r["task_seed"]) for r in plan["runs"]]
+
+
+def save_rerun_plan(plan: Dict[str, Any], study_dir: Path) -> None:
+    with open(Path(study_dir) / RERUN_PLAN_FILE, "w") as f:
+        json.dump(plan, f, indent=2)
+
+
+def rerun_outcome(
+    plan: Dict[str, Any], rerun_results: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """How the rerun changed the planned runs, for the combined summary."""
+    by_run = {(r["task_id"], r["task_seed"]): r for r in rerun_results}
+    executed = [job for job in plan_jobs(plan) if job in by_run]
+    return {
+        "source_study": plan["source_study"],
+        "planned_runs": len(plan["runs"]),
+        "executed_runs": len(executed),
+        "recovered_runs": sum(
+            1 for job in executed if by_run[job]["task_completion"] == 1.0
+        ),
+        "still_failing_runs": sum(
+            1 for job in executed if by_run[job]["task_completion"] < 1.0
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the rerun plan of a study")
+    parser.add_argument("study_dir")
+    parser.add_argument(
+        "--filter",
+        default=os.getenv("RERUN_FILTER", DEFAULT_RERUN_FILTER),
+        help="e.g. 'error,truncated,incomplete,f1<0.5' (env: RERUN_FILTER)",
+    )
+    args = parser.parse_args()
+
+    try:
+        plan = build_rerun_plan(Path(args.study_dir), parse_rerun_filter(args.filter))
+    except ValueError as e:
+        parser.error(str(e))
+    for run in plan["runs"]:
+        print(f"{run['task_id']}\tseed {run['task_seed']}\t{','.join(run['reasons'])}")
+    print(f"{len(plan['runs'])} run(s) to rerun from {plan['source_study']}")
+
+
+if __name__ == "__main__":
+    main()
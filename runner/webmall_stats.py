@@ -0,0 +1,149 @@
+"""
+Small statistics helpers for WebMall study summaries.
+
+Only the standard library is used so the helpers can be imported by the
+runners and by offline tooling without pulling in browser-use.
+"""
+
+import math
+import random
+from statistics import NormalDist, mean, stdev
+from typing import List, Optional, Sequence, Tuple
+
+
+def _z_value(confidence: float) -> float:
+    """Two-sided standard normal quantile for the given confidence level."""
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+# Two-sided Student t quantiles for df 1..5, where the expansion below is too
+# low (11.30 instead of 12.71 at df=1, 95%); per-task intervals over 2-3 seeds
+# live exactly there
+_T_TABLE = {
+    0.90: (6.3138, 2.9200, 2.3534, 2.1318, 2.0150),
+    0.95: (12.7062, 4.3027, 3.1824, 2.7764, 2.5706),
+    0.99: (63.6567, 9.9248, 5.8409, 4.6041, 4.0321),
+}
+
+
+def _t_value(confidence: float, df: int) -> float:
+    """Two-sided Student t quantile.
+
+    Tabled for df <= 5 at the 90/95/99% levels, otherwise a Cornish-Fisher
+    expansion around z (accurate to ~1e-3 for df > 5).
+    """
+    if df <= 0:
+        return float("inf")
+    table = _T_TABLE.get(round(confidence, 4))
+    if table is not None and df <= len(table):
+        return table[df - 1]
+    z = _z_value(confidence)
+    g1 = (z**3 + z) / 4
+    g2 = (5 * z**5 + 16 * z**3 + 3 * z) / 96
+    g3 = (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / 384
+    g4 = (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / 92160
+    return z + g1 / df + g2 / df**2 + g3 / df**3 + g4 / df**4
+
+
+def wilson_interval(
+    successes: float, n: int, confidence: float = 0.95
+) -> Tuple[float, float]:
+    """Wilson score interval for a success rate.
+
+    Well behaved for small n and for rates of exactly 0 or 1, which is the
+    common case for per-task completion over a handful of seeds.
+    """
+    if n <= 0:
+        return (0.0, 1.0)
+    z = _z_value(confidence)
+    p = successes / n
+    denom = 1 + z**2 / n
+    centre = (p + z**2 / (2 * n)) / denom
+    half = z * math.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denom
+    return (max(0.0, centre - half), min(1.0, centre + half))
+
+
+def mean_interval(
+    values: Sequence[float],
+    confidence: float = 0.95,
+    bounds: Optional[Tuple[float, float]] = None,
+) -> Tuple[float, float, float]:
+    """Mean and t-based confidence interval of a sample.
+
+    Returns (mean, low, high), optionally clipped to ``bounds`` (e.g. (0, 1)
+    for scores). With fewer than two values the interval collapses to the
+    mean itself.
+    """
+    values = list(values)
+    if not values:
+        return (0.0, 0.0, 0.0)
+    m = mean(values)
+    if len(values) < 2:
+        return (m, m, m)
+    half = _t_value(confidence, len(values) - 1) * stdev(values) / math.sqrt(
+        len(values)
+    )
+    low, high = m - half, m + half
+    if bounds is not None:
+        low, high = max(bounds[0], low), min(bounds[1], high)
+    return (m, low, high)
+
+
+def interval_width(interval: Sequence[float]) -> float:
+    """Width of a (low, high) or (mean, low, high) interval."""
+    return interval[-1] - interval[-2]
+
+
+def as_list(interval: Sequence[float], digits: int = 4) -> List[float]:
+    """Round an interval for JSON output."""
+    return [round(v, digits) for v in interval]
+
+
+def mcnemar_exact(
+    before: Sequence[bool], after: Sequence[bool]
+) -> Tuple[int, int, float]:
+    """Exact McNemar test for paired binary outcomes (e.g. task completion).
+
+    Returns (lost, gained, p_value): runs that succeeded only before, runs
+    that succeeded only after, and the two-sided binomial p-value of the
+    discordant pairs.
+    """
+    lost = sum(1 for b, a in zip(before, after) if b and not a)
+    gained = sum(1 for b, a in zip(before, after) if a and not b)
+    n = lost + gained
+    if n == 0:
+        return (0, 0, 1.0)
+    k = min(lost, gained)
+    tail = sum(math.comb(n, i) for i in range(k + 1)) / 2**n
+    return (lost, gained, min(1.0, 2 * tail))
+
+
+def paired_permutation_test(
+    before: Sequence[float],
+    after: Sequence[float],
+    rounds: int = 2000,
+    seed: int = 0,
+) -> float:
+    """Two-sided sign-flip permutation test of the mean paired difference.
+
+    Exact for up to 16 pairs, Monte Carlo with ``rounds`` random sign flips
+    (fixed seed, so reports are reproducible) above that. Makes no normality
+    assumption, which matters for skewed metrics like steps, time or cost.
+    """
+    diffs = [a - b for b, a in zip(before, after)]
+    diffs = [d for d in diffs if d != 0]
+    if not diffs:
+        return 1.0
+    observed = abs(sum(diffs)) - 1e-12
+    if len(diffs) <= 16:
+        hits = 0
+        for mask in range(2 ** len(diffs)):
+            total = sum(-d if mask >> i & 1 else d for i, d in enumerate(diffs))
+            hits += abs(total) >= observed
+        return hits / 2 ** len(diffs)
+    rng = random.Random(seed)
+    hits = sum(
+        abs(sum(d if rng.random() < 0.5 else -d for d in diffs)) >= observed
+        for _ in range(rounds)
+    )
+    return (hits + 1) / (rounds + 1)
@@ -0,0 +1,315 @@
+"""
+Live progress of a running study.
+
+StudyProgress is updated by the study runner as runs start, finish steps and
+complete. It keeps rolling-window rates (runs/min, steps/min, tokens/min,
+cost/min), an ETA and per-shop error counts, writes them to
+<study_dir>/status.json (atomically, at most once per second) and can serve
+the same JSON over a small local HTTP endpoint. Given the study's ResultWriter,
+the snapshot is taken and written on its thread, so the event loop and the
+worker threads that report steps never wait for the file (or for metrics
+sources such as the work queue's SQLite counts).
+
+With a shared work queue each runner writes its own status file, but the
+queued count and the ETA are those of the whole study: they come from the
+queue's pending and leased runs, and the ETA assumes the other active
+runners are about as fast as this one:
+
+    curl http://localhost:8765/status
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from webmall_writer import ResultWriter
+
+STATUS_FILE = "status.json"
+
+
+class StudyProgress:
+    """Thread-safe progress tracker of one study."""
+
+    def __init__(
+        self,
+        study_dir: Path,
+        total_runs: int,
+        window_seconds: float = 600.0,
+        write_interval: float = 1.0,
+        status_file: str = STATUS_FILE,
+        writer: Optional[ResultWriter] = None,
+        study_runs: Optional[Callable[[], Dict[str, int]]] = None,
+    ):
+        self.study_dir = Path(study_dir)
+        self.status_file = status_file
+        self.writer = writer
+        # WorkQueue.progress of a shared queue: pending, leased and runners
+        self.study_runs = study_runs
+        self.total_runs = total_runs
+        self.window_seconds = window_seconds
+        self.write_interval = write_interval
+
+        self._lock = threading.Lock()
+        # Serializes writes of the status file (events come from several threads)
+        self._write_lock = threading.Lock()
+        self._started_at = time.time()
+        self._last_write = 0.0
+        self._state = "running"
+
+        self._in_flight: Dict[str, Dict[str, Any]] = {}
+        self._done = 0
+        self._skipped = 0
+        self._succeeded = 0
+        self._errored = 0
+        self._truncated = 0
+        self._timed_out = 0
+        self._steps_total = 0
+        self._tokens_total = 0
+        self._cost_total = 0.0
+        self._errors_by_shop: Dict[str, Dict[str, int]] = {}
+
+        # (timestamp, value) events for the rolling rates
+        self._completions: Deque[float] = deque()
+        self._steps: Deque[Tuple[float, int, int, float]] = deque()
+
+        # name -> callable returning a dict, published as is (e.g. writer stats)
+        self._metrics: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def add_metrics(self, name: str, source: Callable[[], Dict[str, Any]]) -> None:
+        """Publish ``source()`` under ``name`` in every snapshot."""
+        self._metrics[name] = source
+
+    # ------------------------------------------------------------------ events
+
+    def run_started(self, key: str, task_id: str, category: str) -> None:
+        with self._lock:
+            self._in_flight[key] = {
+                "task_id": task_id,
+                "category": category,
+                "started_at": time.time(),
+                "steps": 0,
+                "tokens": 0,
+                "cost": 0.0,
+            }
+        self.write()
+
+    def run_skipped(self, key: str) -> None:
+        with self._lock:
+            self._skipped += 1
+        self.write()
+
+    def step_finished(
+        self, key: str, steps: int, tokens: int = 0, cost: float = 0.0
+    ) -> None:
+        """Report cumulative steps / tokens / cost of an in-flight run."""
+        now = time.time()
+        with self._lock:
+            run = self._in_flight.get(key)
+            if run is None:
+                return
+            d_steps = max(0, steps - run["steps"])
+            d_tokens = max(0, tokens - run["tokens"])
+            d_cost = max(0.0, cost - run["cost"])
+            run.update(steps=steps, tokens=tokens, cost=cost, last_step_at=now)
+            self._steps_total += d_steps
+            self._tokens_total += d_tokens
+            self._cost_total += d_cost
+            self._steps.append((now, d_steps, d_tokens, d_cost))
+        self.write()
+
+    def run_finished(
+        self,
+        key: str,
+        result: Dict[str, Any],
+        shop_errors: Optional[Dict[str, Dict[str, int]]] = None,
+    ) -> None:
+        """Record a finished run; its final usage tops up the step estimates."""
+        now = time.time()
+        usage = result.get("usage_info") or {}
+        tokens = (usage.get("tokens") or {}).get("total_tokens", 0)
+        cost = (usage.get("costs") or {}).get("total_cost", 0.0)
+
+        with self._lock:
+            run = self._in_flight.pop(key, None) or {"steps": 0, "tokens": 0, "cost": 0.0}
+            d_steps = max(0, result.get("n_steps", 0) - run["steps"])
+            d_tokens = max(0, tokens - run["tokens"])
+            d_cost = max(0.0, cost - run["cost"])
+            self._steps_total += d_steps
+            self._tokens_total += d_tokens
+            self._cost_total += d_cost
+            if d_steps or d_tokens or d_cost:
+                self._steps.append((now, d_steps, d_tokens, d_cost))
+
+            self._done += 1
+            self._completions.append(now)
+            if result.get("task_completion") == 1.0:
+                self._succeeded += 1
+            if result.get("error"):
+                self._errored += 1
+            if result.get("truncated"):
+                self._truncated += 1
+            if result.get("termination_reason") == "timeout":
+                self._timed_out += 1
+            for shop, counts in (shop_errors or {}).items():
+                totals = self._errors_by_shop.setdefault(shop, {})
+                for kind, n in counts.items():
+                    totals[kind] = totals.get(kind, 0) + n
+        self.write()
+
+    def finish(self) -> None:
+        """Mark the study finished and write the final status synchronously.
+
+        Call it after the writer is closed, so no queued snapshot lands later.
+        """
+        with self._lock:
+            self._state = "finished"
+        self.write(force=True)
+
+    # ---------------------------------------------------------------- snapshot
+
+    def _trim(self, now: float) -> None:
+        horizon = now - self.window_seconds
+        while self._completions and self._completions[0] < horizon:
+            self._completions.popleft()
+        while self._steps and self._steps[0][0] < horizon:
+            self._steps.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        metrics = {name: source() for name, source in self._metrics.items()}
+        shared = self.study_runs() if self.study_runs else None
+        with self._lock:
+            self._trim(now)
+            elapsed = now - self._started_at
+            window_min = max(min(self.window_seconds, elapsed), 1.0) / 60
+            runs_per_min = len(self._completions) / window_min
+            steps_per_min = sum(s[1] for s in self._steps) / window_min
+            tokens_per_min = sum(s[2] for s in self._steps) / window_min
+            cost_per_min = sum(s[3] for s in self._steps) / window_min
+
+            if shared is None:
+                queued = max(
+                    0,
+                    self.total_runs - self._done - self._skipped - len(self._in_flight),
+                )
+                remaining = queued + len(self._in_flight)
+                study_runs_per_min = runs_per_min
+            else:
+                queued = shared["pending"]
+                remaining = queued + shared["leased"]
+                study_runs_per_min = runs_per_min * max(shared["runners"], 1)
+            eta_seconds = (
+                remaining / study_runs_per_min * 60 if study_runs_per_min > 0 else None
+            )
+
+            return {
+                "state": self._state,
+                "study_dir": str(self.study_dir),
+                "updated_at": datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+                "elapsed_seconds": round(elapsed, 1),
+                "runs": {
+                    "total": self.total_runs,
+                    "done": self._done,
+                    "in_flight": len(self._in_flight),
+                    "queued": queued,
+                    "skipped": self._skipped,
+                    "succeeded": self._succeeded,
+                    "errored": self._errored,
+                    "truncated": self._truncated,
+                    "timed_out": self._timed_out,
+                },
+                "rates": {
+                    "window_seconds": self.window_seconds,
+                    "runs_per_min": round(runs_per_min, 3),
+                    "steps_per_min": round(steps_per_min, 2),
+                    "tokens_per_min": round(tokens_per_min, 1),
+                    "cost_per_min": round(cost_per_min, 5),
+                },
+                "totals": {
+                    "steps": self._steps_total,
+                    "tokens": self._tokens_total,
+                    "cost": round(self._cost_total, 5),
+                },
+                "eta_seconds": round(eta_seconds, 1) if eta_seconds is not None else None,
+                "errors_by_shop": self._errors_by_shop,
+                **metrics,
+                "in_flight": [
+                    {
+                        "key": key,
+                        "task_id": run["task_id"],
+                        "category": run["category"],
+                        "running_seconds": round(now - run["started_at"], 1),
+                        "steps": run["steps"],
+                    }
+                    for key, run in self._in_flight.items()
+                ],
+            }
+
+    def write(self, force: bool = False) -> None:
+        """Atomically (re)write the status file, throttled to write_interval.
+
+        With a writer, the snapshot is queued to its thread; forced writes
+        (and writes without one) happen synchronously.
+        """
+        path = self.study_dir / self.status_file
+        with self._write_lock:
+            now = time.time()
+            if not force and now - self._last_write < self.write_interval:
+                return
+            self._last_write = now
+            if self.writer is not None and not force:
+                self.writer.write_json(path, self.snapshot)
+                return
+            snapshot = self.snapshot()
+            with tempfile.NamedTemporaryFile(
+                "w",
+                dir=path.parent,
+                prefix=f".{path.name}.",
+                suffix=".tmp",
+                delete=False,
+            ) as f:
+                json.dump(snapshot, f, indent=2)
+            try:
+                os.replace(f.name, path)
+            except OSError:
+                os.unlink(f.name)
+                raise
+
+
+# ============================================================================
+# HTTP Endpoint
+# ============================================================================
+
+
+def serve_status(
+    progress: StudyProgress, port: int, host: str = "0.0.0.0"
+) -> ThreadingHTTPServer:
+    """Serve GET /status (and /) as JSON from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip("/") not in ("", "/status"):
+                self.send_error(404)
+                return
+            body = json.dumps(progress.snapshot(), indent=2).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # keep the study log readable
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Status endpoint: http://{host}:{port}/status")
+    return server
@@ -0,0 +1,222 @@
+"""
+Step-streaming persistence of agent runs.
+
+StepStream is hooked into Agent.run's on_step_end. After every step it
+appends the step's trajectory record to <task_dir>/steps.jsonl and the full
+AgentHistory item to <task_dir>/agent_history.jsonl, and moves the step's
+screenshot from the agent's temp directory to <task_dir>/screenshots/.
+The LLM calls made since the previous step are booked on the step as its
+"tokens" (input, cached input, output, calls), so trajectory.json shows
+which steps the input tokens of a run went to.
+
+Persisted history items are then compacted in memory (thinking, memory,
+extracted content, interacted elements dropped); only the url, next goal,
+actions, errors and the final done result stay, which is all browser-use and
+the runner still read during and after a run. The last item is kept intact.
+
+The records are built on the event loop (the agent's objects change from
+step to step); appending them and moving the screenshots runs in a thread
+(asyncio.to_thread), so the loop is not blocked by the disk.
+
+save_task_results assembles trajectory.json and agent_history.json from the
+streams and removes them; after a crash they are left behind as the partial
+trajectory of the run.
+"""
+
+import asyncio
+import json
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+STEPS_FILE = "steps.jsonl"
+HISTORY_STREAM_FILE = "agent_history.jsonl"
+SCREENSHOT_DIR = "screenshots"
+
+
+def step_record(history_item) -> Dict[str, Any]:
+    """Trajectory record of one AgentHistory item."""
+    step_data = {}
+
+    # Get step timing if available
+    if hasattr(history_item, "metadata") and history_item.metadata:
+        metadata = history_item.metadata
+        if hasattr(metadata, "duration_seconds"):
+            step_data["duration_seconds"] = metadata.duration_seconds
+        if hasattr(metadata, "step_number"):
+            step_data["step_number"] = metadata.step_number
+
+    # Get model output (thinking, actions, etc.)
+    if hasattr(history_item, "model_output") and history_item.model_output:
+        model_output = history_item.model_output
+        if hasattr(model_output, "thinking") and model_output.thinking:
+            step_data["thinking"] = model_output.thinking
+        if (
+            hasattr(model_output, "evaluation_previous_goal")
+            and model_output.evaluation_previous_goal
+        ):
+            step_data["evaluation_previous_goal"] = model_output.evaluation_previous_goal
+        if hasattr(model_output, "memory") and model_output.memory:
+            step_data["memory"] = model_output.memory
+        if hasattr(model_output, "next_goal") and model_output.next_goal:
+            step_data["next_goal"] = model_output.next_goal
+
+        # Extract actions
+        if hasattr(model_output, "action"):
+            actions = []
+            for action in model_output.action:
+                # Convert action to dict
+                action_dict = action.model_dump() if hasattr(action, "model_dump") else {}
+                actions.append(action_dict)
+            step_data["actions"] = actions
+
+    # Get action results
+    if hasattr(history_item, "result"):
+        results = []
+        for result in history_item.result:
+            result_dict = result.model_dump() if hasattr(result, "model_dump") else {}
+            results.append(result_dict)
+        step_data["results"] = results
+
+    # Get browser state (URL)
+    if hasattr(history_item, "state") and history_item.state:
+        state = history_item.state
+        if hasattr(state, "url"):
+            step_data["url"] = state.url
+
+    return step_data
+
+
+def usage_record(entries) -> Dict[str, int]:
+    """Token counts of browser-use TokenUsageEntry items (LLM calls)."""
+    return {
+        "input": sum(e.usage.prompt_tokens for e in entries),
+        "cached_input": sum(e.usage.prompt_cached_tokens or 0 for e in entries),
+        "output": sum(e.usage.completion_tokens for e in entries),
+        "llm_calls": len(entries),
+    }
+
+
+def compact_history_item(history_item) -> None:
+    """Drop the bulky, already persisted parts of a history item in place."""
+    model_output = history_item.model_output
+    if model_output is not None:
+        history_item.model_output = model_output.model_copy(
+            update={"thinking": None, "evaluation_previous_goal": "", "memory": ""}
+        )
+    history_item.result = [
+        r
+        if r.is_done
+        else r.model_copy(
+            update={
+                "extracted_content": None,
+                "long_term_memory": None,
+                "attachments": None,
+                "metadata": None,
+            }
+        )
+        for r in history_item.result
+    ]
+    if history_item.state is not None:
+        history_item.state.interacted_element = []
+        history_item.state.tabs = []
+
+
+class StepStream:
+    """Appends each finished step of an agent run to the task directory."""
+
+    def __init__(self, task_dir: Path, compact: bool = True):
+        self.task_dir = Path(task_dir)
+        self.compact = compact
+        self.steps_path = self.task_dir / STEPS_FILE
+        self.history_path = self.task_dir / HISTORY_STREAM_FILE
+        self._persisted = 0
+        self._compacted = 0
+        self._usage_booked = 0
+
+    def _store_screenshot(self, source: Optional[str], index: int) -> Optional[str]:
+        """Move a step's screenshot into the task directory; its new path, or
+        None if there was nothing to move."""
+        if not source or not Path(source).exists():
+            return None
+        target = self.task_dir / SCREENSHOT_DIR / f"step_{index}{Path(source).suffix}"
+        target.parent.mkdir(exist_ok=True)
+        shutil.move(source, target)
+        return str(target)
+
+    def _collect(self, agent) -> List[Tuple[int, Dict[str, Any], Dict[str, Any]]]:
+        """(index, trajectory record, history item dump) of the new steps."""
+        history = agent.history.history
+        usage = getattr(getattr(agent, "token_cost_service", None), "usage_history", [])
+        pending = []
+        for index in range(self._persisted, len(history)):
+            record = step_record(history[index])
+            if index == len(history) - 1:
+                record["tokens"] = usage_record(usage[self._usage_booked :])
+                self._usage_booked = len(usage)
+            pending.append((index, record, history[index].model_dump()))
+        self._persisted = len(history)
+        return pending
+
+    def _write(
+        self, pending: List[Tuple[int, Dict[str, Any], Dict[str, Any]]]
+    ) -> Dict[int, str]:
+        """Move the screenshots and append the steps; index -> new screenshot."""
+        moved = {}
+        with open(self.steps_path, "a", encoding="utf-8") as steps_file, open(
+            self.history_path, "a", encoding="utf-8"
+        ) as history_file:
+            for index, record, item in pending:
+                state = item.get("state") or {}
+                target = self._store_screenshot(state.get("screenshot_path"), index)
+                if target is not None:
+                    moved[index] = state["screenshot_path"] = target
+                    record["screenshot"] = str(
+                        Path(target).relative_to(self.task_dir)
+                    )
+                steps_file.write(json.dumps(record) + "\n")
+                history_file.write(json.dumps(item) + "\n")
+        return moved
+
+    def _finish(self, agent, moved: Dict[int, str]) -> None:
+        history = agent.history.history
+        for index, target in moved.items():
+            history[index].state.screenshot_path = target
+        # browser-use still reads the latest item, so it stays intact
+        if self.compact:
+            while self._compacted < self._persisted - 1:
+                compact_history_item(history[self._compacted])
+                self._compacted += 1
+
+    def sync(self, agent) -> None:
+        """Persist all history items not yet written, then compact old ones."""
+        pending = self._collect(agent)
+        self._finish(agent, self._write(pending) if pending else {})
+
+    async def flush(self, agent) -> None:
+        """Like sync, with the file work in a thread instead of on the loop."""
+        pending = self._collect(agent)
+        moved = await asyncio.to_thread(self._write, pending) if pending else {}
+        self._finish(agent, moved)
+
+    async def on_step_end(self, agent) -> None:
+        await self.flush(agent)
+
+    def read_steps(self) -> List[Dict[str, Any]]:
+        return _read_jsonl(self.steps_path)
+
+    def read_history(self) -> Dict[str, Any]:
+        """The streamed history in the format of AgentHistoryList.save_to_file."""
+        return {"history": _read_jsonl(self.history_path)}
+
+    def remove(self) -> None:
+        """Drop the streams once the final artifacts are written."""
+        self.steps_path.unlink(missing_ok=True)
+        self.history_path.unlink(missing_ok=True)
+
+
+def _read_jsonl(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
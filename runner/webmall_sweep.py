@@ -0,0 +1,228 @@
+"""
+Configuration sweeps for the browser-use study runner.
+
+A sweep is a grid over the agent configuration
+
+    model           e.g. gpt-4.1-2025-04-14,gpt-4.1-mini-2025-04-14
+    temperature     e.g. 0,0.7
+    use_vision      false, true or on_demand (see webmall_vision)
+    max_steps       e.g. 30,50
+    wait_profile    browsergym, fast or patient (see WAIT_PROFILES)
+    network_filter  off, report or block (see webmall_netfilter)
+    observation     full or lean (see webmall_observation)
+    catalog         false,true: the product catalog action (see webmall_catalog)
+
+written as a one-line spec (CLI / SWEEP env var) or as a JSON file:
+
+    SWEEP="model=gpt-4.1-2025-04-14,gpt-4.1-mini-2025-04-14;use_vision=false,true"
+    SWEEP=/results/sweeps/vision.json    {"use_vision": [false, true], "max_steps": [30, 50]}
+
+A JSON file may instead list the configurations explicitly ([{...}, {...}]).
+Keys that are not given keep the value of the base configuration (the
+runner's CLI options).
+
+The study runner interleaves the runs of all configurations through its one
+scheduler (same worker slots, same LLM rate limiter) and writes one
+directory per configuration below the sweep directory. Each of them is laid
+out like a study, so compare_studies.py can compare two configurations.
+"""
+
+import itertools
+import json
+import re
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from webmall_netfilter import NETWORK_FILTER_MODES
+from webmall_observation import OBSERVATION_MODES
+from webmall_stats import as_list, wilson_interval
+from webmall_vision import VISION_ON_DEMAND
+
+SWEEP_FILE = "sweep.json"
+SWEEP_SUMMARY_FILE = "sweep_summary.json"
+
+# Page load waits of the browser profile (seconds)
+WAIT_PROFILES = {
+    # BrowserGym waits 0.5s after an action + up to 3s for the DOM
+    "browsergym": {
+        "minimum_wait_page_load_time": 0.5,
+        "wait_for_network_idle_page_load_time": 6.0,
+    },
+    "fast": {
+        "minimum_wait_page_load_time": 0.25,
+        "wait_for_network_idle_page_load_time": 2.0,
+    },
+    "patient": {
+        "minimum_wait_page_load_time": 1.0,
+        "wait_for_network_idle_page_load_time": 10.0,
+    },
+}
+
+
+def parse_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    if str(value).strip().lower() in ("1", "true", "yes", "on"):
+        return True
+    if str(value).strip().lower() in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Not a boolean: {value!r}")
+
+
+def parse_use_vision(value: Any) -> Any:
+    """True, False or VISION_ON_DEMAND."""
+    if str(value).strip().lower().replace("-", "_") == VISION_ON_DEMAND:
+        return VISION_ON_DEMAND
+    return parse_bool(value)
+
+
+def parse_wait_profile(value: Any) -> str:
+    if value not in WAIT_PROFILES:
+        raise ValueError(
+            f"Unknown wait profile {value!r} (known: {', '.join(WAIT_PROFILES)})"
+        )
+    return value
+
+
+def parse_network_filter(value: Any) -> str:
+    if value not in NETWORK_FILTER_MODES:
+        raise ValueError(
+            f"Unknown network filter {value!r} "
+            f"(known: {', '.join(NETWORK_FILTER_MODES)})"
+        )
+    return value
+
+
+def parse_observation(value: Any) -> str:
+    if value not in OBSERVATION_MODES:
+        raise ValueError(
+            f"Unknown observation mode {value!r} "
+            f"(known: {', '.join(OBSERVATION_MODES)})"
+        )
+    return value
+
+
+# Sweepable keys of a configuration and how their values are parsed
+SWEEP_KEYS: Dict[str, Callable[[Any], Any]] = {
+    "model": str,
+    "temperature": float,
+    "use_vision": parse_use_vision,
+    "max_steps": int,
+    "wait_profile": parse_wait_profile,
+    "network_filter": parse_network_filter,
+    "observation": parse_observation,
+    "catalog": parse_bool,
+}
+
+
+def _parse_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    unknown = set(config) - set(SWEEP_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown sweep keys: {', '.join(sorted(unknown))}")
+    return {key: SWEEP_KEYS[key](value) for key, value in config.items()}
+
+
+def parse_sweep(spec: Optional[str]) -> List[Dict[str, Any]]:
+    """Configuration overrides of a sweep spec or JSON file ([] without sweep)."""
+    spec = (spec or "").strip()
+    if not spec:
+        return []
+
+    if spec.endswith(".json") or Path(spec).is_file():
+        data = json.loads(Path(spec).read_text(encoding="utf-8"))
+        if isinstance(data, list):
+            return [_parse_config(config) for config in data]
+        grid = {k: v if isinstance(v, list) else [v] for k, v in data.items()}
+    else:
+        grid = {}
+        for part in spec.split(";"):
+            key, _, values = part.partition("=")
+            if key.strip():
+                grid[key.strip()] = [v.strip() for v in values.split(",") if v.strip()]
+
+    keys = list(grid)
+    return [
+        _parse_config(dict(zip(keys, values)))
+        for values in itertools.product(*(grid[k] for k in keys))
+    ]
+
+
+def config_name(config: Dict[str, Any], keys: List[str]) -> str:
+    """Directory name of a configuration from the values of the swept ``keys``."""
+    parts = []
+    for key in keys:
+        value = config[key]
+        if isinstance(value, bool):
+            value = "on" if value else "off"
+        parts.append(f"{key}-{value}")
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", "_".join(parts)) or "base"
+
+
+def expand_sweep(
+    base: Dict[str, Any], overrides: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """Full, uniquely named configurations of a sweep over ``base``."""
+    configs = [dict(base, **override) for override in overrides or [{}]]
+    # Name by the keys that actually differ between the configurations
+    keys = [k for k in SWEEP_KEYS if len({repr(c[k]) for c in configs}) > 1]
+    names = set()
+    for config in configs:
+        config["name"] = config_name(config, keys)
+        if config["name"] in names:
+            raise ValueError(f"Duplicate sweep configuration: {config['name']}")
+        names.add(config["name"])
+    return configs
+
+
+def summarize_sweep(
+    configs: List[Dict[str, Any]], results: Dict[str, List[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """Headline metrics of every configuration, for sweep_summary.json."""
+    summary = {}
+    for config in configs:
+        runs = results.get(config["name"], [])
+        n = len(runs)
+        completed = sum(r["task_completion"] for r in runs)
+        tokens = [
+            ((r.get("usage_info") or {}).get("tokens") or {}).get("total_tokens", 0)
+            for r in runs
+        ]
+        input_tokens = [
+            ((r.get("usage_info") or {}).get("tokens") or {}).get(
+                "total_input_tokens", 0
+            )
+            for r in runs
+        ]
+        costs = [
+            ((r.get("usage_info") or {}).get("costs") or {}).get("total_cost", 0.0)
+            for r in runs
+        ]
+        summary[config["name"]] = {
+            "config": {k: v for k, v in config.items() if k != "name"},
+            "num_runs": n,
+            "avg_task_completion_rate": completed / n if n else 0.0,
+            "task_completion_ci": as_list(wilson_interval(completed, n)),
+            "avg_f1_score": sum(r["f1_score"] for r in runs) / n if n else 0.0,
+            "avg_steps": sum(r["n_steps"] for r in runs) / n if n else 0.0,
+            "avg_time_elapsed": sum(r["time_elapsed"] for r in runs) / n if n else 0.0,
+            "avg_tokens_per_run": sum(tokens) / n if n else 0,
+            "avg_input_tokens_per_run": sum(input_tokens) / n if n else 0,
+            "avg_cost_per_run": sum(costs) / n if n else 0.0,
+            "total_cost": sum(costs),
+        }
+    return summary
+
+
+def print_sweep_summary(summary: Dict[str, Any]) -> None:
+    print(f"\n{'='*80}")
+    print("SWEEP SUMMARY")
+    print(f"{'='*80}")
+    for name, entry in summary.items():
+        low, high = entry["task_completion_ci"]
+        print(
+            f"{name:<40} {entry['num_runs']:>4} runs  "
+            f"completion {entry['avg_task_completion_rate']:.2%} ({low:.0%}-{high:.0%})  "
+            f"F1 {entry['avg_f1_score']:.2%}  steps {entry['avg_steps']:.1f}  "
+            f"{entry['avg_input_tokens_per_run']:,.0f} input tokens/run  "
+            f"${entry['avg_cost_per_run']:.4f}/run"
+        )
@@ -0,0 +1,431 @@
+"""
+Streaming, indexed loader for WebMall task_sets.json files.
+
+Shared by all three runners so they agree on what a taskset selection means.
+The taskset is streamed suite by suite (never loaded as a whole) into a SQLite
+index stored next to it (or in TASKSET_INDEX_DIR when the taskset lives on a
+read-only mount). The index is rebuilt automatically when the taskset changes,
+after that selection queries do not touch the JSON file at all.
+
+A selection is a dict with any of these keys:
+
+    ids         list of id globs            ["Webmall_Find_*", "*Task12"]
+    categories  list of categories          ["Substitute"]
+    suites      list of suite id globs      ["WEBMALL_FIND_CHEAPEST_*"]
+    exclude_categories  list of categories  ["Add_To_Cart", "Checkout"]
+    study       study directory used by ``failed`` and ``slowest``
+    failed      only tasks that failed (completion < 1 or error) in ``study``
+    slowest     only the N tasks with the largest time_elapsed in ``study``
+    limit       keep the first N selected tasks
+
+and can be written as a one-line spec for env vars / CLI (see parse_selection):
+
+    TASK_SELECT="categories=Substitute,Cheapest_Product;ids=*Task1*;limit=5"
+    TASK_SELECT="study=/results/2025-10-01_12-00-00_browseruse-gpt-4.1-on-webmall;failed"
+
+Usage:
+    python webmall_tasksets.py task_sets.json --select "categories=Substitute"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+INDEX_VERSION = 1
+SELECTION_LIST_KEYS = ("ids", "categories", "suites", "exclude_categories")
+SELECTION_INT_KEYS = ("slowest", "limit")
+
+
+# ============================================================================
+# Streaming
+# ============================================================================
+
+
+def iter_task_sets(path: str, chunk_size: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """Yield the suites of a task_sets.json file one at a time.
+
+    The file is read in chunks and only the suite being decoded is held in
+    memory, so even very large tasksets stream in bounded memory.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path}: expected a JSON array of task sets")
+        buf = buf[1:]
+        eof = False
+
+        while True:
+            buf = buf.lstrip().lstrip(",").lstrip()
+            if not buf and not eof:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf += chunk
+                continue
+            if buf.startswith("]"):
+                return
+            if not buf and eof:
+                raise ValueError(f"{path}: unexpected end of file")
+            try:
+                suite, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # Grow geometrically so a large suite is re-parsed O(log n) times
+                chunk = f.read(max(chunk_size, len(buf)))
+                eof = not chunk
+                buf += chunk
+                continue
+            yield suite
+            buf = buf[end:]
+
+
+# ============================================================================
+# Index
+# ============================================================================
+
+
+def default_index_path(taskset_path: str) -> Path:
+    """Where the index of a taskset lives.
+
+    TASKSET_INDEX_DIR wins; otherwise next to the taskset when that directory
+    is writable, else the system temp directory.
+    """
+    source = Path(taskset_path).resolve()
+    digest = hashlib.sha1(str(source).encode("utf-8")).hexdigest()[:10]
+    name = f".{source.stem}.{digest}.index.sqlite"
+
+    index_dir = os.getenv("TASKSET_INDEX_DIR")
+    if index_dir:
+        return Path(index_dir) / name
+    if os.access(source.parent, os.W_OK):
+        return source.parent / name
+    return Path(tempfile.gettempdir()) / name
+
+
+def _source_fingerprint(taskset_path: str) -> str:
+    stat = Path(taskset_path).stat()
+    return f"{INDEX_VERSION}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def build_index(taskset_path: str, index_path: Path) -> None:
+    """(Re)build the SQLite index of a taskset by streaming it."""
+    index_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(
+            """
+            CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE suites (position INTEGER PRIMARY KEY, id TEXT, body TEXT);
+            CREATE TABLE tasks (
+                position INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                category TEXT,
+                suite_position INTEGER,
+                suite_id TEXT,
+                body TEXT NOT NULL
+            );
+            """
+        )
+        position = 0
+        for suite_position, suite in enumerate(iter_task_sets(taskset_path)):
+            tasks = suite.pop("tasks", [])
+            conn.execute(
+                "INSERT INTO suites VALUES (?, ?, ?)",
+                (suite_position, suite.get("id", ""), json.dumps(suite)),
+            )
+            conn.executemany(
+                "INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        position + i,
+                        task["id"],
+                        task.get("category", ""),
+                        suite_position,
+                        suite.get("id", ""),
+                        json.dumps(task),
+                    )
+                    for i, task in enumerate(tasks)
+                ),
+            )
+            position += len(tasks)
+        conn.executescript(
+            """
+            CREATE INDEX tasks_id ON tasks (id);
+            CREATE INDEX tasks_category ON tasks (category);
+            CREATE INDEX tasks_suite ON tasks (suite_id);
+            """
+        )
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)",
+            [
+                ("source", str(Path(taskset_path).resolve())),
+                ("fingerprint", _source_fingerprint(taskset_path)),
+            ],
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, index_path)
+
+
+def open_index(
+    taskset_path: str, index_path: Optional[Path] = None, rebuild: bool = False
+) -> sqlite3.Connection:
+    """Open the index of a taskset, building it first if missing or stale."""
+    index_path = Path(index_path) if index_path else default_index_path(taskset_path)
+
+    if not rebuild and index_path.exists():
+        conn = sqlite3.connect(index_path)
+        try:
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'fingerprint'"
+            ).fetchone()
+        except sqlite3.DatabaseError:
+            row = None
+        if row and row[0] == _source_fingerprint(taskset_path):
+            return conn
+        conn.close()
+
+    build_index(taskset_path, index_path)
+    return sqlite3.connect(index_path)
+
+
+# ============================================================================
+# Study Results
+# ============================================================================
+
+
+def load_study_runs(study_dir: str) -> List[Dict[str, Any]]:
+    """Per-run records (task_id, task_seed, metrics, error, time) of a study.
+
+    Reads study_summary.json; studies without one (still running, crashed) or
+    with summaries that predate the time_elapsed field fall back to the
+    full_result.json files of the task directories.
+    """
+    study_path = Path(study_dir)
+    summary_path = study_path / "study_summary.json"
+    if summary_path.exists():
+        summary = json.loads(summary_path.read_text(encoding="utf-8"))
+        runs = [
+            dict(task, category=category)
+            for category, entry in summary.get("by_task_type", {}).items()
+            for task in entry.get("tasks", [])
+        ]
+        if runs and all("time_elapsed" in r for r in runs):
+            return runs
+
+    runs = []
+    for result_path in sorted(study_path.glob("*/full_result.json")):
+        result = json.loads(result_path.read_text(encoding="utf-8"))
+        result.pop("result", None)
+        result.pop("stack_trace", None)
+        runs.append(result)
+    return runs
+
+
+def is_failed_run(run: Dict[str, Any]) -> bool:
+    return run.get("task_completion", 0.0) < 1.0 or bool(run.get("error"))
+
+
+# ============================================================================
+# Selection
+# ============================================================================
+
+
+def parse_selection(spec: Optional[str]) -> Dict[str, Any]:
+    """Parse a 'key=value;key=v1,v2;flag' selection spec into a dict."""
+    selection: Dict[str, Any] = {}
+    for part in (spec or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        key, _, value = part.partition("=")
+        key, value = key.strip(), value.strip()
+        if key in SELECTION_LIST_KEYS:
+            selection[key] = [v.strip() for v in value.split(",") if v.strip()]
+        elif key in SELECTION_INT_KEYS:
+            try:
+                selection[key] = int(value)
+            except ValueError:
+                raise ValueError(f"Task selection {key} needs a number, got {value!r}")
+        elif key == "study":
+            selection[key] = value
+        elif key == "failed":
+            selection[key] = value.lower() not in ("0", "false", "no") if value else True
+        else:
+            raise ValueError(f"Unknown task selection key: {key!r}")
+    return selection
+
+
+def with_excluded_categories(
+    selection: Optional[Dict[str, Any]], categories: List[str]
+) -> Dict[str, Any]:
+    """Copy of a selection that additionally excludes ``categories``.
+
+    Runners use it to apply their EXCLUDED_CATEGORIES on top of user input.
+    """
+    selection = dict(selection or {})
+    selection["exclude_categories"] = sorted(
+        set(selection.get("exclude_categories", [])) | set(categories)
+    )
+    return selection
+
+
+def describe_selection(selection: Dict[str, Any]) -> str:
+    """Inverse of parse_selection, for logs and study metadata."""
+    parts = []
+    for key, value in selection.items():
+        if value in (None, [], False):
+            continue
+        if value is True:
+            parts.append(key)
+        elif isinstance(value, list):
+            parts.append(f"{key}={','.join(value)}")
+        else:
+            parts.append(f"{key}={value}")
+    return ";".join(parts) or "all"
+
+
+def _query_rows(
+    conn: sqlite3.Connection, selection: Dict[str, Any]
+) -> List[Tuple[int, str, str]]:
+    """Rows (suite_position, task_id, body) matching a selection, in file order."""
+    clauses, params = [], []
+    for column, key in (("id", "ids"), ("suite_id", "suites")):
+        globs = selection.get(key)
+        if globs:
+            clauses.append("(" + " OR ".join(f"{column} GLOB ?" for _ in globs) + ")")
+            params.extend(globs)
+    if selection.get("categories"):
+        cats = selection["categories"]
+        clauses.append(f"category IN ({','.join('?' for _ in cats)})")
+        params.extend(cats)
+    if selection.get("exclude_categories"):
+        cats = selection["exclude_categories"]
+        clauses.append(f"category NOT IN ({','.join('?' for _ in cats)})")
+        params.extend(cats)
+
+    sql = "SELECT suite_position, id, body FROM tasks"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY position"
+    rows = conn.execute(sql, params).fetchall()
+
+    if selection.get("failed") or selection.get("slowest"):
+        if not selection.get("study"):
+            raise ValueError("'failed' and 'slowest' selections need study=<dir>")
+        runs = load_study_runs(selection["study"])
+
+        if selection.get("failed"):
+            failed = {r["task_id"] for r in runs if is_failed_run(r)}
+            rows = [row for row in rows if row[1] in failed]
+
+        if selection.get("slowest"):
+            slowest: Dict[str, float] = {}
+            for r in runs:
+                slowest[r["task_id"]] = max(
+                    slowest.get(r["task_id"], 0.0), r.get("time_elapsed") or 0.0
+                )
+            candidates = {row[1] for row in rows if row[1] in slowest}
+            keep = set(
+                sorted(candidates, key=lambda t: slowest[t], reverse=True)[
+                    : selection["slowest"]
+                ]
+            )
+            rows = [row for row in rows if row[1] in keep]
+
+    if selection.get("limit"):
+        rows = rows[: selection["limit"]]
+    return rows
+
+
+def select_tasks(
+    taskset_path: str,
+    selection: Optional[Dict[str, Any]] = None,
+    index_path: Optional[Path] = None,
+) -> List[Dict[str, Any]]:
+    """Tasks of a taskset matching a selection, in taskset order."""
+    conn = open_index(taskset_path, index_path)
+    try:
+        rows = _query_rows(conn, selection or {})
+    finally:
+        conn.close()
+    return [json.loads(body) for _, _, body in rows]
+
+
+def select_task_sets(
+    taskset_path: str,
+    selection: Optional[Dict[str, Any]] = None,
+    index_path: Optional[Path] = None,
+) -> List[Dict[str, Any]]:
+    """Like select_tasks, but regrouped into task_sets.json shaped suites.
+
+    Every suite of the taskset is returned, in order; suites without any
+    selected task keep an empty task list, as the runners always passed them
+    on. Callers that want them gone filter them out.
+    """
+    conn = open_index(taskset_path, index_path)
+    try:
+        rows = _query_rows(conn, selection or {})
+        suites = {
+            position: json.loads(body)
+            for position, body in conn.execute(
+                "SELECT position, body FROM suites ORDER BY position"
+            )
+        }
+    finally:
+        conn.close()
+
+    grouped: Dict[int, List[Dict[str, Any]]] = {}
+    for suite_position, _, body in rows:
+        grouped.setdefault(suite_position, []).append(json.loads(body))
+    return [
+        dict(suite, tasks=grouped.get(position, []))
+        for position, suite in sorted(suites.items())
+    ]
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query a WebMall taskset")
+    parser.add_argument("taskset", help="Path to task_sets.json")
+    parser.add_argument(
+        "--select",
+        default=os.getenv("TASK_SELECT", ""),
+        help="Selection spec, e.g. 'categories=Substitute;limit=5' (env: TASK_SELECT)",
+    )
+    parser.add_argument("--rebuild", action="store_true", help="Force an index rebuild")
+    parser.add_argument("--json", action="store_true", help="Print the selected tasks")
+    args = parser.parse_args()
+
+    if args.rebuild:
+        build_index(args.taskset, default_index_path(args.taskset))
+
+    selection = parse_selection(args.select)
+    tasks = select_tasks(args.taskset, selection)
+    if args.json:
+        json.dump(tasks, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+    for task in tasks:
+        print(f"{task['id']}\t{task.get('category', '')}")
+    print(f"{len(tasks)} task(s) selected ({describe_selection(selection)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+On-demand vision for the browser-use runner.
+
+With use_vision=on_demand the agent runs text-only (DOM observations, no
+screenshot action) and VisionPolicy adds the screenshot of the current page
+to the model input only for steps where the DOM path looks stuck. The
+triggers are
+
+    failures    the last N steps all had a failed action
+    unchanged   the page (URL, title, scroll position and interactive
+                elements) did not change over the last N steps
+    categories  tasks of these categories use vision on every step
+
+given as a spec like the task selection (VISION_TRIGGERS env var):
+
+    VISION_TRIGGERS="failures=2;unchanged=1;categories=Substitute,Best_Fit_Vague"
+
+failures / unchanged of 0 disable a trigger. browser-use captures the
+screenshot of every step anyway (for the GIF and the trajectory), so a
+text-only step saves the image tokens and the slower model call on them.
+Per task the number of vision and text-only steps and what triggered the
+vision steps end up in the task result.
+"""
+
+import hashlib
+from typing import Any, Dict, List, Optional
+
+VISION_ON_DEMAND = "on_demand"
+
+DEFAULT_TRIGGERS: Dict[str, Any] = {"failures": 2, "unchanged": 1, "categories": []}
+
+
+def parse_vision_triggers(spec: Optional[str]) -> Dict[str, Any]:
+    """Triggers of a spec like 'failures=2;unchanged=1;categories=A,B'.
+
+    Keys that are not given keep their DEFAULT_TRIGGERS value.
+    """
+    triggers = dict(DEFAULT_TRIGGERS)
+    for part in (spec or "").split(";"):
+        key, _, value = part.partition("=")
+        key, value = key.strip(), value.strip()
+        if not key:
+            continue
+        if key == "categories":
+            triggers[key] = [c.strip() for c in value.split(",") if c.strip()]
+        elif key in ("failures", "unchanged"):
+            try:
+                triggers[key] = int(value)
+            except ValueError:
+                raise ValueError(f"{key} needs a number of steps, got {value!r}")
+            if triggers[key] < 0:
+                raise ValueError(f"{key} must not be negative")
+        else:
+            raise ValueError(
+                f"Unknown vision trigger {key!r} (known: {', '.join(DEFAULT_TRIGGERS)})"
+            )
+    return triggers
+
+
+def page_fingerprint(browser_state_summary) -> str:
+    """Hash of what the agent can see and do on the page."""
+    page_info = browser_state_summary.page_info
+    parts: List[Any] = [
+        browser_state_summary.url,
+        browser_state_summary.title,
+        page_info.scroll_y if page_info else None,
+    ]
+    selector_map = browser_state_summary.dom_state.selector_map or {}
+    for node in selector_map.values():
+        parts.append(
+            (
+                node.node_name,
+                sorted((node.attributes or {}).items()),
+                node.get_meaningful_text_for_llm(),
+            )
+        )
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def failed_steps(history: List[Any]) -> int:
+    """Number of most recent steps that each had a failed action."""
+    count = 0
+    for item in reversed(history):
+        if not any(result.error for result in item.result):
+            break
+        count += 1
+    return count
+
+
+class VisionPolicy:
+    """Decides per step whether the model gets the screenshot of the page."""
+
+    def __init__(self, triggers: Optional[Dict[str, Any]] = None, category: str = ""):
+        self.triggers = triggers or DEFAULT_TRIGGERS
+        self.always = category in self.triggers["categories"]
+        self._fingerprint: Optional[str] = None
+        self._unchanged = 0
+        self._vision_steps: List[int] = []
+        self._text_steps = 0
+        self._triggered: Dict[str, int] = {}
+
+    def attach(self, agent) -> None:
+        """Decide on vision whenever ``agent`` builds its state message."""
+        manager = agent._message_manager
+        create_state_messages = manager.create_state_messages
+
+        def state_messages(browser_state_summary, *args, **kwargs):
+            trigger = self.decide(agent, browser_state_summary)
+            kwargs["use_vision"] = trigger is not None
+            if trigger is None:
+                self._text_steps += 1
+            else:
+                self._vision_steps.append(agent.state.n_steps)
+                self._triggered[trigger] = self._triggered.get(trigger, 0) + 1
+            return create_state_messages(browser_state_summary, *args, **kwargs)
+
+        manager.create_state_messages = state_messages
+
+    def decide(self, agent, browser_state_summary) -> Optional[str]:
+        """The trigger that calls for a screenshot this step, None if none does."""
+        if self.triggers["unchanged"]:
+            fingerprint = page_fingerprint(browser_state_summary)
+            if fingerprint == self._fingerprint:
+                self._unchanged += 1
+            else:
+                self._unchanged = 0
+            self._fingerprint = fingerprint
+
+        if not browser_state_summary.screenshot:
+            return None
+        if self.always:
+            return "category"
+        failures = self.triggers["failures"]
+        if failures and failed_steps(agent.history.history) >= failures:
+            return "failures"
+        if self.triggers["unchanged"] and self._unchanged >= self.triggers["unchanged"]:
+            return "unchanged"
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Vision and text-only steps of the run (vision steps by trigger)."""
+        return {
+            "mode": VISION_ON_DEMAND,
+            "vision_steps": len(self._vision_steps),
+            "text_steps": self._text_steps,
+            "vision_step_numbers": self._vision_steps,
+            "triggers": self._triggered,
+        }
+
+
+def sum_vision_stats(stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals of per-task vision stats (for the study summary)."""
+    triggers: Dict[str, int] = {}
+    for entry in stats:
+        for trigger, count in entry.get("triggers", {}).items():
+            triggers[trigger] = triggers.get(trigger, 0) + count
+    vision_steps = sum(entry.get("vision_steps", 0) for entry in stats)
+    text_steps = sum(entry.get("text_steps", 0) for entry in stats)
+    total = vision_steps + text_steps
+    return {
+        "tasks": len(stats),
+        "tasks_with_vision": sum(1 for entry in stats if entry.get("vision_steps")),
+        "vision_steps": vision_steps,
+        "text_steps": text_steps,
+        "vision_step_share": vision_steps / total if total else 0.0,
+        "triggers": triggers,
+    }
@@ -0,0 +1,134 @@
+"""
+Per-task watchdog and browser teardown for the study runner.
+
+TaskWatchdog runs a coroutine (the agent run) under two deadlines:
+
+    task_timeout   wall-clock limit for the whole task
+    stall_timeout  limit between two progress heartbeats (touch()), i.e. the
+                   longest a single step / page load / LLM call may hang
+
+When a deadline passes the run is cancelled, given a short grace period to
+unwind, and TaskTimeout is raised so the caller can record the partial run
+and move on. kill_process_tree() then reaps the Chromium process and all its
+children, whatever state the browser session was left in.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Optional
+
+import psutil
+
+
+class TaskTimeout(Exception):
+    """A watched task exceeded its wall-clock or stall deadline."""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class TaskWatchdog:
+    """Wall-clock and stall deadlines for one agent run."""
+
+    def __init__(
+        self,
+        task_timeout: Optional[float] = None,
+        stall_timeout: Optional[float] = None,
+        poll_interval: float = 1.0,
+        cancel_grace: float = 10.0,
+    ):
+        self.task_timeout = task_timeout or None
+        self.stall_timeout = stall_timeout or None
+        self.poll_interval = poll_interval
+        self.cancel_grace = cancel_grace
+        self._started = self._last_progress = time.monotonic()
+
+    def touch(self) -> None:
+        """Heartbeat: the run made progress (e.g. a step started or ended)."""
+        self._last_progress = time.monotonic()
+
+    def _expired(self) -> Optional[TaskTimeout]:
+        now = time.monotonic()
+        if self.task_timeout and now - self._started > self.task_timeout:
+            return TaskTimeout(
+                "task_timeout",
+                f"Task exceeded its wall-clock deadline of {self.task_timeout:.0f}s",
+            )
+        if self.stall_timeout and now - self._last_progress > self.stall_timeout:
+            return TaskTimeout(
+                "stall_timeout",
+                f"No step progress for {self.stall_timeout:.0f}s",
+            )
+        return None
+
+    async def run(self, coro: Awaitable[Any]) -> Any:
+        """Await ``coro`` under the deadlines; raise TaskTimeout on expiry."""
+        task = asyncio.ensure_future(coro)
+        self._started = self._last_progress = time.monotonic()
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=self.poll_interval)
+                if done:
+                    return task.result()
+                timeout = self._expired()
+                if timeout:
+                    task.cancel()
+                    # Let the agent unwind, but never wait on it indefinitely
+                    await asyncio.wait({task}, timeout=self.cancel_grace)
+                    raise timeout
+        finally:
+            if not task.done():
+                task.cancel()
+
+
+def browser_pid(agent) -> Optional[int]:
+    """PID of the locally launched browser of an agent, if any."""
+    session = getattr(agent, "browser_session", None)
+    watchdog = getattr(session, "_local_browser_watchdog", None)
+    return getattr(watchdog, "browser_pid", None)
+
+
+def kill_process_tree(pid: Optional[int], timeout: float = 5.0) -> int:
+    """Terminate a process and all its descendants; kill what is left.
+
+    Returns the number of processes that were still alive.
+    """
+    if not pid:
+        return 0
+    try:
+        root = psutil.Process(pid)
+        procs = root.children(recursive=True) + [root]
+    except psutil.NoSuchProcess:
+        return 0
+
+    for proc in procs:
+        try:
+            proc.terminate()
+        except psutil.NoSuchProcess:
+            pass
+    _, alive = psutil.wait_procs(procs, timeout=timeout)
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.NoSuchProcess:
+            pass
+    psutil.wait_procs(alive, timeout=timeout)
+    return len(procs)
+
+
+async def teardown_agent(agent, pid: Optional[int], close_timeout: float = 15.0) -> None:
+    """Close an agent's browser session and reap its browser processes.
+
+    The polite close is bounded by ``close_timeout``; the process tree of the
+    browser is killed afterwards regardless, so no Chromium outlives its task.
+    """
+    pid = pid or browser_pid(agent)
+    try:
+        await asyncio.wait_for(agent.close(), timeout=close_timeout)
+    except Exception as e:
+        print(f"Warning: Could not close agent cleanly: {e!r}")
+    if pid:
+        alive = await asyncio.to_thread(kill_process_tree, pid)
+        if alive:
+            print(f"Reaped {alive} leftover browser process(es) (pid {pid})")
@@ -0,0 +1,221 @@
+"""
+Process-isolated task execution for the study runner.
+
+With TASK_ISOLATION=process every concurrent slot of run_study owns a worker
+process that runs its tasks. Agent objects, screenshots and history only ever
+live in the worker; the artifacts are written to the task directory there and
+only the compact result dict (the full_result.json record without the large
+"result" / "stack_trace" fields) and the per-shop error counts travel back
+over a pipe, together with per-step progress messages.
+
+Workers are recycled after ``tasks_per_worker`` tasks (like maxtasksperchild)
+and as soon as their RSS exceeds ``max_rss_mb`` after a task. The RSS is
+that of the worker and all its child processes (the browsers it launched,
+which use most of the memory). A worker that exceeds the cap by half again
+while a task is running is killed together with its browser, and the task is recorded with termination_reason "memory_cap".
+"""
+
+import asyncio
+import multiprocessing
+import time
+import traceback
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import psutil
+
+from webmall_profile import Profiler
+from webmall_watchdog import kill_process_tree
+
+# Fields of a task result that stay in the worker (they are in full_result.json)
+HEAVY_RESULT_FIELDS = ("result", "stack_trace")
+
+# Headroom over max_rss_mb before a running task is killed
+HARD_RSS_FACTOR = 1.5
+
+
+def process_tree_rss_mb(pid: Optional[int] = None) -> float:
+    """RSS in MB of a process (default: this one) and all its children."""
+    try:
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0.0
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.NoSuchProcess:
+            pass
+    return rss / 2**20
+
+
+def worker_main(
+    conn, profile_modes: Optional[List[str]] = None, rate_limiter=None
+) -> None:
+    """Worker process loop: run jobs from ``conn`` until it sends None.
+
+    ``rate_limiter`` (see webmall_ratelimit) is shared with the study and all
+    other workers; it is passed at start because it cannot travel over a pipe.
+    """
+    # Imported lazily: the study module imports this one
+    import run_browseruse_webmall_study as study
+
+    profiler = Profiler(profile_modes) if profile_modes else None
+
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        task_config, task_seed, task_dir, run_options = job
+        if rate_limiter is not None:
+            run_options = dict(run_options, rate_limiter=rate_limiter)
+
+        def report_step(steps: int, tokens: int = 0, cost: float = 0.0) -> None:
+            conn.send(("step", steps, tokens, cost))
+
+        async def run_job():
+            profiling = (
+                profiler.profile_task(Path(task_dir)) if profiler else nullcontext()
+            )
+            async with profiling:
+                return await study.execute_run(
+                    task_config, task_seed, Path(task_dir), run_options, report_step
+                )
+
+        try:
+            task_result, shop_errors = asyncio.run(run_job())
+        except Exception:
+            conn.send(("failed", traceback.format_exc()))
+            continue
+
+        compact = {k: v for k, v in task_result.items() if k not in HEAVY_RESULT_FIELDS}
+        rss_mb = process_tree_rss_mb()
+        conn.send(("done", compact, shop_errors, rss_mb))
+    if profiler:
+        profiler.stop()
+    conn.close()
+
+
+class WorkerProcess:
+    """One recyclable worker process, driven synchronously from a thread."""
+
+    def __init__(
+        self,
+        tasks_per_worker: int = 10,
+        max_rss_mb: Optional[float] = None,
+        poll_interval: float = 1.0,
+        profile_modes: Optional[List[str]] = None,
+        rate_limiter=None,
+    ):
+        self.tasks_per_worker = max(1, tasks_per_worker)
+        self.rate_limiter = rate_limiter
+        self.profile_modes = profile_modes or None
+        self.max_rss_mb = max_rss_mb or None
+        self.poll_interval = poll_interval
+        self._ctx = multiprocessing.get_context("spawn")
+        self._process = None
+        self._conn = None
+        self._tasks_done = 0
+        self.recycled = 0
+
+    def _start(self) -> None:
+        self._conn, child_conn = self._ctx.Pipe()
+        self._process = self._ctx.Process(
+            target=worker_main,
+            args=(child_conn, self.profile_modes, self.rate_limiter),
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        self._tasks_done = 0
+
+    def _rss_mb(self) -> float:
+        return process_tree_rss_mb(self._process.pid)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Ask the worker to exit; kill it (and its browsers) if it does not."""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout)
+        if self._process.is_alive():
+            kill_process_tree(self._process.pid)
+            self._process.join(timeout)
+        self._conn.close()
+        self._process = self._conn = None
+
+    def _kill(self) -> None:
+        kill_process_tree(self._process.pid)
+        self._process.join(5)
+        self._conn.close()
+        self._process = self._conn = None
+
+    def _died(self) -> Tuple[str, str]:
+        self._process.join(5)
+        code = self._process.exitcode
+        self._kill()
+        return "error", f"Worker process died (exit code {code})"
+
+    def run(
+        self,
+        task_config: Dict[str, Any],
+        task_seed: int,
+        task_dir: Path,
+        run_options: Dict[str, Any],
+        on_step: Optional[Callable[[int, int, float], None]] = None,
+        deadline: Optional[float] = None,
+    ) -> Tuple[Optional[Dict[str, Any]], Dict[str, Any], Optional[Tuple[str, str]]]:
+        """Run one task in the worker (blocking).
+
+        Returns ``(task_result, shop_errors, failure)``; on failure the result
+        is None and ``failure`` is a (termination_reason, message) pair.
+        ``deadline`` (seconds) is a last-resort bound in case the worker hangs
+        beyond its own watchdog.
+        """
+        if self._process is None:
+            self._start()
+        self._conn.send((task_config, task_seed, str(task_dir), run_options))
+        started = time.monotonic()
+        hard_rss_mb = self.max_rss_mb * HARD_RSS_FACTOR if self.max_rss_mb else None
+
+        while True:
+            if self._conn.poll(self.poll_interval):
+                try:
+                    message = self._conn.recv()
+                except (EOFError, OSError):
+                    message = None
+                if message is None:
+                    return None, {}, self._died()
+                kind = message[0]
+                if kind == "step":
+                    if on_step is not None:
+                        on_step(*message[1:])
+                    continue
+                if kind == "failed":
+                    self._kill()
+                    return None, {}, ("error", message[1])
+                _, task_result, shop_errors, rss_mb = message
+                self._tasks_done += 1
+                if self._tasks_done >= self.tasks_per_worker or (
+                    self.max_rss_mb and rss_mb > self.max_rss_mb
+                ):
+                    self.stop()
+                    self.recycled += 1
+                return task_result, shop_errors, None
+
+            if not self._process.is_alive():
+                return None, {}, self._died()
+            if hard_rss_mb and self._rss_mb() > hard_rss_mb:
+                self._kill()
+                return None, {}, (
+                    "memory_cap",
+                    f"Worker exceeded {hard_rss_mb:.0f} MB RSS and was killed",
+                )
+            if deadline and time.monotonic() - started > deadline:
+                self._kill()
+                return None, {}, ("timeout", f"Worker did not finish within {deadline:.0f}s")
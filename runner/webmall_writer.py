@@ -0,0 +1,253 @@
+"""
+Background result writer for the study runner.
+
+ResultWriter moves result persistence off the event loop: write_json() only
+enqueues the data; a dedicated thread serializes it, writes it to a temp file
+next to the target and renames it into place. Writes are handled in batches:
+all files of a batch are fsynced together before their renames and every
+touched directory is fsynced once afterwards, so a crash leaves either the
+old or the new version of each file.
+
+The queue is bounded. When it is full, write_json() blocks until the thread
+catches up; how often and how long that happened is part of stats(), which
+the study runner publishes in status.json. close() flushes everything that
+is still queued.
+"""
+
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+_STOP = object()
+
+
+def atomic_write_json(path: Path, data: Any, fsync: bool = True) -> None:
+    """Write ``data`` as indented JSON via a temp file and rename (synchronous)."""
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_json(path: Path, data: Any, writer: Optional["ResultWriter"] = None) -> None:
+    """Write ``data`` as indented JSON, through ``writer`` if one is given.
+
+    ``data`` may be a callable returning the data, so that building it is
+    deferred to the writer thread as well.
+    """
+    if writer is not None:
+        writer.write_json(path, data)
+    else:
+        if callable(data):
+            data = data()
+        atomic_write_json(path, data, fsync=False)
+
+
+def write_text(path: Path, text: str, writer: Optional["ResultWriter"] = None) -> None:
+    """Write ``text`` to ``path``, through ``writer`` if one is given."""
+    if writer is not None:
+        writer.write_text(path, text)
+    else:
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, path)
+
+
+class ResultWriter:
+    """Queue-fed writer thread with atomic renames and batched fsync."""
+
+    def __init__(
+        self,
+        max_queue: int = 1000,
+        batch_size: int = 64,
+        batch_delay: float = 0.2,
+        fsync: bool = True,
+    ):
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.fsync = fsync
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stats = {
+            "files_written": 0,
+            "bytes_written": 0,
+            "batches": 0,
+            "fsyncs": 0,
+            "errors": 0,
+            "max_queue_depth": 0,
+            "blocked_puts": 0,
+            "blocked_seconds": 0.0,
+            "max_latency_seconds": 0.0,
+        }
+        self._latency_total = 0.0
+        self._tmp_ids = itertools.count()
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------ API
+
+    def _put(self, job) -> None:
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            # Backpressure: wait for the writer thread, and make it visible
+            started = time.monotonic()
+            self._queue.put(job)
+            with self._lock:
+                self._stats["blocked_puts"] += 1
+                self._stats["blocked_seconds"] += time.monotonic() - started
+        with self._lock:
+            self._stats["max_queue_depth"] = max(
+                self._stats["max_queue_depth"], self._queue.qsize()
+            )
+
+    def write_json(self, path: Path, data: Any, indent: Optional[int] = 2) -> None:
+        """Queue ``data`` (or a callable returning it) to be written as JSON."""
+        self._put(("json", Path(path), data, indent, time.monotonic()))
+
+    def write_text(self, path: Path, text: str) -> None:
+        """Queue ``text`` to be written to ``path``."""
+        self._put(("text", Path(path), text, None, time.monotonic()))
+
+    def call(self, fn: Callable[[], Any]) -> None:
+        """Queue ``fn`` to run after all writes queued before it are on disk."""
+        self._put(("call", fn, time.monotonic()))
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until everything queued so far is on disk."""
+        done = threading.Event()
+        self.call(done.set)
+        done.wait(timeout)
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Flush all queued writes and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            written = stats["files_written"]
+        stats["queue_depth"] = self._queue.qsize()
+        stats["blocked_seconds"] = round(stats["blocked_seconds"], 3)
+        stats["max_latency_seconds"] = round(stats["max_latency_seconds"], 3)
+        stats["avg_latency_seconds"] = (
+            round(self._latency_total / written, 3) if written else 0.0
+        )
+        return stats
+
+    # --------------------------------------------------------------- thread
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_delay
+            while batch[-1] is not _STOP and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            pending: List = []
+            for job in batch:
+                if job is _STOP:
+                    self._commit(pending)
+                    return
+                if job[0] == "call":
+                    # Everything queued before the call must be on disk first
+                    self._commit(pending)
+                    pending = []
+                    try:
+                        job[1]()
+                    except Exception as e:
+                        self._error(f"writer callback failed: {e!r}")
+                    continue
+                written = self._write_tmp(job)
+                if written:
+                    pending.append(written)
+            self._commit(pending)
+
+    def _write_tmp(self, job):
+        kind, path, data, indent, queued_at = job
+        # Unique per job: the same file may be written twice in one batch
+        tmp_path = path.with_name(f".{path.name}.{next(self._tmp_ids)}.tmp")
+        f = None
+        try:
+            if callable(data):
+                data = data()
+            f = open(tmp_path, "w", encoding="utf-8")
+            if kind == "text":
+                f.write(data)
+            else:
+                json.dump(data, f, indent=indent)
+            f.flush()
+        except Exception as e:
+            if f is not None:
+                f.close()
+                tmp_path.unlink(missing_ok=True)
+            self._error(f"could not write {path}: {e!r}")
+            return None
+        return f, tmp_path, path, f.tell(), queued_at
+
+    def _commit(self, pending: List) -> None:
+        """fsync the batch, rename it into place and fsync the directories."""
+        if not pending:
+            return
+        fsyncs = 0
+        directories = set()
+        committed = []
+        for f, tmp_path, path, size, queued_at in pending:
+            try:
+                if self.fsync:
+                    os.fsync(f.fileno())
+                    fsyncs += 1
+                f.close()
+                os.replace(tmp_path, path)
+            except Exception as e:
+                self._error(f"could not write {path}: {e!r}")
+                continue
+            directories.add(path.parent)
+            committed.append((size, queued_at))
+        if self.fsync:
+            for directory in directories:
+                try:
+                    fd = os.open(directory, os.O_RDONLY)
+                    try:
+                        os.fsync(fd)
+                    finally:
+                        os.close(fd)
+                    fsyncs += 1
+                except OSError:
+                    pass
+
+        now = time.monotonic()
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["fsyncs"] += fsyncs
+            for size, queued_at in committed:
+                latency = now - queued_at
+                self._stats["files_written"] += 1
+                self._stats["bytes_written"] += size
+                self._stats["max_latency_seconds"] = max(
+                    self._stats["max_latency_seconds"], latency
+                )
+                self._latency_total += latency
+
+    def _error(self, message: str) -> None:
+        print(f"Warning: {message}")
+        with self._lock:
+            self._stats["errors"] += 1